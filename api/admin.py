@@ -3,7 +3,9 @@ from .models import (
     User, 
     AccountTier, 
     ThumbnailSize, 
+    ImageBlob,
     Image, 
+    UploadSession,
     TempLink, 
     TempLinkTokenBlacklist
 )
@@ -12,6 +14,8 @@ from .models import (
 admin.site.register(User)
 admin.site.register(AccountTier)
 admin.site.register(ThumbnailSize)
+admin.site.register(ImageBlob)
 admin.site.register(Image)
+admin.site.register(UploadSession)
 admin.site.register(TempLink)
 admin.site.register(TempLinkTokenBlacklist)
@@ -0,0 +1,325 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from functools import lru_cache
+from hashlib import blake2b
+from itertools import islice
+from math import ceil, log
+from threading import Lock
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from . import models
+
+
+logger = logging.getLogger(__name__)
+
+# Blacklisted tokens are partitioned by UTC day on which they expire.
+# Each partition has its own Bloom filter, telling tokens which are
+# definitely not blacklisted without database lookups.
+
+# Number of entries read from the database at once.
+BATCH_SIZE = 10000
+
+
+def get_partition(expires_at):
+    """
+    Returns partition, i.e. UTC date, of entry expiring at given time.
+    """
+    return expires_at.astimezone(dt_timezone.utc).date()
+
+
+def get_partition_start(partition):
+    return datetime.combine(partition, time.min, tzinfo=dt_timezone.utc)
+
+
+def get_live_partitions():
+    """
+    Returns partitions which may hold tokens of links that have not
+    expired yet.
+    """
+    today = get_partition(timezone.now())
+    days = ceil(models.TEMPLINK_MAX_LIFETIME / (60 * 60 * 24))
+    return [today + timedelta(days=day) for day in range(days + 1)]
+
+
+def get_retained_partitions():
+    """
+    Returns all partitions kept in the blacklist.
+    """
+    live = get_live_partitions()
+    retention = settings.TEMPLINK_BLACKLIST_RETENTION_DAYS
+    return [
+        live[0] - timedelta(days=day) for day in range(retention, 0, -1)
+    ] + live
+
+
+def get_filter_parameters():
+    """
+    Returns number of bits and hash functions of partition filters,
+    sized for their capacity and error rate.
+    """
+    capacity = settings.TEMPLINK_BLACKLIST_FILTER_CAPACITY
+    error_rate = settings.TEMPLINK_BLACKLIST_FILTER_ERROR_RATE
+    size = ceil(-capacity * log(error_rate) / log(2) ** 2)
+    hashes = max(1, round(size / capacity * log(2)))
+    return size, hashes
+
+
+def get_positions(token, size, hashes):
+    """
+    Returns filter bits representing token, derived from two halves
+    of its hash.
+    """
+    digest = blake2b(token.encode(), digest_size=16).digest()
+    first = int.from_bytes(digest[:8], 'big')
+    second = int.from_bytes(digest[8:], 'big') | 1
+    return [(first + i * second) % size for i in range(hashes)]
+
+
+class MemoryFilterStore:
+    """
+    Keeps filters in process memory and builds them on demand. Other
+    processes do not see tokens it adds, so it only suits deployments
+    running a single process.
+    """
+
+    builds_on_demand = True
+
+    def __init__(self):
+        self.filters = {}
+        self.ready = set()
+        self.lock = Lock()
+
+    def add(self, partition, positions, size):
+        with self.lock:
+            bits = self.filters.get(partition)
+            if bits is None:
+                bits = self.filters[partition] = bytearray(ceil(size / 8))
+            for position in positions:
+                bits[position >> 3] |= 1 << (position & 7)
+
+    def is_ready(self, partitions):
+        return [partition in self.ready for partition in partitions]
+
+    def mark_ready(self, partition):
+        with self.lock:
+            self.ready.add(partition)
+
+    def contains(self, partitions, positions):
+        filters = [
+            self.filters[partition] for partition in partitions
+            if partition in self.filters
+        ]
+        return [
+            any(
+                all(bits[position >> 3] & 1 << (position & 7)
+                    for position in token_positions)
+                for bits in filters
+            )
+            for token_positions in positions
+        ]
+
+    def drop(self, before):
+        with self.lock:
+            for partition in [p for p in self.filters if p < before]:
+                del self.filters[partition]
+            self.ready = {p for p in self.ready if p >= before}
+
+
+class RedisFilterStore:
+    """
+    Keeps filters in Redis, shared by all processes. Filters are built
+    by maintain_templink_blacklist task and expire along with their
+    partitions.
+    """
+
+    builds_on_demand = False
+
+    def __init__(self):
+        from redis import Redis
+        self.client = Redis.from_url(settings.REDIS_CACHE_URL)
+
+    def get_key(self, partition):
+        return f'templink-blacklist:{partition.isoformat()}'
+
+    def get_expiration_time(self, partition):
+        retention = settings.TEMPLINK_BLACKLIST_RETENTION_DAYS
+        end = get_partition_start(partition) + timedelta(days=retention + 1)
+        return int(end.timestamp())
+
+    def add(self, partition, positions, size):
+        key = self.get_key(partition)
+        pipeline = self.client.pipeline(transaction=False)
+        bitfield = pipeline.bitfield(key)
+        for position in positions:
+            bitfield.set('u1', position, 1)
+        bitfield.execute()
+        pipeline.expireat(key, self.get_expiration_time(partition))
+        pipeline.execute()
+
+    def is_ready(self, partitions):
+        keys = [self.get_key(partition) + ':ready' for partition in partitions]
+        return [bool(value) for value in self.client.mget(keys)]
+
+    def mark_ready(self, partition):
+        self.client.set(
+            self.get_key(partition) + ':ready',
+            1,
+            exat=self.get_expiration_time(partition)
+        )
+
+    def contains(self, partitions, positions):
+        pipeline = self.client.pipeline(transaction=False)
+        for token_positions in positions:
+            for partition in partitions:
+                bitfield = pipeline.bitfield(self.get_key(partition))
+                for position in token_positions:
+                    bitfield.get('u1', position)
+                bitfield.execute()
+        results = iter(pipeline.execute())
+        return [
+            any([all(next(results)) for _ in partitions])
+            for _ in positions
+        ]
+
+    def drop(self, before):
+        # Keys expire on their own.
+        pass
+
+
+@lru_cache(maxsize=None)
+def load_filter_store(path):
+    return import_string(path)()
+
+
+def get_filter_store():
+    """
+    Returns filter store given by TEMPLINK_BLACKLIST_FILTER_STORE,
+    None if filters are disabled.
+    """
+    path = settings.TEMPLINK_BLACKLIST_FILTER_STORE
+    return load_filter_store(path) if path else None
+
+
+def add_to_filters(entries):
+    """
+    Adds (token, expires_at) pairs to filters of their partitions.
+    """
+    store = get_filter_store()
+    if store is None:
+        return
+
+    size, hashes = get_filter_parameters()
+    positions = defaultdict(list)
+    for token, expires_at in entries:
+        positions[get_partition(expires_at)] += get_positions(
+            token,
+            size,
+            hashes
+        )
+    for partition, partition_positions in positions.items():
+        store.add(partition, partition_positions, size)
+
+
+def build_filters(partitions):
+    """
+    Adds tokens stored in given partitions to their filters, unless the
+    filters were built already. Returns number of built filters.
+    """
+    store = get_filter_store()
+    if store is None:
+        return 0
+
+    built = 0
+    for partition, ready in zip(partitions, store.is_ready(partitions)):
+        if ready:
+            continue
+
+        # Tokens blacklisted meanwhile are added by the signal receiver.
+        start = get_partition_start(partition)
+        entries = models.TempLinkTokenBlacklist.objects.filter(
+            expires_at__gte=start,
+            expires_at__lt=start + timedelta(days=1)
+        ).values_list('token', 'expires_at').iterator(chunk_size=BATCH_SIZE)
+        count = 0
+        while batch := list(islice(entries, BATCH_SIZE)):
+            add_to_filters(batch)
+            count += len(batch)
+        store.mark_ready(partition)
+
+        # Overfilled filters let more tokens through to the database.
+        capacity = settings.TEMPLINK_BLACKLIST_FILTER_CAPACITY
+        if count > capacity:
+            logger.warning(
+                f'Blacklist partition {partition} holds {count} tokens, '
+                f'over filter capacity of {capacity}.'
+            )
+        built += 1
+    return built
+
+
+def get_suspected_tokens(tokens, partitions=None):
+    """
+    Returns those of given tokens which may be blacklisted in given
+    partitions, live ones by default. All of them are suspected if
+    filters are disabled or not built yet.
+    """
+    tokens = list(tokens)
+    store = get_filter_store()
+    if store is None:
+        return tokens
+
+    partitions = partitions or get_live_partitions()
+    if store.builds_on_demand:
+        build_filters(partitions)
+    if not all(store.is_ready(partitions)):
+        return tokens
+
+    size, hashes = get_filter_parameters()
+    positions = [get_positions(token, size, hashes) for token in tokens]
+    return [
+        token
+        for token, found in zip(tokens, store.contains(partitions, positions))
+        if found
+    ]
+
+
+def might_be_blacklisted(token, partitions=None):
+    """
+    Returns False if token is definitely not blacklisted in given
+    partitions, live ones by default. Returns True if it may be.
+    """
+    return bool(get_suspected_tokens([token], partitions))
+
+
+def is_blacklisted(token, partitions=None):
+    """
+    Checks whether token is blacklisted. Hits the database only if
+    filters cannot tell the token is not.
+    """
+    return might_be_blacklisted(token, partitions) and (
+        models.TempLinkTokenBlacklist.objects.filter(token=token).exists()
+    )
+
+
+def drop_partitions():
+    """
+    Removes entries of partitions past retention period, in batches.
+    Returns number of removed entries.
+    """
+    oldest = get_retained_partitions()[0]
+    expired = models.TempLinkTokenBlacklist.objects.filter(
+        expires_at__lt=get_partition_start(oldest)
+    )
+
+    removed = 0
+    while pks := list(expired.values_list('pk', flat=True)[:BATCH_SIZE]):
+        removed += models.TempLinkTokenBlacklist.objects.filter(
+            pk__in=pks
+        ).delete()[0]
+
+    store = get_filter_store()
+    if store is not None:
+        store.drop(oldest)
+    return removed
@@ -0,0 +1,17 @@
+from PIL import Image
+
+
+# Let Pillow reduce() by an integer factor before resampling
+# when the image is shrunk at least this many times.
+REDUCING_GAP = 3.0
+
+
+def resize(image, size):
+    """
+    Resizes an image using Pillow reduce() for large downscales.
+    """
+    return image.resize(
+        size,
+        resample=Image.Resampling.LANCZOS,
+        reducing_gap=REDUCING_GAP
+    )
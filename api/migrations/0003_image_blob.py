@@ -0,0 +1,61 @@
+# Generated by Django 4.1.7 on 2026-10-16 22:42
+
+from hashlib import sha256
+import api.utils
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_blobs_for_existing_images(apps, schema_editor):
+    Image = apps.get_model('api', 'Image')
+    ImageBlob = apps.get_model('api', 'ImageBlob')
+
+    for image in Image.objects.filter(blob__isnull=True).iterator():
+        # Skip images which files are gone.
+        if not image.image.storage.exists(image.image.name):
+            continue
+
+        hasher = sha256()
+        with image.image.open('rb') as file_:
+            for chunk in file_.chunks():
+                hasher.update(chunk)
+
+        # Existing files stay where they are.
+        blob, created = ImageBlob.objects.get_or_create(
+            checksum=hasher.hexdigest(),
+            defaults={'file': image.image.name}
+        )
+        blob.reference_count += 1
+        blob.save()
+
+        image.blob = blob
+        image.image = blob.file.name
+        image.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_auto_20230306_0934'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('checksum', models.CharField(max_length=64, unique=True)),
+                ('file', models.ImageField(upload_to=api.utils.blob_file_name_generator)),
+                ('reference_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='images', to='api.imageblob'),
+        ),
+        migrations.RunPython(
+            create_blobs_for_existing_images,
+            migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.7 on 2026-10-16 22:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_image_blob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accounttier',
+            name='max_upload_pixels',
+            field=models.PositiveBigIntegerField(default=50000000, help_text='Maximum width times height of uploaded image.'),
+        ),
+        migrations.AddField(
+            model_name='accounttier',
+            name='max_upload_size',
+            field=models.PositiveBigIntegerField(default=20971520, help_text='Maximum size of uploaded image in bytes.'),
+        ),
+    ]
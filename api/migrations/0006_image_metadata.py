@@ -0,0 +1,66 @@
+# Generated by Django 4.1.7 on 2026-10-16 22:53
+
+from django.db import migrations, models
+from PIL import Image as PILImage
+
+
+def fill_metadata_of_existing_images(apps, schema_editor):
+    Image = apps.get_model('api', 'Image')
+
+    for image in Image.objects.filter(format='').select_related('blob'):
+        # Skip images which files are gone.
+        storage = image.image.storage
+        if not storage.exists(image.image.name):
+            continue
+
+        # Existing originals are not normalized, only described.
+        with image.image.open('rb') as file_:
+            try:
+                with PILImage.open(file_) as original:
+                    image.width, image.height = original.size
+                    image.format = original.format
+            except OSError:
+                continue
+        image.size = storage.size(image.image.name)
+        if image.blob is not None:
+            image.checksum = image.blob.checksum
+        image.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_upload_session'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='format',
+            field=models.CharField(blank=True, db_index=True, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='size',
+            field=models.PositiveBigIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(
+            fill_metadata_of_existing_images,
+            migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.7 on 2026-10-16 22:56
+
+from django.db import migrations
+
+
+def remove_sessions_with_single_file(apps, schema_editor):
+    UploadSession = apps.get_model('api', 'UploadSession')
+
+    # Session files would be in the way of part directories.
+    # Unfinished uploads have to be started again.
+    for session in UploadSession.objects.all():
+        session.file.delete(save=False)
+        session.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_image_metadata'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_sessions_with_single_file,
+            migrations.RunPython.noop
+        ),
+        migrations.RemoveField(
+            model_name='uploadsession',
+            name='file',
+        ),
+    ]
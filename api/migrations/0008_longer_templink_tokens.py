@@ -0,0 +1,23 @@
+# Generated by Django 4.1.7 on 2026-10-16 23:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_upload_session_parts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='templink',
+            name='token',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='templinktokenblacklist',
+            name='token',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.1.7 on 2026-10-16 23:20
+
+from datetime import timedelta
+from django.db import migrations, models
+
+
+def fill_expiration_dates(apps, schema_editor):
+    TempLink = apps.get_model('api', 'TempLink')
+
+    templinks = TempLink.objects.filter(expires_at=None).only(
+        'created',
+        'expires_in'
+    )
+    batch = []
+    for templink in templinks.iterator(chunk_size=1000):
+        templink.expires_at = (
+            templink.created + timedelta(seconds=templink.expires_in)
+        )
+        batch.append(templink)
+        if len(batch) == 1000:
+            TempLink.objects.bulk_update(batch, ['expires_at'])
+            batch = []
+    TempLink.objects.bulk_update(batch, ['expires_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_longer_templink_tokens'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='templink',
+            name='expires_at',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            fill_expiration_dates,
+            migrations.RunPython.noop
+        ),
+    ]
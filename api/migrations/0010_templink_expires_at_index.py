@@ -0,0 +1,18 @@
+# Generated by Django 4.1.7 on 2026-10-16 23:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_templink_expires_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='templink',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, editable=False),
+        ),
+    ]
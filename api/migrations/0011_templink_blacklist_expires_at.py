@@ -0,0 +1,19 @@
+# Generated by Django 4.1.7 on 2026-10-16 23:13
+
+import api.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_templink_expires_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='templinktokenblacklist',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=api.models.get_blacklist_expiration_date),
+        ),
+    ]
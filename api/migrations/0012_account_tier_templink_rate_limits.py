@@ -0,0 +1,24 @@
+# Generated by Django 4.1.7 on 2026-10-16 23:23
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_templink_blacklist_expires_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accounttier',
+            name='templink_client_rate_limit',
+            field=models.CharField(blank=True, default='60/min', help_text='Requests to temporary links from a single client IP, e.g. 60/min. Blank for no limit.', max_length=20, validators=[django.core.validators.RegexValidator('^[1-9]\\d*/[smhd]', 'Enter rate as number of requests per period, e.g. 100/min.')]),
+        ),
+        migrations.AddField(
+            model_name='accounttier',
+            name='templink_rate_limit',
+            field=models.CharField(blank=True, default='600/min', help_text='Requests to a temporary link, e.g. 600/min. Blank for no limit.', max_length=20, validators=[django.core.validators.RegexValidator('^[1-9]\\d*/[smhd]', 'Enter rate as number of requests per period, e.g. 100/min.')]),
+        ),
+    ]
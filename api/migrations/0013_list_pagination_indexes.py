@@ -0,0 +1,21 @@
+# Generated by Django 4.1.7 on 2026-10-16 23:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_account_tier_templink_rate_limits'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='image',
+            index=models.Index(fields=['owner', 'id'], name='image_owner_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='templink',
+            index=models.Index(fields=['image', 'id'], name='templink_image_id_idx'),
+        ),
+    ]
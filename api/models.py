@@ -1,13 +1,42 @@
 from datetime import timedelta
+from uuid import uuid4
 from django.utils import timezone
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth.models import AbstractUser
+from django.core.files.storage import default_storage
 from django.core.validators import (
     FileExtensionValidator,
     MinValueValidator,
-    MaxValueValidator
+    MaxValueValidator,
+    RegexValidator,
 )
-from .utils import file_name_generator
+from sorl.thumbnail import delete as delete_with_thumbnails
+from .utils import (
+    file_name_generator,
+    blob_file_name_generator,
+    compute_checksum,
+)
+
+
+# Shortest and longest lifetime of temporary links, in seconds.
+TEMPLINK_MIN_LIFETIME = 300
+TEMPLINK_MAX_LIFETIME = 30000
+
+
+# Request rates are given as number of requests per second, minute,
+# hour or day, e.g. 100/min.
+RATE_VALIDATOR = RegexValidator(
+    r'^[1-9]\d*/[smhd]',
+    'Enter rate as number of requests per period, e.g. 100/min.'
+)
+
+
+def get_blacklist_expiration_date():
+    """
+    Returns date after which any token blacklisted now would have
+    expired anyway.
+    """
+    return timezone.now() + timedelta(seconds=TEMPLINK_MAX_LIFETIME)
 
 
 class ThumbnailSize(models.Model):
@@ -28,6 +57,32 @@ class AccountTier(models.Model):
     show_original = models.BooleanField(default=False)
     can_generate_temp_link = models.BooleanField(default=False)
     default = models.BooleanField(default=False)
+    # Limits checked while images are being uploaded.
+    max_upload_size = models.PositiveBigIntegerField(
+        default=20 * 1024 * 1024,
+        help_text='Maximum size of uploaded image in bytes.'
+    )
+    max_upload_pixels = models.PositiveBigIntegerField(
+        default=50_000_000,
+        help_text='Maximum width times height of uploaded image.'
+    )
+    # Limits of requests to temporary links to images of tier users.
+    templink_rate_limit = models.CharField(
+        max_length=20,
+        blank=True,
+        default='600/min',
+        validators=(RATE_VALIDATOR,),
+        help_text=('Requests to a temporary link, e.g. 600/min. '
+                   'Blank for no limit.')
+    )
+    templink_client_rate_limit = models.CharField(
+        max_length=20,
+        blank=True,
+        default='60/min',
+        validators=(RATE_VALIDATOR,),
+        help_text=('Requests to temporary links from a single client IP, '
+                   'e.g. 60/min. Blank for no limit.')
+    )
 
     def __str__(self):
         return f"{self.name}"
@@ -65,6 +120,67 @@ class User(AbstractUser):
             self.account_tier = AccountTier.get_default()
 
 
+class ImageBlob(models.Model):
+    """
+    Original image file, stored once for all images
+    with identical content. Counts images referencing it.
+    """
+    checksum = models.CharField(max_length=64, unique=True)
+    file = models.ImageField(upload_to=blob_file_name_generator)
+    reference_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"Blob {self.checksum} ({self.reference_count} references)"
+
+    @classmethod
+    def acquire(cls, file_):
+        """
+        Returns blob with content of given file, storing the file
+        only if there is no such blob yet. Adds a reference to the blob.
+        Must be called within a transaction.
+        """
+        checksum = compute_checksum(file_)
+        blob = cls.objects.select_for_update().filter(
+            checksum=checksum
+        ).first()
+        if blob is None:
+            # Insert the row before storing the file, so that concurrent
+            # uploads of the same content lose the race without leaving
+            # their files behind.
+            try:
+                with transaction.atomic():
+                    blob = cls.objects.create(checksum=checksum)
+            except IntegrityError:
+                blob = cls.objects.select_for_update().get(checksum=checksum)
+            else:
+                blob.file.save(file_.name, file_)
+        cls.objects.filter(pk=blob.pk).update(
+            reference_count=models.F('reference_count') + 1
+        )
+        return blob
+
+    @classmethod
+    def release(cls, pk):
+        """
+        Removes a reference to blob. Deletes blob along with its file
+        and thumbnails once it is no longer referenced.
+        Must be called within a transaction.
+        """
+        blob = cls.objects.select_for_update().filter(pk=pk).first()
+        if blob is None:
+            return
+
+        if blob.reference_count > 1:
+            cls.objects.filter(pk=pk).update(
+                reference_count=models.F('reference_count') - 1
+            )
+            return
+
+        blob.delete()
+        # Keep files until deletion is committed.
+        transaction.on_commit(lambda: delete_with_thumbnails(blob.file))
+
+
 class Image(models.Model):
     image = models.ImageField(
         upload_to=file_name_generator,
@@ -78,13 +194,89 @@ class Image(models.Model):
         on_delete=models.CASCADE, 
         related_name='images'
     )
+    blob = models.ForeignKey(
+        ImageBlob,
+        on_delete=models.PROTECT,
+        related_name='images',
+        blank=True,
+        null=True,
+    )
+    # Metadata of stored original, saved at upload.
+    width = models.PositiveIntegerField(blank=True, null=True, db_index=True)
+    height = models.PositiveIntegerField(blank=True, null=True, db_index=True)
+    size = models.PositiveBigIntegerField(blank=True, null=True, db_index=True)
+    format = models.CharField(max_length=10, blank=True, db_index=True)
+    checksum = models.CharField(max_length=64, blank=True, db_index=True)
 
     def __str__(self):
         return f"Image {self.image.url}"
+
+    class Meta:
+        # Lists of user's images are paginated by pk.
+        indexes = [
+            models.Index(fields=['owner', 'id'], name='image_owner_id_idx'),
+        ]
     
 
+class UploadSession(models.Model):
+    """
+    Image being uploaded in chunks. Each chunk is stored as a separate
+    file named after its offset, so upload can be resumed after
+    a dropped connection on any storage backend.
+    """
+    id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    file_name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Upload of {self.file_name} ({self.offset}/{self.size} bytes)"
+
+    def is_complete(self):
+        return self.offset == self.size
+
+    def get_parts_directory(self):
+        return f"uploads/{self.pk}"
+
+    def get_part_names(self):
+        """
+        Returns storage names of received chunks, in order.
+        """
+        directory = self.get_parts_directory()
+        try:
+            _, files = default_storage.listdir(directory)
+        except FileNotFoundError:
+            return []
+        return [f"{directory}/{name}" for name in sorted(files)]
+
+    def save_part(self, offset, content):
+        """
+        Stores chunk received at given offset.
+        """
+        # Zero padded offsets sort in upload order.
+        name = f"{self.get_parts_directory()}/{offset:020d}"
+        # Replace part left over by a chunk which was not committed.
+        default_storage.delete(name)
+        return default_storage.save(name, content)
+
+    def read_parts(self):
+        """
+        Yields uploaded content chunk by chunk.
+        """
+        for name in self.get_part_names():
+            with default_storage.open(name) as part:
+                yield from part.chunks()
+
+
 class TempLink(models.Model):
-    token = models.CharField(max_length=45, unique=True)
+    token = models.CharField(max_length=64, unique=True)
     image = models.ForeignKey(
         Image, 
         on_delete=models.CASCADE, 
@@ -93,8 +285,8 @@ class TempLink(models.Model):
     created = models.DateTimeField(auto_now_add=True)
     expires_in = models.IntegerField(
         validators=(
-            MinValueValidator(300),
-            MaxValueValidator(30000)
+            MinValueValidator(TEMPLINK_MIN_LIFETIME),
+            MaxValueValidator(TEMPLINK_MAX_LIFETIME)
         )
     )
     owner = models.ForeignKey(
@@ -102,20 +294,40 @@ class TempLink(models.Model):
         on_delete=models.CASCADE, 
         related_name='temporary_links',
     )
+    # Stored, so that expired links can be found with an index.
+    expires_at = models.DateTimeField(db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        if self.expires_at is None:
+            self.expires_at = (
+                timezone.now() + timedelta(seconds=self.expires_in)
+            )
+        super().save(*args, **kwargs)
 
     def expiration_date(self):
-        expires_in = timedelta(seconds=self.expires_in)
-        return (self.created + expires_in)
+        return self.expires_at
 
     def has_expired(self):
         return (timezone.now() >= self.expiration_date())
     
     def __str__(self):
         return f"Templink ({'expired' if self.has_expired() else 'active'})"
+
+    class Meta:
+        # Lists of image's links are paginated by pk.
+        indexes = [
+            models.Index(fields=['image', 'id'], name='templink_image_id_idx'),
+        ]
     
 
 class TempLinkTokenBlacklist(models.Model):
-    token = models.CharField(max_length=45, unique=True)
+    token = models.CharField(max_length=64, unique=True)
+    # Entries are partitioned by day of token expiration, so that
+    # whole days can be dropped once retention period is over.
+    expires_at = models.DateTimeField(
+        db_index=True,
+        default=get_blacklist_expiration_date
+    )
 
 
 
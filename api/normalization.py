@@ -0,0 +1,88 @@
+from hashlib import sha256
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+from .utils import compute_checksum
+
+
+# EXIF tag holding image orientation.
+ORIENTATION = 0x0112
+
+# Image info kept when original is re-encoded. Colour profile
+# changes how pixels are rendered, so it is not stripped.
+PRESERVED_INFO = ('icc_profile', 'transparency')
+
+
+def normalize_image(file_):
+    """
+    Prepares uploaded image for storage. Applies EXIF orientation,
+    strips metadata once it exceeds IMAGE_METADATA_MAX_SIZE and
+    downscales images larger than IMAGE_MAX_DIMENSION. Returns file
+    to store, which is the given one if nothing had to change, and
+    its metadata as Image field values.
+    """
+    file_.seek(0)
+    with Image.open(file_) as image:
+        format_ = image.format
+        orientation = image.getexif().get(ORIENTATION, 1)
+        max_dimension = settings.IMAGE_MAX_DIMENSION
+        too_large = bool(max_dimension) and max(image.size) > max_dimension
+
+        if (orientation == 1 and not too_large
+                and metadata_size(image) <= settings.IMAGE_METADATA_MAX_SIZE):
+            file_.seek(0)
+            return file_, {
+                'width': image.width,
+                'height': image.height,
+                'format': format_,
+                'size': file_.size,
+                'checksum': compute_checksum(file_),
+            }
+
+        normalized = ImageOps.exif_transpose(image)
+        if too_large:
+            normalized.thumbnail(
+                (max_dimension, max_dimension),
+                Image.Resampling.LANCZOS
+            )
+        content = encode(normalized, format_, image.info)
+
+    normalized_file = ContentFile(content, name=file_.name)
+    normalized_file.checksum = sha256(content).hexdigest()
+    return normalized_file, {
+        'width': normalized.width,
+        'height': normalized.height,
+        'format': format_,
+        'size': len(content),
+        'checksum': normalized_file.checksum,
+    }
+
+
+def metadata_size(image):
+    """
+    Returns number of bytes taken by image metadata, e.g. EXIF and XMP
+    data or embedded previews.
+    """
+    return sum(
+        len(value) for key, value in image.info.items()
+        if key not in PRESERVED_INFO and isinstance(value, (bytes, str))
+    )
+
+
+def encode(image, format_, info):
+    """
+    Encodes image without metadata, except for preserved info.
+    """
+    options = {
+        key: info[key] for key in PRESERVED_INFO
+        if info.get(key) is not None
+    }
+    if format_ == 'JPEG':
+        options['quality'] = settings.IMAGE_NORMALIZE_QUALITY
+
+    # Savers fall back to image info for some metadata, e.g. comments.
+    image.info = {}
+    buffer = BytesIO()
+    image.save(buffer, format_, **options)
+    return buffer.getvalue()
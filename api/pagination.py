@@ -0,0 +1,22 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination seeking pages by the last seen value of view's
+    unique, indexed ordering key, so that deep pages cost as much as
+    the first one. Clients may ask for pages of up to API_MAX_PAGE_SIZE
+    items with ?page_size=, API_PAGE_SIZE by default.
+    """
+
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        self.page_size = settings.API_PAGE_SIZE
+        self.max_page_size = settings.API_MAX_PAGE_SIZE
+        return super().get_page_size(request)
+
+    def get_ordering(self, request, queryset, view):
+        self.ordering = view.ordering
+        return super().get_ordering(request, queryset, view)
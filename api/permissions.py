@@ -1,6 +1,7 @@
 from rest_framework import permissions
 from django.utils.translation import gettext_lazy as _
 from .models import AccountTier
+from .tier_cache import get_user_account_tier
 
 
 class IsOwner(permissions.BasePermission):
@@ -27,11 +28,7 @@ class CanCreateTempLinks(permissions.BasePermission):
         "for temporary links creation."))
     
     def has_permission(self, request, view):
-        account_tier = getattr(
-            request.user, 
-            'account_tier', 
-            None
-        )
+        account_tier = get_user_account_tier(request.user)
         if account_tier:
             return account_tier.can_generate_temp_link
         return False
\ No newline at end of file
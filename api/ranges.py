@@ -0,0 +1,182 @@
+from uuid import uuid4
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.http import parse_http_date_safe
+from .streaming import AsyncStreamingHttpResponse, aread_blocks
+
+
+# Requests asking for more ranges than that get the whole file,
+# as serving them would cost more than the full transfer.
+MAX_RANGES = 16
+
+# Ranges are read from file in blocks of that many bytes.
+BLOCK_SIZE = 64 * 1024
+
+
+def parse_ranges(header, size):
+    """
+    Returns sorted list of (first, last) byte positions requested
+    by Range header, with overlapping ranges merged. Returns None
+    if whole file should be sent instead, i.e. header is missing,
+    malformed or asks for too many ranges. Returns empty list if
+    none of the ranges can be satisfied.
+    """
+    unit, _, specs = (header or '').partition('=')
+    if unit.strip().lower() != 'bytes' or not specs:
+        return None
+
+    specs = specs.split(',')
+    if len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for spec in specs:
+        first, dash, last = spec.strip().partition('-')
+        if not dash or not (first or last):
+            return None
+        if not all(value.isdigit() for value in (first, last) if value):
+            return None
+
+        if first:
+            first = int(first)
+            if last and int(last) < first:
+                return None
+            last = int(last) if last else size - 1
+        else:
+            # Suffix range, i.e. last N bytes.
+            first = max(size - int(last), 0)
+            last = size - 1
+
+        last = min(last, size - 1)
+        if first <= last:
+            ranges.append((first, last))
+
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def range_applies(request, etag, last_modified):
+    """
+    Checks If-Range header. Range is ignored if representation
+    has changed since the client got its part.
+    """
+    if_range = request.headers.get('If-Range')
+    if if_range is None:
+        return True
+    if if_range.startswith('W/'):
+        # Weak validators do not guarantee identical bytes.
+        return False
+    if if_range.startswith('"'):
+        return etag is not None and if_range == etag
+    return (last_modified is not None
+            and parse_http_date_safe(if_range) == int(last_modified))
+
+
+def ranged_file_response(file_, size, ranges, content_type, asynchronous=False):
+    """
+    Returns 206 response streaming given ranges of file, as multipart
+    byteranges if there is more than one. Reads the ranges straight
+    from the file, without blocking the event loop if asynchronous.
+    Returns 416 response if no range is satisfiable.
+    """
+    if not ranges:
+        file_.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if asynchronous:
+        response_class, read_ranges = AsyncStreamingHttpResponse, _aread_ranges
+    else:
+        response_class, read_ranges = StreamingHttpResponse, _read_ranges
+
+    if len(ranges) == 1:
+        first, last = ranges[0]
+        response = response_class(
+            read_ranges(file_, [(b'', first, last)]),
+            status=206,
+            content_type=content_type
+        )
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+        response['Content-Length'] = last - first + 1
+        return response
+
+    boundary = uuid4().hex
+    parts = [
+        (
+            (f'\r\n--{boundary}\r\n'
+             f'Content-Type: {content_type}\r\n'
+             f'Content-Range: bytes {first}-{last}/{size}\r\n'
+             f'\r\n').encode(),
+            first,
+            last
+        )
+        for first, last in ranges
+    ]
+    closing = f'\r\n--{boundary}--\r\n'.encode()
+    response = response_class(
+        read_ranges(file_, parts, closing),
+        status=206,
+        content_type=f'multipart/byteranges; boundary={boundary}'
+    )
+    response['Content-Length'] = len(closing) + sum(
+        len(header) + last - first + 1 for header, first, last in parts
+    )
+    return response
+
+
+def async_file_response(file_, size, content_type):
+    """
+    Returns response streaming whole file without blocking the event
+    loop.
+    """
+    response = AsyncStreamingHttpResponse(
+        _aread_ranges(file_, [(b'', 0, size - 1)]),
+        content_type=content_type
+    )
+    response['Content-Length'] = size
+    return response
+
+
+def _read_ranges(file_, parts, closing=b''):
+    """
+    Yields header and content of each (header, first, last) part.
+    Closes the file when done or when response is closed.
+    """
+    try:
+        for header, first, last in parts:
+            if header:
+                yield header
+            file_.seek(first)
+            remaining = last - first + 1
+            while remaining:
+                block = file_.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                remaining -= len(block)
+                yield block
+        if closing:
+            yield closing
+    finally:
+        file_.close()
+
+
+async def _aread_ranges(file_, parts, closing=b''):
+    """
+    Async version of _read_ranges, reading the file in threads.
+    """
+    try:
+        for header, first, last in parts:
+            if header:
+                yield header
+            async for block in aread_blocks(file_, first, last, BLOCK_SIZE):
+                yield block
+        if closing:
+            yield closing
+    finally:
+        await sync_to_async(file_.close, thread_sensitive=False)()
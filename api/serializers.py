@@ -1,10 +1,29 @@
+from datetime import timedelta
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from django.core.files.base import File
+from django.db import transaction
+from django.db.models import Manager
+from django.template.defaultfilters import filesizeformat
 from django.urls import reverse
+from django.utils import timezone
+from celery import group
 from rest_framework import serializers, exceptions
-from .models import User, Image, TempLink
-from sorl.thumbnail import get_thumbnail
-from .utils import generate_token
+from imaginarium.tasks import generate_thumbnails
+from .models import (
+    TEMPLINK_MAX_LIFETIME,
+    TEMPLINK_MIN_LIFETIME,
+    User,
+    Image,
+    ImageBlob,
+    UploadSession,
+    TempLink,
+)
+from .normalization import normalize_image
+from .thumbnails import get_preferred_thumbnails
+from .tier_cache import get_account_tier, get_user_account_tier
+from .utils import generate_token, generate_tokens, generate_signed_token
 
 
 class UserPrivateSerializer(serializers.ModelSerializer):
@@ -51,6 +70,51 @@ class UserPublicSerializer(serializers.HyperlinkedModelSerializer):
         )
 
 
+class ImageListSerializer(serializers.ListSerializer):
+    """
+    Serializer for listing images and uploading many at once.
+    """
+
+    def create(self, validated_data):
+        """
+        Creates image instances in one transaction and one query.
+        Appends request.user as owner and normalizes originals.
+        Schedules thumbnails generation for all of them as a group
+        once committed.
+        """
+        request = self.context.get('request')
+
+        # Make sure this was called by authenticated user.
+        assert request.user.is_authenticated, (
+            'Only authenticated users can upload images.'
+        )
+
+        # Normalize outside of transaction, it may take a while.
+        originals = [
+            normalize_image(data.pop('image')) for data in validated_data
+        ]
+
+        with transaction.atomic():
+            images = []
+            for data, (file_, metadata) in zip(validated_data, originals):
+                blob = ImageBlob.acquire(file_)
+                images.append(Image(
+                    **data,
+                    **metadata,
+                    image=blob.file.name,
+                    blob=blob,
+                    owner=request.user
+                ))
+            instances = Image.objects.bulk_create(images)
+
+        # Render thumbnails in the background.
+        pks = [instance.pk for instance in instances]
+        transaction.on_commit(
+            lambda: group([generate_thumbnails.si(pk) for pk in pks]).delay()
+        )
+        return instances
+
+
 class ImageSerializer(serializers.HyperlinkedModelSerializer):
     """
     Serializer for listing and uploading images.
@@ -74,9 +138,37 @@ class ImageSerializer(serializers.HyperlinkedModelSerializer):
             }
         }
 
+        list_serializer_class = ImageListSerializer
+
+    def validate_image(self, value):
+        """
+        Enforces upload limits of user's account tier, also for files
+        which did not stream through upload handlers.
+        """
+        request = self.context.get('request')
+        account = get_user_account_tier(request.user)
+        if account is None:
+            return value
+
+        if value.size > account.max_upload_size:
+            raise serializers.ValidationError(
+                f'File exceeds {filesizeformat(account.max_upload_size)}.'
+            )
+
+        width, height = value.image.size
+        if width * height > account.max_upload_pixels:
+            raise serializers.ValidationError(
+                f'Image has {width}x{height} pixels, '
+                f'account tier allows up to {account.max_upload_pixels}.'
+            )
+        return value
+
     def create(self, validated_data):
         """
         Creates new image instance. Appends reuqest.user as owner.
+        Normalizes the original and saves its metadata.
+        Uploads with already stored content only reference it.
+        Schedules thumbnails generation once the image is committed.
         """
         request = self.context.get('request')
 
@@ -85,12 +177,26 @@ class ImageSerializer(serializers.HyperlinkedModelSerializer):
             'Only authenticated users can upload images.'
         )
 
-        # Create instance.
-        instance = Image.objects.create(
-            **validated_data,
-            owner=request.user
+        # Normalize outside of transaction, it may take a while.
+        file_, metadata = normalize_image(validated_data.pop('image'))
+
+        # Store file content once and share it between duplicates.
+        with transaction.atomic():
+            blob = ImageBlob.acquire(file_)
+
+            # Create instance.
+            instance = Image.objects.create(
+                **validated_data,
+                **metadata,
+                image=blob.file.name,
+                blob=blob,
+                owner=request.user
+            )
+
+        # Render thumbnails in the background.
+        transaction.on_commit(
+            lambda: generate_thumbnails.delay(instance.pk)
         )
-        instance.save()
         return instance
     
 
@@ -98,6 +204,7 @@ class ImageDetailSerializer(ImageSerializer):
     """
     Serializer for accessing image details.
     Details depend on owner's account tier's properties.
+    Originals cannot be replaced, images are uploaded anew instead.
     """
 
     class Meta:
@@ -108,6 +215,10 @@ class ImageDetailSerializer(ImageSerializer):
             'image',
         )
 
+        # Replacing the original would bypass normalization, blob
+        # references, thumbnails and cached temporary links.
+        read_only_fields = ('image',)
+
     def to_representation(self, instance):
         """
         Make sure returned data is trimmed in accordance with
@@ -115,24 +226,26 @@ class ImageDetailSerializer(ImageSerializer):
         """
         request = self.context.get('request')
         result = super().to_representation(instance)
-        account = instance.owner.account_tier
+        account, sizes = self.get_account_tier(instance)
 
         # Decide whether to preserve original image link.
-        if not account.show_original:
+        if account is None or not account.show_original:
             del result['image']
         
-        # Add absolute urls to thumbnails of predefined sizes.
-        for size in account.thumbnail_sizes.all():
-            thumbnail = get_thumbnail(
-                instance.image, 
-                f"x{size.height}", 
-                quality=50
-            )
+        # Add absolute urls to thumbnails of predefined sizes,
+        # in format chosen by request's Accept header.
+        # Thumbnails are rendered in the background - pending ones
+        # are reported as null.
+        thumbnails = self.get_thumbnails(instance, sizes)
+        for size in sizes:
+            thumbnail = thumbnails[instance.pk, size.pk]
             result[f"thumbnail-{size.height}px"] = (
-                request.build_absolute_uri(thumbnail.url))
+                request.build_absolute_uri(thumbnail.url)
+                if thumbnail else None
+            )
             
         # Add URL to temporary links.
-        if account.can_generate_temp_link:
+        if account is not None and account.can_generate_temp_link:
             relative_url = reverse(
                 'templink-list-create', 
                 kwargs={'image_pk': instance.pk}
@@ -140,6 +253,22 @@ class ImageDetailSerializer(ImageSerializer):
             result['templink'] = request.build_absolute_uri(relative_url)
         
         return result
+
+    def get_account_tier(self, instance):
+        """
+        Returns account tier of image owner and its thumbnail sizes.
+        """
+        account = get_account_tier(instance.owner.account_tier_id)
+        if account is None:
+            return None, []
+        return account, list(account.thumbnail_sizes.all())
+
+    def get_thumbnails(self, instance, sizes):
+        return get_preferred_thumbnails(
+            [instance],
+            sizes,
+            self.context.get('request')
+        )
     
     def create(self, validated_data):
         raise exceptions.PermissionDenied((
@@ -148,6 +277,98 @@ class ImageDetailSerializer(ImageSerializer):
         ))
     
 
+class ImageGalleryListSerializer(ImageListSerializer):
+    """
+    Serializer for listing images along with their thumbnails. Looks
+    account tier and thumbnails up once for all listed images.
+    """
+
+    def to_representation(self, data):
+        request = self.context.get('request')
+        images = list(data.all() if isinstance(data, Manager) else data)
+
+        # Listed images belong to requesting user.
+        account = get_user_account_tier(request.user)
+        sizes = list(account.thumbnail_sizes.all()) if account else []
+        self.child.account_tier = (account, sizes)
+        self.child.thumbnails = get_preferred_thumbnails(images, sizes, request)
+        return super().to_representation(images)
+
+
+class ImageGallerySerializer(ImageDetailSerializer):
+    """
+    Serializer for listing images with details, e.g. for galleries.
+    Must be used through ImageGalleryListSerializer.
+    """
+
+    class Meta:
+        model = Image
+
+        fields = (
+            'pk',
+            'url',
+            'image',
+        )
+
+        list_serializer_class = ImageGalleryListSerializer
+
+    def get_account_tier(self, instance):
+        return self.account_tier
+
+    def get_thumbnails(self, instance, sizes):
+        return self.thumbnails
+
+
+class UploadSessionSerializer(serializers.HyperlinkedModelSerializer):
+    """
+    Serializer for starting resumable uploads and showing their progress.
+    """
+
+    url = serializers.HyperlinkedIdentityField(
+        view_name='upload-session-detail'
+    )
+
+    class Meta:
+        model = UploadSession
+
+        fields = (
+            'id',
+            'url',
+            'file_name',
+            'size',
+            'offset',
+            'created',
+            'updated',
+        )
+
+        read_only_fields = (
+            'offset',
+        )
+
+    def validate_file_name(self, value):
+        # Fail early instead of after the whole file was uploaded.
+        Image._meta.get_field('image').run_validators(File(None, value))
+        return value
+
+    def validate_size(self, value):
+        account = get_user_account_tier(self.context.get('request').user)
+        if account is not None and value > account.max_upload_size:
+            raise serializers.ValidationError(
+                f'File exceeds {filesizeformat(account.max_upload_size)}.'
+            )
+        return value
+
+    def create(self, validated_data):
+        """
+        Creates new session. Appends request.user as owner.
+        """
+        request = self.context.get('request')
+        return UploadSession.objects.create(
+            **validated_data,
+            owner=request.user
+        )
+
+
 class TempLinkSerializer(serializers.ModelSerializer):
     """
     Serializer for temporary links. Replaces token with full URL.
@@ -164,6 +385,7 @@ class TempLinkSerializer(serializers.ModelSerializer):
             'image',
             'created',
             'expires_in',
+            'expires_at',
         )
 
         extra_kwargs = {
@@ -179,19 +401,20 @@ class TempLinkSerializer(serializers.ModelSerializer):
         """
         
         view = self.context.get('view')
-        image = Image.objects.get(pk=view.kwargs['image_pk'])
+        image = view.get_image()
 
-        token = generate_token()
+        if settings.TEMPLINK_SIGNED_TOKENS:
+            token = generate_signed_token(image.pk, validated_data['expires_in'])
+        else:
+            token = generate_token()
 
         # Create and save.
-        instance = TempLink.objects.create(
+        return TempLink.objects.create(
             **validated_data,
             token=token,
             image=image,
             owner=image.owner
         )
-        instance.save()
-        return instance
 
     def to_representation(self, instance):
         """
@@ -205,4 +428,76 @@ class TempLinkSerializer(serializers.ModelSerializer):
         result['link'] = request.build_absolute_uri((
             f'/api/templink/{instance.token}/'
         ))
-        return result
\ No newline at end of file
+        return result
+
+
+class TempLinkBulkSerializer(serializers.Serializer):
+    """
+    Serializer for creating temporary links to many images at once.
+    Represents created links with TempLinkSerializer.
+    """
+
+    images = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False
+    )
+    expires_in = serializers.IntegerField(
+        min_value=TEMPLINK_MIN_LIFETIME,
+        max_value=TEMPLINK_MAX_LIFETIME
+    )
+
+    def validate_images(self, value):
+        """
+        Makes sure all images belong to requesting user, checking them
+        with one query. Drops duplicates.
+        """
+        image_pks = list(dict.fromkeys(value))
+        max_images = settings.TEMPLINK_BULK_MAX_IMAGES
+        if len(image_pks) > max_images:
+            raise serializers.ValidationError(
+                f'At most {max_images} images can be linked at once.'
+            )
+
+        request = self.context.get('request')
+        owned = set(
+            Image.objects.filter(pk__in=image_pks, owner=request.user)
+            .values_list('pk', flat=True)
+        )
+        missing = [pk for pk in image_pks if pk not in owned]
+        if missing:
+            raise serializers.ValidationError(
+                f'Images do not exist or belong to another user: '
+                f'{", ".join(map(str, missing))}.'
+            )
+        return image_pks
+
+    def create(self, validated_data):
+        """
+        Creates links to all images with one query, in order of images.
+        """
+        image_pks = validated_data['images']
+        expires_in = validated_data['expires_in']
+        owner = self.context.get('request').user
+        created = timezone.now()
+
+        if settings.TEMPLINK_SIGNED_TOKENS:
+            tokens = [
+                generate_signed_token(image_pk, expires_in, created)
+                for image_pk in image_pks
+            ]
+        else:
+            tokens = generate_tokens(len(image_pks))
+
+        return TempLink.objects.bulk_create([
+            TempLink(
+                token=token,
+                image_id=image_pk,
+                owner=owner,
+                expires_in=expires_in,
+                expires_at=created + timedelta(seconds=expires_in)
+            )
+            for image_pk, token in zip(image_pks, tokens)
+        ])
+
+    def to_representation(self, instance):
+        return TempLinkSerializer(instance, many=True, context=self.context).data
@@ -0,0 +1,159 @@
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import (
+    m2m_changed,
+    pre_save,
+    post_save,
+    post_delete,
+)
+from django.dispatch import receiver
+from imaginarium.tasks import backfill_thumbnails
+from .models import (
+    User,
+    AccountTier,
+    ThumbnailSize,
+    Image,
+    ImageBlob,
+    UploadSession,
+    TempLink,
+    TempLinkTokenBlacklist,
+)
+from .blacklist import add_to_filters
+from .templink_cache import invalidate_link
+from .tier_cache import invalidate_account_tier
+
+
+@receiver(m2m_changed, sender=AccountTier.thumbnail_sizes.through)
+def backfill_added_thumbnail_sizes(sender, instance, action, reverse,
+                                   pk_set, **kwargs):
+    """
+    Renders new thumbnail sizes for images of affected account tiers.
+    """
+    if action != 'post_add' or not pk_set:
+        return
+
+    # Reverse relation means sizes were given tiers, not the other way.
+    tier_pks = pk_set if reverse else {instance.pk}
+    for tier_pk in tier_pks:
+        transaction.on_commit(
+            lambda tier_pk=tier_pk: backfill_thumbnails.delay(tier_pk=tier_pk)
+        )
+
+
+@receiver(post_save, sender=AccountTier)
+@receiver(post_delete, sender=AccountTier)
+def invalidate_cached_account_tier(sender, instance, **kwargs):
+    """
+    Drops changed account tier from caches of all processes.
+    """
+    invalidate_account_tier(instance.pk)
+
+
+@receiver(m2m_changed, sender=AccountTier.thumbnail_sizes.through)
+def invalidate_cached_thumbnail_sizes(sender, instance, action, reverse,
+                                      pk_set, **kwargs):
+    """
+    Drops account tiers which got or lost thumbnail sizes from caches.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        invalidate_account_tier(instance.pk)
+    elif pk_set:
+        for tier_pk in pk_set:
+            invalidate_account_tier(tier_pk)
+    else:
+        # Size was removed from all of its tiers.
+        invalidate_account_tier()
+
+
+@receiver(post_save, sender=ThumbnailSize)
+@receiver(post_delete, sender=ThumbnailSize)
+def invalidate_cached_tiers_of_size(sender, instance, **kwargs):
+    """
+    Drops all account tiers from caches, as any of them may use
+    the changed size.
+    """
+    invalidate_account_tier()
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_account_tier(sender, instance, update_fields=None,
+                                   **kwargs):
+    """
+    Stores account tier the user had before save.
+    """
+    # Skip the lookup on partial saves, e.g. last_login updates.
+    if update_fields is not None and 'account_tier' not in update_fields:
+        instance._previous_account_tier_id = instance.account_tier_id
+        return
+
+    instance._previous_account_tier_id = (
+        User.objects.filter(pk=instance.pk)
+        .values_list('account_tier_id', flat=True)
+        .first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=User)
+def backfill_changed_account_tier(sender, instance, created, **kwargs):
+    """
+    Renders thumbnails of new account tier for images of the user.
+    """
+    previous = getattr(instance, '_previous_account_tier_id', None)
+    if created or instance.account_tier_id in (None, previous):
+        return
+
+    transaction.on_commit(
+        lambda: backfill_thumbnails.delay(user_pk=instance.pk)
+    )
+
+
+@receiver(post_delete, sender=Image)
+def release_image_blob(sender, instance, **kwargs):
+    """
+    Drops deleted image's reference to its original file.
+    """
+    if instance.blob_id is not None:
+        ImageBlob.release(instance.blob_id)
+
+
+@receiver(post_delete, sender=UploadSession)
+def delete_upload_session_file(sender, instance, **kwargs):
+    """
+    Removes parts of finished or abandoned upload.
+    """
+    # Deleted instance loses its primary key, so list parts right away.
+    names = instance.get_part_names()
+
+    def delete_parts():
+        for name in names:
+            default_storage.delete(name)
+
+    transaction.on_commit(delete_parts)
+
+
+@receiver(post_delete, sender=TempLink)
+@receiver(post_save, sender=TempLinkTokenBlacklist)
+def invalidate_cached_templink(sender, instance, **kwargs):
+    """
+    Stops serving deleted or blacklisted temporary link from cache.
+    """
+    # Entries of expired links are already gone from the shared cache.
+    if isinstance(instance, TempLink) and instance.has_expired():
+        return
+
+    token = instance.token
+    transaction.on_commit(lambda: invalidate_link(token))
+
+
+@receiver(post_save, sender=TempLinkTokenBlacklist)
+def add_token_to_blacklist_filter(sender, instance, created, **kwargs):
+    """
+    Makes blacklist filter aware of the token. Done before commit,
+    as false positives only cost a database lookup.
+    """
+    if created:
+        add_to_filters([(instance.token, instance.expires_at)])
@@ -0,0 +1,86 @@
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+from django.http import StreamingHttpResponse
+
+
+class AsyncStreamingHttpResponse(StreamingHttpResponse):
+    """
+    Streaming response with an async iterator as content, sent by
+    AsyncStreamingASGIHandler without blocking the event loop. Servers
+    which can only iterate responses synchronously, e.g. WSGI ones,
+    get the whole content read at once.
+    """
+
+    @property
+    def streaming_content(self):
+        return self._consume()
+
+    @streaming_content.setter
+    def streaming_content(self, value):
+        # Content closes its resources once exhausted or finalized.
+        self._iterator = value.__aiter__()
+
+    async def __aiter__(self):
+        async for part in self._iterator:
+            yield self.make_bytes(part)
+
+    def _consume(self):
+        async def collect():
+            return [part async for part in self]
+        return iter(async_to_sync(collect)())
+
+
+class AsyncStreamingASGIHandler(ASGIHandler):
+    """
+    ASGI handler sending AsyncStreamingHttpResponse content as it is
+    produced. Other responses are sent as usual.
+    """
+
+    async def send_response(self, response, send):
+        if not isinstance(response, AsyncStreamingHttpResponse):
+            return await super().send_response(response, send)
+
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            response_headers.append(
+                (b'Set-Cookie', cookie.output(header='').encode('ascii').strip())
+            )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+        try:
+            async for part in response:
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({
+                        'type': 'http.response.body',
+                        'body': chunk,
+                        'more_body': True,
+                    })
+            await send({'type': 'http.response.body'})
+        finally:
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+
+async def aread_blocks(file_, first, last, block_size):
+    """
+    Yields bytes first to last of file in blocks, reading each of them
+    in a thread, so that slow storage does not block the event loop.
+    """
+    read = sync_to_async(file_.read, thread_sensitive=False)
+    seek = sync_to_async(file_.seek, thread_sensitive=False)
+    await seek(first)
+    remaining = last - first + 1
+    while remaining > 0:
+        block = await read(min(block_size, remaining))
+        if not block:
+            break
+        remaining -= len(block)
+        yield block
@@ -0,0 +1,138 @@
+from collections import OrderedDict, namedtuple
+from threading import Lock
+from time import monotonic, time
+from django.conf import settings
+from django.core.cache import cache
+
+
+# Details of original needed to serve temporary link, along with
+# link expiration timestamp and pk of its owner's account tier, whose
+# rate limits are read from tier cache, so that changes apply at once.
+CachedLink = namedtuple('CachedLink', (
+    'name',
+    'checksum',
+    'size',
+    'expires',
+    'account_tier',
+))
+
+# Version of cached entries, bumped whenever CachedLink changes.
+CACHE_VERSION = 3
+
+
+class LocalCache:
+    """
+    Small in-process LRU cache absorbing bursts of requests for the same
+    links. Other processes cannot invalidate its entries, so they are
+    kept for TEMPLINK_LOCAL_CACHE_TIMEOUT seconds at most.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            value, stale_at = entry
+            if monotonic() >= stale_at:
+                del self.entries[key]
+                return None
+
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        max_size = settings.TEMPLINK_LOCAL_CACHE_SIZE
+        timeout = min(timeout, settings.TEMPLINK_LOCAL_CACHE_TIMEOUT)
+        if max_size <= 0 or timeout <= 0:
+            return
+
+        with self.lock:
+            self.entries[key] = (value, monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > max_size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_cache = LocalCache()
+
+
+def get_cache_key(token):
+    return f'templink:{token}'
+
+
+def get_cached_link(token):
+    """
+    Returns CachedLink for token of valid temporary link. Returns None
+    if token is not cached or its link has expired.
+    """
+    link = local_cache.get(token)
+    if link is None:
+        link = cache.get(get_cache_key(token), version=CACHE_VERSION)
+        if link is None:
+            return None
+        link = CachedLink(*link)
+        local_cache.set(token, link, link.expires - time())
+
+    if time() >= link.expires:
+        return None
+    return link
+
+
+async def aget_cached_link(token):
+    """
+    Async version of get_cached_link.
+    """
+    link = local_cache.get(token)
+    if link is None:
+        link = await cache.aget(get_cache_key(token), version=CACHE_VERSION)
+        if link is None:
+            return None
+        link = CachedLink(*link)
+        local_cache.set(token, link, link.expires - time())
+
+    if time() >= link.expires:
+        return None
+    return link
+
+
+def cache_link(token, image, expiration_date, account_tier_id):
+    """
+    Caches details of image served by temporary link for the remaining
+    lifetime of the link, along with pk of its owner's account tier.
+    """
+    expires = expiration_date.timestamp()
+    timeout = int(expires - time())
+    if timeout <= 0:
+        return
+
+    link = CachedLink(
+        image.image.name,
+        image.checksum,
+        image.size,
+        expires,
+        account_tier_id,
+    )
+    cache.set(get_cache_key(token), tuple(link), timeout, version=CACHE_VERSION)
+    local_cache.set(token, link, timeout)
+
+
+def invalidate_link(token):
+    """
+    Removes token from caches, e.g. after its link was deleted or revoked.
+    Entries cached by other processes expire on their own.
+    """
+    local_cache.delete(token)
+    cache.delete(get_cache_key(token), version=CACHE_VERSION)
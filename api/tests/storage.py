@@ -0,0 +1,45 @@
+from django.core.files.storage import FileSystemStorage, Storage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class RemoteStorage(Storage):
+    """
+    Stand-in for S3-compatible storage backends. Keeps files in
+    MEDIA_ROOT, but like object storage has no local paths, cannot
+    modify stored files in place and lists missing directories as empty.
+    """
+
+    def __init__(self):
+        self.backend = FileSystemStorage()
+
+    def _open(self, name, mode='rb'):
+        if mode != 'rb':
+            raise ValueError(f'Mode {mode} is not supported.')
+        return self.backend._open(name, mode)
+
+    def _save(self, name, content):
+        return self.backend._save(name, content)
+
+    def path(self, name):
+        raise NotImplementedError("This backend doesn't support absolute paths.")
+
+    def delete(self, name):
+        self.backend.delete(name)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def listdir(self, path):
+        if not self.backend.exists(path):
+            return [], []
+        return self.backend.listdir(path)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
@@ -0,0 +1,108 @@
+from datetime import timedelta
+from unittest import mock
+from django.test import TestCase, override_settings
+from api.blacklist import (
+    get_filter_store,
+    get_partition_start,
+    get_retained_partitions,
+    is_blacklisted,
+    load_filter_store,
+    might_be_blacklisted,
+)
+from api.models import TempLinkTokenBlacklist
+from api.utils import generate_token
+from imaginarium.tasks import maintain_templink_blacklist
+
+
+@override_settings(
+    TEMPLINK_BLACKLIST_FILTER_STORE='api.blacklist.MemoryFilterStore',
+    TEMPLINK_BLACKLIST_FILTER_CAPACITY=1000,
+    TEMPLINK_BLACKLIST_RETENTION_DAYS=2
+)
+class BlacklistTestCase(TestCase):
+    """
+    Tests for partitioned templink token blacklist and its filters.
+    """
+
+    def setUp(self):
+        # Each test starts with empty filters.
+        load_filter_store.cache_clear()
+
+    def test_filter_rules_out_tokens_without_db(self):
+        """
+        Tests tokens which are not blacklisted are told apart without
+        database lookups once filters are built.
+        """
+        TempLinkTokenBlacklist.objects.create(token='revoked')
+        might_be_blacklisted('revoked')
+
+        with self.assertNumQueries(0):
+            self.assertFalse(is_blacklisted('unknown'))
+        self.assertTrue(is_blacklisted('revoked'))
+
+    def test_filters_are_built_from_db(self):
+        """
+        Tests tokens blacklisted before filters were built are found.
+        """
+        with mock.patch('api.blacklist.get_filter_store', lambda: None):
+            TempLinkTokenBlacklist.objects.create(token='revoked')
+
+        self.assertTrue(might_be_blacklisted('revoked'))
+        self.assertTrue(is_blacklisted('revoked'))
+
+    def test_filters_not_built_fall_back_to_db(self):
+        """
+        Tests unbuilt filters cannot rule tokens out.
+        """
+        store = get_filter_store()
+        with mock.patch.object(store, 'builds_on_demand', False):
+            self.assertTrue(might_be_blacklisted('unknown'))
+
+    def test_token_generation_skips_blacklist_queries(self):
+        """
+        Tests generating token only checks active links in database.
+        """
+        might_be_blacklisted('warm-up', get_retained_partitions())
+
+        with self.assertNumQueries(1):
+            generate_token()
+
+    def test_old_partitions_are_dropped(self):
+        """
+        Tests entries past retention period are removed, along with
+        their filters, and retained ones are kept.
+        """
+        oldest = get_retained_partitions()[0]
+        TempLinkTokenBlacklist.objects.create(
+            token='old',
+            expires_at=get_partition_start(oldest) - timedelta(seconds=1)
+        )
+        TempLinkTokenBlacklist.objects.create(
+            token='retained',
+            expires_at=get_partition_start(oldest)
+        )
+        TempLinkTokenBlacklist.objects.create(token='live')
+
+        maintain_templink_blacklist()
+
+        self.assertCountEqual(
+            TempLinkTokenBlacklist.objects.values_list('token', flat=True),
+            ['retained', 'live']
+        )
+        store = get_filter_store()
+        self.assertGreaterEqual(min(store.filters), oldest)
+        self.assertTrue(is_blacklisted('retained', [oldest]))
+
+    @override_settings(TEMPLINK_BLACKLIST_FILTER_CAPACITY=1)
+    def test_overfilled_partition_is_reported(self):
+        """
+        Tests building filter of partition holding more tokens than
+        filter capacity warns about it.
+        """
+        with mock.patch('api.blacklist.get_filter_store', lambda: None):
+            for token in ('first', 'second'):
+                TempLinkTokenBlacklist.objects.create(token=token)
+
+        with self.assertLogs('api.blacklist', 'WARNING') as logs:
+            might_be_blacklisted('unknown')
+        self.assertIn('holds 2 tokens', logs.output[0])
@@ -0,0 +1,92 @@
+from hashlib import sha256
+from io import BytesIO
+from PIL import Image as PILImage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from api.normalization import ORIENTATION, normalize_image
+from .test_views import SAMPLE_JPG, get_path
+
+
+def make_jpeg(size=(300, 200), orientation=None, comment=b''):
+    """
+    Returns uploaded JPEG file with given EXIF orientation and comment.
+    """
+    exif = PILImage.Exif()
+    if orientation is not None:
+        exif[ORIENTATION] = orientation
+
+    buffer = BytesIO()
+    PILImage.new('RGB', size, 'red').save(
+        buffer,
+        'JPEG',
+        exif=exif,
+        comment=comment
+    )
+    return SimpleUploadedFile('image.jpg', buffer.getvalue())
+
+
+class NormalizeImageTestCase(SimpleTestCase):
+    """
+    Tests for normalization of uploaded originals.
+    """
+
+    def test_keeps_image_which_needs_no_changes(self):
+        """
+        Tests file is stored as uploaded if there is nothing to fix.
+        """
+
+        with open(get_path(SAMPLE_JPG), 'rb') as jpg:
+            upload = SimpleUploadedFile(SAMPLE_JPG, jpg.read())
+
+        file_, metadata = normalize_image(upload)
+
+        self.assertIs(file_, upload)
+        self.assertEqual(metadata, {
+            'width': 100,
+            'height': 100,
+            'format': 'JPEG',
+            'size': upload.size,
+            'checksum': sha256(upload.read()).hexdigest(),
+        })
+
+    def test_applies_exif_orientation(self):
+        """
+        Tests rotated image is stored upright, without orientation tag.
+        """
+
+        file_, metadata = normalize_image(make_jpeg(orientation=6))
+
+        self.assertEqual((metadata['width'], metadata['height']), (200, 300))
+        with PILImage.open(file_) as image:
+            self.assertEqual(image.size, (200, 300))
+            self.assertNotIn(ORIENTATION, image.getexif())
+        file_.seek(0)
+        self.assertEqual(
+            metadata['checksum'],
+            sha256(file_.read()).hexdigest()
+        )
+
+    @override_settings(IMAGE_METADATA_MAX_SIZE=1024)
+    def test_strips_bulky_metadata(self):
+        """
+        Tests metadata exceeding the limit is dropped.
+        """
+
+        upload = make_jpeg(comment=b'x' * 2048)
+        file_, metadata = normalize_image(upload)
+
+        self.assertLess(metadata['size'], upload.size)
+        with PILImage.open(file_) as image:
+            self.assertNotIn('comment', image.info)
+
+    @override_settings(IMAGE_MAX_DIMENSION=150)
+    def test_downscales_too_large_images(self):
+        """
+        Tests images exceeding maximum dimension are downscaled.
+        """
+
+        file_, metadata = normalize_image(make_jpeg())
+
+        self.assertEqual((metadata['width'], metadata['height']), (150, 100))
+        with PILImage.open(file_) as image:
+            self.assertEqual(image.size, (150, 100))
@@ -0,0 +1,151 @@
+from shutil import rmtree
+from unittest import mock
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from sorl.thumbnail import default
+from api.models import User, AccountTier, Image
+from api.throttling import load_bucket_store
+from imaginarium.tasks import generate_thumbnails
+from .storage import RemoteStorage
+from .test_views import (
+    SAMPLE_JPG,
+    TEMP_DBM_FILE,
+    TEMP_DIR,
+    TEMP_MEDIA_ROOT,
+    get_path,
+    login,
+    upload_image,
+)
+
+
+def tearDownModule():
+    """ Destroy temporary media root after all test ran. """
+    rmtree(TEMP_DIR, ignore_errors=True)
+
+
+@override_settings(
+    DEFAULT_FILE_STORAGE='api.tests.storage.RemoteStorage',
+    THUMBNAIL_KVSTORE='api.thumbnails.DBMKVStore',
+    THUMBNAIL_DBM_FILE=TEMP_DBM_FILE,
+    MEDIA_ROOT=TEMP_MEDIA_ROOT
+)
+class RemoteStorageTestCase(APITestCase):
+    """
+    Makes sure images, thumbnails, resumable uploads and temporary
+    links work with storage which has no local paths.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.marcin_data = {
+            "username": "Marcin",
+            "password": "Tomato789",
+            "email": "marcin@example.com",
+            "account_tier": AccountTier.objects.get(name='Enterprise')
+        }
+        cls.marcin = User.objects.create_user(**cls.marcin_data)
+
+        with open(get_path(SAMPLE_JPG), 'rb') as jpg:
+            cls.content = jpg.read()
+
+    def setUp(self):
+        # Sorl sets its storage up once per process.
+        patcher = mock.patch.object(default, 'storage', RemoteStorage())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        load_bucket_store.cache_clear()
+        login(self, 'marcin_data')
+
+    def tearDown(self):
+        self.client.logout()
+
+    def test_templink_streams_image_from_storage(self):
+        """
+        Tests temporary link serves the original without its path.
+        """
+
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        self.assertIsInstance(
+            Image.objects.get(pk=image_pk).image.storage._wrapped,
+            RemoteStorage
+        )
+
+        url = reverse('templink-list-create', kwargs={'image_pk': image_pk})
+        link = self.client.post(url, {'expires_in': 300}).data['link']
+        response = self.client.get(link)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    @override_settings(TEMPLINK_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_templink_is_not_handed_over_to_nginx(self):
+        """
+        Tests nginx, which serves local files only, is not asked to send
+        originals kept in object storage. Those are redirected to signed
+        URLs if storage supports them, streamed by the app otherwise.
+        """
+
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        url = reverse('templink-list-create', kwargs={'image_pk': image_pk})
+        link = self.client.post(url, {'expires_in': 300}).data['link']
+
+        response = self.client.get(link)
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+        name = Image.objects.get(pk=image_pk).image.name
+        with mock.patch.object(
+            RemoteStorage,
+            'querystring_auth',
+            True,
+            create=True
+        ), mock.patch.object(RemoteStorage, 'url') as url:
+            url.return_value = 'https://bucket.example.com/signed'
+            response = self.client.get(link)
+
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.assertEqual(response['Location'], url.return_value)
+        url.assert_called_once_with(name, expire=60)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+    def test_thumbnails_are_rendered_and_served_from_storage(self):
+        """
+        Tests thumbnail pipeline reads and writes through storage.
+        """
+
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        generate_thumbnails(image_pk)
+
+        url = reverse('image-thumbnail', kwargs={'pk': image_pk, 'height': 200})
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(b''.join(response.streaming_content))
+
+    def test_resumable_upload_is_stored_in_parts(self):
+        """
+        Tests chunks are stored without modifying files in place.
+        """
+
+        url = reverse('upload-session-create')
+        data = {'file_name': SAMPLE_JPG, 'size': len(self.content)}
+        url = self.client.post(url, data).data['url']
+
+        half = len(self.content) // 2
+        for offset, chunk in ((0, self.content[:half]),
+                              (half, self.content[half:])):
+            response = self.client.put(
+                url,
+                data=chunk,
+                content_type='application/octet-stream',
+                HTTP_UPLOAD_OFFSET=str(offset)
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.post(url + 'complete/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        image = Image.objects.get(pk=response.data['pk'])
+        with image.image.open('rb') as file_:
+            self.assertEqual(file_.read(), self.content)
@@ -0,0 +1,41 @@
+from unittest import mock
+from django.test import SimpleTestCase, override_settings
+from api.templink_cache import LocalCache
+
+
+@override_settings(TEMPLINK_LOCAL_CACHE_SIZE=2, TEMPLINK_LOCAL_CACHE_TIMEOUT=5)
+class LocalCacheTestCase(SimpleTestCase):
+    """
+    Tests for in-process cache of temporary links.
+    """
+
+    def test_evicts_least_recently_used_entries(self):
+        """
+        Tests cache keeps at most TEMPLINK_LOCAL_CACHE_SIZE entries.
+        """
+        local_cache = LocalCache()
+        local_cache.set('a', 1, 60)
+        local_cache.set('b', 2, 60)
+        local_cache.get('a')
+        local_cache.set('c', 3, 60)
+
+        self.assertEqual(local_cache.get('a'), 1)
+        self.assertIsNone(local_cache.get('b'))
+        self.assertEqual(local_cache.get('c'), 3)
+
+    def test_entries_go_stale(self):
+        """
+        Tests entries are kept no longer than given timeout and
+        TEMPLINK_LOCAL_CACHE_TIMEOUT.
+        """
+        local_cache = LocalCache()
+        with mock.patch('api.templink_cache.monotonic', lambda: 100):
+            local_cache.set('short', 1, 2)
+            local_cache.set('long', 2, 60)
+
+        with mock.patch('api.templink_cache.monotonic', lambda: 103):
+            self.assertIsNone(local_cache.get('short'))
+            self.assertEqual(local_cache.get('long'), 2)
+
+        with mock.patch('api.templink_cache.monotonic', lambda: 105):
+            self.assertIsNone(local_cache.get('long'))
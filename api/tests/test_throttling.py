@@ -0,0 +1,66 @@
+from unittest import mock
+from django.test import SimpleTestCase
+from api.throttling import MemoryBucketStore, parse_rate
+
+
+class MemoryBucketStoreTestCase(SimpleTestCase):
+    """
+    Tests for in-process token buckets.
+    """
+
+    def test_parses_rates(self):
+        """
+        Tests rates are turned into capacity and refill per second.
+        """
+        self.assertEqual(parse_rate('60/min'), (60, 1))
+        self.assertEqual(parse_rate('10/s'), (10, 10))
+        self.assertEqual(parse_rate('7200/hour'), (7200, 2))
+
+    def test_buckets_refill_over_time(self):
+        """
+        Tests requests are allowed in bursts up to capacity, then
+        as tokens are refilled.
+        """
+        store = MemoryBucketStore()
+        bucket = ('key', 2, 0.5)
+
+        with mock.patch('api.throttling.monotonic', lambda: 100):
+            self.assertEqual(store.take([bucket]), 0)
+            self.assertEqual(store.take([bucket]), 0)
+            self.assertEqual(store.take([bucket]), 2)
+
+        with mock.patch('api.throttling.monotonic', lambda: 101):
+            self.assertEqual(store.take([bucket]), 1)
+
+        with mock.patch('api.throttling.monotonic', lambda: 102):
+            self.assertEqual(store.take([bucket]), 0)
+
+    def test_takes_from_all_buckets_or_none(self):
+        """
+        Tests tokens are not taken if any of the buckets is empty.
+        """
+        store = MemoryBucketStore()
+        link = ('link', 1, 1)
+        client = ('client', 5, 1)
+
+        with mock.patch('api.throttling.monotonic', lambda: 100):
+            self.assertEqual(store.take([link, client]), 0)
+            self.assertEqual(store.take([link, client]), 1)
+            self.assertEqual(store.buckets['client'], (4, 100))
+
+    def test_least_recently_used_buckets_are_forgotten(self):
+        """
+        Tests number of buckets is capped, dropping ones which were
+        not used for the longest time.
+        """
+        store = MemoryBucketStore()
+        store.max_size = 2
+
+        with mock.patch('api.throttling.monotonic', lambda: 100):
+            store.take([('a', 5, 1)])
+            store.take([('b', 5, 1)])
+            store.take([('a', 5, 1)])
+            store.take([('c', 5, 1)])
+
+        self.assertEqual(list(store.buckets), ['a', 'c'])
+        self.assertEqual(store.buckets['a'], (3, 100))
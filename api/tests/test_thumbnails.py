@@ -0,0 +1,273 @@
+from io import BytesIO
+from os import path
+from shutil import rmtree
+from unittest import mock
+from PIL import Image as PILImage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+from api.models import User, AccountTier, ThumbnailSize, Image
+from api.imaging import resize
+from api.thumbnails import (
+    Engine,
+    render_thumbnails,
+    get_cached_thumbnail,
+    preferred_thumbnail_format,
+    thumbnail_formats,
+)
+from imaginarium.tasks import backfill_image_thumbnails, backfill_thumbnails
+from .test_views import (
+    SAMPLE_JPG,
+    TEMP_DBM_FILE,
+    TEMP_DIR,
+    TEMP_MEDIA_ROOT,
+    get_path,
+)
+
+
+def tearDownModule():
+    """ Destroy temporary media root after all test ran. """
+    rmtree(TEMP_DIR, ignore_errors=True)
+
+
+@override_settings(
+    THUMBNAIL_KVSTORE='api.thumbnails.DBMKVStore',
+    THUMBNAIL_DBM_FILE=TEMP_DBM_FILE,
+    MEDIA_ROOT=TEMP_MEDIA_ROOT
+)
+class RenderThumbnailsTestCase(TestCase):
+    """
+    Tests for multi-size thumbnail rendering.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='Marcin',
+            password='Tomato789',
+            account_tier=AccountTier.objects.get(name='Premium')
+        )
+        cls.sizes = list(ThumbnailSize.objects.order_by('height'))
+
+    def setUp(self):
+        with open(get_path(SAMPLE_JPG), 'rb') as img:
+            self.image = Image.objects.create(
+                image=SimpleUploadedFile(path.basename(SAMPLE_JPG), img.read()),
+                owner=self.user
+            )
+
+    def test_decodes_source_once(self):
+        """
+        Makes sure all sizes are rendered from a single source decode.
+        """
+
+        with mock.patch.object(
+            default.engine,
+            'get_image',
+            wraps=default.engine.get_image
+        ) as get_image:
+            thumbnails = render_thumbnails(self.image, self.sizes)
+
+        get_image.assert_called_once()
+        self.assertEqual(
+            [thumbnail.height for thumbnail in thumbnails],
+            [
+                size.height
+                for size in self.sizes
+                for _ in thumbnail_formats()
+            ]
+        )
+
+    def test_renders_alternative_formats(self):
+        """
+        Makes sure thumbnails are rendered in alternative formats too.
+        """
+
+        with self.settings(THUMBNAIL_ALTERNATIVE_FORMATS=('WEBP',)):
+            thumbnails = render_thumbnails(self.image, self.sizes[:1])
+
+        self.assertEqual(
+            [path.splitext(thumbnail.name)[1] for thumbnail in thumbnails],
+            ['.jpg', '.webp']
+        )
+        for thumbnail in thumbnails:
+            self.assertTrue(thumbnail.exists())
+
+    def test_rendered_thumbnails_are_cached(self):
+        """
+        Makes sure rendered thumbnails are looked up without rendering.
+        """
+
+        self.assertIsNone(get_cached_thumbnail(self.image, self.sizes[0]))
+        render_thumbnails(self.image, self.sizes)
+
+        with mock.patch.object(default.engine, 'get_image') as get_image:
+            for size in self.sizes:
+                self.assertIsNotNone(get_cached_thumbnail(self.image, size))
+            render_thumbnails(self.image, self.sizes)
+
+        get_image.assert_not_called()
+
+
+@override_settings(THUMBNAIL_ALTERNATIVE_FORMATS=('WEBP',))
+class PreferredThumbnailFormatTestCase(TestCase):
+    """
+    Tests for choosing thumbnail format by Accept header.
+    """
+
+    def _format(self, accept):
+        """
+        Helper function. Returns format chosen for given Accept header.
+        """
+        request = mock.Mock(META={'HTTP_ACCEPT': accept})
+        return preferred_thumbnail_format(request)
+
+    def test_accepted_alternative_format_is_chosen(self):
+        self.assertEqual(self._format('image/avif,image/webp,*/*'), 'WEBP')
+
+    def test_default_format_without_explicit_accept(self):
+        self.assertEqual(self._format('*/*'), 'JPEG')
+        self.assertEqual(self._format('image/*'), 'JPEG')
+        self.assertEqual(self._format(''), 'JPEG')
+
+    def test_rejected_format_is_not_chosen(self):
+        self.assertEqual(self._format('image/webp;q=0, */*'), 'JPEG')
+
+
+class EngineTestCase(TestCase):
+    """
+    Tests for thumbnail engine.
+    """
+
+    def _jpeg(self, size):
+        """
+        Helper function. Returns lazily opened JPEG of given size.
+        """
+        buffer = BytesIO()
+        PILImage.linear_gradient('L').resize(size).convert('RGB').save(
+            buffer,
+            'JPEG'
+        )
+        buffer.seek(0)
+        return PILImage.open(buffer)
+
+    def test_jpeg_is_decoded_at_reduced_scale(self):
+        """
+        Makes sure JPEG is decoded at the smallest scale
+        which still covers the thumbnail.
+        """
+
+        engine = Engine()
+        options = {'cropbox': None, 'crop': False}
+        image = engine.draft(self._jpeg((1600, 1200)), (200, 150), options)
+        self.assertEqual(image.size, (200, 150))
+
+        image = engine.draft(self._jpeg((1600, 1200)), (300, 225), options)
+        self.assertEqual(image.size, (400, 300))
+
+    def test_large_downscale_is_reduced_first(self):
+        """
+        Makes sure large downscales are reduced by an integer factor
+        before resampling.
+        """
+
+        gradient = PILImage.linear_gradient('L').resize((1200, 800))
+        for mode in ('L', 'RGB'):
+            image = gradient.convert(mode)
+            with self.subTest(mode=mode):
+                with mock.patch.object(
+                    PILImage.Image,
+                    'reduce',
+                    autospec=True,
+                    side_effect=PILImage.Image.reduce
+                ) as reduce:
+                    resized = resize(image, (150, 100))
+                reduce.assert_called()
+                self.assertEqual(resized.mode, mode)
+                self.assertEqual(resized.size, (150, 100))
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_BACKFILL_BATCH_SIZE=2
+)
+class BackfillThumbnailsTestCase(TestCase):
+    """
+    Tests for thumbnails backfill after account tier changes.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.basic = AccountTier.objects.get(name='Basic')
+        cls.premium = AccountTier.objects.get(name='Premium')
+        cls.user = User.objects.create_user(
+            username='Marcin',
+            password='Tomato789',
+            account_tier=cls.basic
+        )
+        cls.images = [
+            Image.objects.create(image=SAMPLE_JPG, owner=cls.user)
+            for _ in range(3)
+        ]
+
+    @mock.patch('api.signals.backfill_thumbnails')
+    def test_adding_tier_size_triggers_backfill(self, task):
+        """
+        Makes sure adding a thumbnail size to a tier queues backfill.
+        """
+
+        size = ThumbnailSize.objects.create(height=600)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.basic.thumbnail_sizes.add(size)
+
+        task.delay.assert_called_once_with(tier_pk=self.basic.pk)
+
+    @mock.patch('api.signals.backfill_thumbnails')
+    def test_changing_user_tier_triggers_backfill(self, task):
+        """
+        Makes sure moving user to another tier queues backfill,
+        while other user updates do not.
+        """
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.email = 'marcin@example.com'
+            self.user.save()
+        task.delay.assert_not_called()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.account_tier = self.premium
+            self.user.save()
+        task.delay.assert_called_once_with(user_pk=self.user.pk)
+
+    @mock.patch('imaginarium.tasks.chord')
+    def test_backfill_processes_images_in_batches(self, chord):
+        """
+        Makes sure backfill handles one batch and schedules the next one
+        starting after the last processed image.
+        """
+
+        with mock.patch.object(backfill_thumbnails, 'update_state'):
+            backfill_thumbnails(user_pk=self.user.pk)
+
+        header = list(chord.call_args.args[0])
+        self.assertEqual(
+            [signature.args[0] for signature in header],
+            [image.pk for image in self.images[:2]]
+        )
+        next_batch = chord.return_value.call_args.args[0]
+        self.assertEqual(next_batch.kwargs['after_pk'], self.images[1].pk)
+        self.assertEqual(next_batch.kwargs['done'], 2)
+        self.assertEqual(next_batch.kwargs['total'], 3)
+
+    @mock.patch('imaginarium.tasks.render_thumbnails')
+    def test_backfill_failures_do_not_stop_backfill(self, render):
+        """
+        Makes sure images failing to render are logged and skipped,
+        so that the chord still schedules the next batch.
+        """
+
+        render.side_effect = OSError('Corrupt original.')
+        with self.assertLogs('imaginarium.tasks', 'ERROR') as logs:
+            backfill_image_thumbnails(self.images[0].pk)
+
+        self.assertIn(str(self.images[0].pk), logs.output[0])
@@ -0,0 +1,136 @@
+from unittest import mock
+from django.test import TestCase, override_settings
+from api.models import AccountTier, ThumbnailSize
+from api.tier_cache import (
+    CHANNEL,
+    TierCache,
+    get_account_tier,
+    tier_cache,
+)
+
+
+class StopListening(BaseException):
+    """
+    Ends listener loop, which survives any Exception.
+    """
+
+
+class TierCacheTestCase(TestCase):
+    """
+    Tests for process-wide account tier cache and its invalidation.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.small = ThumbnailSize.objects.create(height=200)
+        cls.large = ThumbnailSize.objects.create(height=400)
+        cls.tier = AccountTier.objects.create(name='Cached')
+        cls.tier.thumbnail_sizes.add(cls.small)
+
+    def setUp(self):
+        tier_cache.clear()
+        self.addCleanup(tier_cache.clear)
+
+    def get_heights(self, tier):
+        return [size.height for size in tier.thumbnail_sizes.all()]
+
+    def test_cached_tier_needs_no_queries(self):
+        """
+        Tests tier and its thumbnail sizes are loaded once.
+        """
+        with self.assertNumQueries(2):
+            get_account_tier(self.tier.pk)
+
+        with self.assertNumQueries(0):
+            tier = get_account_tier(self.tier.pk)
+            self.assertEqual(self.get_heights(tier), [200])
+
+        self.assertIsNone(get_account_tier(None))
+
+    def test_changes_invalidate_cached_tier(self):
+        """
+        Tests changes of tier, its thumbnail sizes and sizes themselves
+        are seen at once.
+        """
+        get_account_tier(self.tier.pk)
+        self.tier.templink_rate_limit = '1/min'
+        self.tier.save()
+        tier = get_account_tier(self.tier.pk)
+        self.assertEqual(tier.templink_rate_limit, '1/min')
+
+        self.tier.thumbnail_sizes.add(self.large)
+        tier = get_account_tier(self.tier.pk)
+        self.assertEqual(sorted(self.get_heights(tier)), [200, 400])
+
+        self.large.tiers_using.clear()
+        tier = get_account_tier(self.tier.pk)
+        self.assertEqual(self.get_heights(tier), [200])
+
+        self.small.height = 300
+        self.small.save()
+        tier = get_account_tier(self.tier.pk)
+        self.assertEqual(self.get_heights(tier), [300])
+
+        self.tier.delete()
+        self.assertIsNone(get_account_tier(self.tier.pk))
+
+    def test_tier_loaded_during_invalidation_is_not_cached(self):
+        """
+        Tests tier loaded before a concurrent change is not kept.
+        """
+        cache = TierCache()
+        first = AccountTier.objects.prefetch_related('thumbnail_sizes').first
+
+        def load_and_change():
+            tier = first()
+            cache.drop(self.tier.pk)
+            return tier
+
+        with mock.patch('api.tier_cache.AccountTier') as model:
+            queryset = model.objects.prefetch_related.return_value
+            queryset.filter.return_value.first.side_effect = load_and_change
+            cache.get(self.tier.pk)
+
+        self.assertEqual(cache.entries, {})
+
+    @override_settings(REDIS_CACHE_URL='redis://cache')
+    def test_invalidation_is_broadcast_once_committed(self):
+        """
+        Tests other processes are told about changed tiers only after
+        the change is committed.
+        """
+        with mock.patch('redis.Redis.from_url') as from_url:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tier.save()
+                from_url.return_value.publish.assert_not_called()
+
+        from_url.return_value.publish.assert_called_once_with(
+            CHANNEL,
+            self.tier.pk
+        )
+
+    @override_settings(REDIS_CACHE_URL='redis://cache')
+    def test_listener_drops_broadcast_tiers(self):
+        """
+        Tests listener drops tiers changed by other processes, and all
+        of them when it (re)subscribes.
+        """
+        cache = TierCache()
+
+        def listen():
+            yield {'data': str(self.tier.pk).encode()}
+            yield {'data': b'*'}
+            raise StopListening
+
+        with mock.patch('redis.Redis.from_url') as from_url, \
+                mock.patch.object(cache, 'drop') as drop:
+            pubsub = from_url.return_value.pubsub.return_value
+            pubsub.listen.side_effect = listen
+            with self.assertRaises(StopListening):
+                cache.listen()
+
+        pubsub.subscribe.assert_called_once_with(CHANNEL)
+        self.assertEqual(
+            drop.call_args_list,
+            [mock.call(), mock.call(self.tier.pk), mock.call(None)]
+        )
@@ -1,16 +1,30 @@
+from io import BytesIO
 from os import path
 from shutil import rmtree
+from tempfile import SpooledTemporaryFile
 from unittest import mock
-from time import sleep
+from time import sleep, time
 from datetime import datetime, timedelta, timezone
+from PIL import Image as PILImage
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.middleware.csrf import CSRF_SECRET_LENGTH
+from django.db import connection
 from django.urls import reverse
-from django.test import override_settings
-from rest_framework.test import APITestCase
+from django.test import AsyncRequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.crypto import get_random_string
+from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
 from api.models import (
     User,
     AccountTier,
+    Image,
+    ImageBlob,
+    UploadSession,
     TempLink,
     TempLinkTokenBlacklist,
 )
@@ -19,6 +33,24 @@ from api.serializers import (
     UserPublicSerializer,
     TempLinkSerializer,
 )
+from api.blacklist import load_filter_store
+from api.templink_cache import local_cache
+from api.tier_cache import tier_cache
+from api.uploadhandlers import HEADER_MAX_BYTES
+from api.throttling import load_bucket_store
+from api.streaming import AsyncStreamingASGIHandler, AsyncStreamingHttpResponse
+from api.thumbnails import DBMKVStore
+from api.utils import (
+    blob_file_name_generator,
+    compute_checksum,
+    is_signed_token,
+)
+from api.views import AsyncTemporaryImageView
+from imaginarium.tasks import (
+    generate_thumbnails,
+    remove_expired_templink_tokens,
+    remove_stale_upload_sessions,
+)
 
 # Sample images of different formats.
 SAMPLE_JPG = 'sample_jpg.jpg'
@@ -29,6 +61,8 @@ SAMPLE_BMP = 'sample_bmp.bmp'
 # Temporary root for mediafiles 'uploaded' during testing.
 TEMP_DIR = 'temp'
 TEMP_MEDIA_ROOT = TEMP_DIR + '/media'
+# Thumbnail key value store used during testing.
+TEMP_DBM_FILE = TEMP_DIR + '/thumbnail_kvstore'
 
 def tearDownModule():
     """ Destroy temporary media root after all test ran. """
@@ -148,8 +182,39 @@ class UserListViewTestCase(APITestCase):
         
         url = reverse('user-list')
         response = self.client.get(url)
-        self.assertIsInstance(response.data, list)
-        self.assertEqual(len(response.data), 3)
+        self.assertIsInstance(response.data['results'], list)
+        self.assertEqual(len(response.data['results']), 3)
+
+    @override_settings(API_PAGE_SIZE=2, API_MAX_PAGE_SIZE=3)
+    def test_users_are_paginated_with_cursor(self):
+        """
+        Makes sure users are listed in pages following each other
+        by pk, seeked without OFFSET, and page size is capped.
+        """
+
+        url = reverse('user-list')
+        first = self.client.get(url)
+        self.assertEqual(
+            [user['id'] for user in first.data['results']],
+            [self.marcin.pk, self.marek.pk]
+        )
+        self.assertIsNone(first.data['previous'])
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(first.data['next'])
+        self.assertEqual(
+            [user['id'] for user in second.data['results']],
+            [self.jola.pk]
+        )
+        self.assertIsNone(second.data['next'])
+        self.assertTrue(all(
+            'OFFSET' not in query['sql'].upper() for query in queries
+        ))
+
+        response = self.client.get(url, {'page_size': 100})
+        self.assertEqual(len(response.data['results']), 3)
+        response = self.client.get(url, {'page_size': 1})
+        self.assertEqual(len(response.data['results']), 1)
 
     def test_only_authenticated_access(self):
         """
@@ -170,7 +235,7 @@ class UserListViewTestCase(APITestCase):
         url = reverse('user-list')
         response = self.client.get(url)
         serializer_fields = get_serializer_readable_fields(UserPublicSerializer)
-        for record in response.data:
+        for record in response.data['results']:
             response_fields = record.keys()
             self.assertCountEqual(response_fields, serializer_fields)
 
@@ -268,9 +333,103 @@ class ImageListUploadViewTestCase(APITestCase):
         # uploaded by Marcin were returned.
         url = reverse('image-list-upload')
         response = self.client.get(url)
-        self.assertEqual(len(response.data), 2)
-        self.assertCountEqual(response.data, [marcin_response_one.data, marcin_response_two.data])
-        self.assertNotIn(jola_response.data, response.data)
+        results = response.data['results']
+        self.assertEqual(len(results), 2)
+        self.assertCountEqual(results, [marcin_response_one.data, marcin_response_two.data])
+        self.assertNotIn(jola_response.data, results)
+
+    @override_settings(
+        THUMBNAIL_KVSTORE='api.thumbnails.DBMKVStore',
+        THUMBNAIL_DBM_FILE=TEMP_DBM_FILE
+    )
+    def test_images_can_be_listed_with_thumbnails(self):
+        """
+        Makes sure images are listed with details of image detail view
+        when asked to.
+        """
+
+        login(self, 'marek_data')
+        rendered_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        pending_pk = upload_image(self, SAMPLE_PNG).data['pk']
+        generate_thumbnails(rendered_pk)
+
+        url = reverse('image-list-upload')
+        response = self.client.get(url, {'thumbnails': 'true'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        images = {image['pk']: image for image in response.data['results']}
+        self.assertCountEqual(
+            images[rendered_pk],
+            ['pk', 'url', 'image', 'thumbnail-200px', 'thumbnail-400px']
+        )
+        self.assertTrue(images[rendered_pk]['thumbnail-200px'].startswith('http'))
+        self.assertTrue(images[rendered_pk]['thumbnail-400px'].startswith('http'))
+        self.assertIsNone(images[pending_pk]['thumbnail-200px'])
+
+        # Thumbnail URLs are the ones image detail shows.
+        detail = self.client.get(
+            reverse('image-detail', kwargs={'pk': rendered_pk})
+        )
+        self.assertEqual(
+            images[rendered_pk]['thumbnail-200px'],
+            detail.data['thumbnail-200px']
+        )
+
+        # Plain list stays as it was.
+        response = self.client.get(url)
+        self.assertCountEqual(response.data['results'][0], ['pk', 'url'])
+
+    @override_settings(
+        THUMBNAIL_KVSTORE='api.thumbnails.DBMKVStore',
+        THUMBNAIL_DBM_FILE=TEMP_DBM_FILE
+    )
+    def test_listing_images_with_thumbnails_takes_fixed_queries(self):
+        """
+        Makes sure account tier and thumbnails are looked up once
+        for the whole list.
+        """
+
+        login(self, 'marcin_data')
+        url = reverse('image-list-upload')
+
+        def get_list():
+            with CaptureQueriesContext(connection) as queries, \
+                    mock.patch.object(
+                        DBMKVStore,
+                        'get_many',
+                        autospec=True,
+                        side_effect=DBMKVStore.get_many
+                    ) as get_many:
+                response = self.client.get(url, {'thumbnails': 'true'})
+            get_many.assert_called_once()
+            return response, len(queries)
+
+        upload_image(self, SAMPLE_JPG)
+        response, few = get_list()
+        self.assertEqual(len(response.data['results']), 1)
+
+        for _ in range(4):
+            upload_image(self, SAMPLE_JPG)
+        response, many = get_list()
+        self.assertEqual(len(response.data['results']), 5)
+        self.assertEqual(few, many)
+
+    def test_images_are_paginated_newest_first(self):
+        """
+        Makes sure pages of images follow each other, newest first.
+        """
+
+        login(self, 'marcin_data')
+        pks = [upload_image(self, SAMPLE_JPG).data['pk'] for _ in range(3)]
+
+        url = reverse('image-list-upload')
+        response = self.client.get(url, {'page_size': 2})
+        listed = [image['pk'] for image in response.data['results']]
+        response = self.client.get(response.data['next'])
+        listed += [image['pk'] for image in response.data['results']]
+
+        self.assertEqual(listed, pks[::-1])
+        self.assertIsNone(response.data['next'])
 
     def test_not_authenticated_user_cannot_upload_nor_list(self):
         """
@@ -289,178 +448,899 @@ class ImageListUploadViewTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
         self.assertIn('detail', response.data)
 
+    def test_duplicate_uploads_share_stored_file(self):
+        """
+        Makes sure uploads of identical files are stored once
+        and reference the same blob.
+        """
 
-@override_settings(
-    THUMBNAIL_KVSTORE = 'sorl.thumbnail.kvstores.dbm_kvstore.KVStore',
-    MEDIA_ROOT=TEMP_MEDIA_ROOT
-)
-class ImageDetailViewTestCase(APITestCase):
+        login(self, 'marcin_data')
+        upload_image(self, SAMPLE_JPG)
+        self.client.logout()
+        login(self, 'jola_data')
+        upload_image(self, SAMPLE_JPG)
+
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.reference_count, 2)
+        self.assertEqual(
+            set(Image.objects.values_list('image', flat=True)),
+            {blob.file.name}
+        )
+
+    def test_can_upload_multi_picture_jpeg(self):
+        """
+        Tests JPEGs with more pictures, which Pillow reports as MPO,
+        are accepted.
+        """
+
+        login(self, 'marcin_data')
+
+        buffer = BytesIO()
+        picture = PILImage.linear_gradient('L').convert('RGB')
+        flipped = picture.transpose(PILImage.Transpose.FLIP_LEFT_RIGHT)
+        picture.save(buffer, 'MPO', save_all=True, append_images=[flipped])
+        buffer.seek(0)
+        self.assertEqual(PILImage.open(buffer).format, 'MPO')
+
+        url = reverse('image-list-upload')
+        mpo = SimpleUploadedFile('mpo.jpg', buffer.getvalue())
+        response = self.client.post(url, {'image': mpo})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_upload_losing_blob_race_stores_no_file(self):
+        """
+        Makes sure upload which finds no blob, but loses the race to
+        create it, references the created blob and stores no file.
+        """
+
+        login(self, 'marcin_data')
+        with open(get_path(SAMPLE_JPG), 'rb') as img:
+            checksum = compute_checksum(File(img))
+        blob = ImageBlob.objects.create(
+            checksum=checksum,
+            file='originals/concurrent.jpg'
+        )
+        stored_name = blob_file_name_generator(blob, SAMPLE_JPG)
+        default_storage.delete(stored_name)
+
+        # Concurrent upload creates the blob after it was looked up.
+        with mock.patch('django.db.models.QuerySet.first', return_value=None):
+            response = upload_image(self, SAMPLE_JPG)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        blob.refresh_from_db()
+        self.assertEqual(blob.reference_count, 1)
+        self.assertEqual(Image.objects.get().image.name, blob.file.name)
+        self.assertFalse(default_storage.exists(stored_name))
+
+    def test_cannot_upload_file_which_is_not_an_image(self):
+        """
+        Tests files are rejected by their content, not extension.
+        """
+
+        login(self, 'marcin_data')
+
+        url = reverse('image-list-upload')
+        fake = SimpleUploadedFile('fake.jpg', b'GIF89a' + bytes(1024))
+        response = self.client.post(url, {'image': fake})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.data)
+        self.assertFalse(Image.objects.exists())
+
+    def test_cannot_upload_image_over_account_tier_limits(self):
+        """
+        Tests pixel count and byte size limits of account tier.
+        """
+
+        login(self, 'marcin_data')
+        self.addCleanup(tier_cache.clear)
+
+        # Test pixel count.
+        # Queryset updates bypass signals invalidating tier cache.
+        AccountTier.objects.filter(pk=self.enterprise.pk).update(
+            max_upload_pixels=100
+        )
+        tier_cache.clear()
+        response = upload_image(self, SAMPLE_JPG)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pixels', str(response.data['image']))
+
+        # Test byte size.
+        AccountTier.objects.filter(pk=self.enterprise.pk).update(
+            max_upload_pixels=50_000_000,
+            max_upload_size=100
+        )
+        tier_cache.clear()
+        response = upload_image(self, SAMPLE_JPG)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('exceeds', str(response.data['image']))
+
+        self.assertFalse(Image.objects.exists())
+
+    def test_upload_saves_image_metadata(self):
+        """
+        Tests dimensions, size, format and checksum are saved at upload.
+        """
+
+        login(self, 'marcin_data')
+        response = upload_image(self, SAMPLE_PNG)
+
+        image = Image.objects.get(pk=response.data['pk'])
+        self.assertEqual((image.width, image.height), (100, 100))
+        self.assertEqual(image.format, 'PNG')
+        self.assertEqual(image.size, image.image.size)
+        self.assertEqual(image.checksum, image.blob.checksum)
+
+    def test_upload_is_validated_with_session_csrf_check(self):
+        """
+        Tests upload is validated while it streams in also when the body
+        is parsed by CSRF check of session authentication.
+        """
+
+        csrf_login(self, 'marcin_data')
+
+        response = upload_image(self, SAMPLE_JPG)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Queryset updates bypass signals invalidating tier cache.
+        self.addCleanup(tier_cache.clear)
+        AccountTier.objects.filter(pk=self.enterprise.pk).update(
+            max_upload_size=100
+        )
+        tier_cache.clear()
+        url = reverse('image-list-upload')
+        large = SimpleUploadedFile(
+            'large.jpg',
+            b'\xff\xd8\xff' + bytes(HEADER_MAX_BYTES)
+        )
+        response = self.client.post(url, {'image': large})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        # Whole request is rejected before its body is read.
+        self.assertIn('Upload exceeds', str(response.data['image']))
+
+    @mock.patch('api.serializers.generate_thumbnails')
+    def test_upload_schedules_thumbnails_generation(self, task):
+        """
+        Makes sure thumbnails generation is queued after upload is committed.
+        """
+
+        login(self, 'marcin_data')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = upload_image(self, SAMPLE_JPG)
+
+        task.delay.assert_called_once_with(response.data['pk'])
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageBulkUploadViewTestCase(APITestCase):
     """
-    Tests for ImageDetailView view.
+    Tests for ImageBulkUploadView.
     """
 
     @classmethod
     def setUpTestData(cls):
-        # Get built-in account tiers.
-        cls.basic = AccountTier.objects.get(name='Basic')
-        cls.premium = AccountTier.objects.get(name='Premium')
         cls.enterprise = AccountTier.objects.get(name='Enterprise')
-
-        # Create users.
         cls.marcin_data = {
             "username": "Marcin",
             "password": "Tomato789",
             "email": "marcin@example.com",
             "account_tier": cls.enterprise
         }
-        cls.marek_data = {
-            "username": "Marek",
-            "password": "Toster1337",
-            "email": "marek@foo.com",
-            "account_tier": cls.premium
-        }
-        cls.jola_data = {
-            "username": "Jola",
-            "password": "Piekarnik4445",
-            "email": "jola@foo.com",
-            "account_tier": cls.basic
-        }
-
         cls.marcin = User.objects.create_user(**cls.marcin_data)
-        cls.marek = User.objects.create_user(**cls.marek_data)
-        cls.jola = User.objects.create_user(**cls.jola_data)
+
+    def setUp(self):
+        login(self, 'marcin_data')
 
     def tearDown(self):
         self.client.logout()
 
-    def _upload_image_and_get_response(self, user_data):
+    def _upload_images(self, *files):
+        url = reverse('image-bulk-upload')
+        return self.client.post(url, {'image': list(files)})
+
+    def test_uploads_many_images(self):
         """
-        Helper function for login, image upload and request abstraction
-        for following account tier tests.
+        Tests all images are created and reported in upload order.
         """
 
-        # Log in as given user.
-        login(self, user_data)
+        with open(get_path(SAMPLE_JPG), 'rb') as jpg, \
+                open(get_path(SAMPLE_PNG), 'rb') as png:
+            response = self._upload_images(jpg, png)
 
-        # Upload image.
-        img_response = upload_image(self, SAMPLE_JPG)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [result['file'] for result in response.data],
+            [SAMPLE_JPG, SAMPLE_PNG]
+        )
+        self.assertCountEqual(
+            [result['pk'] for result in response.data],
+            Image.objects.filter(owner=self.marcin).values_list(
+                'pk',
+                flat=True
+            )
+        )
 
-        # Get image details and return the response.
-        url = reverse('image-detail', kwargs={'pk': img_response.data['pk']})
-        return self.client.get(url)
+    def test_reports_failures_per_file(self):
+        """
+        Tests invalid files are reported while valid ones are created.
+        """
 
-    def test_basic_gets_small_thumbnail(self):
+        fake = SimpleUploadedFile('fake.jpg', b'GIF89a' + bytes(1024))
+        with open(get_path(SAMPLE_JPG), 'rb') as jpg, \
+                open(get_path(SAMPLE_BMP), 'rb') as bmp:
+            response = self._upload_images(fake, jpg, bmp)
+
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        fake_result, jpg_result, bmp_result = response.data
+        self.assertIn('image', fake_result['errors'])
+        self.assertIn('image', bmp_result['errors'])
+        self.assertNotIn('errors', jpg_result)
+        self.assertEqual(Image.objects.get().pk, jpg_result['pk'])
+
+    def test_fails_if_no_image_is_valid(self):
         """
-        Confirms that user with basic account tier gets only
-        a link to small 200px high thumbnail.
+        Tests request fails if all files are invalid or missing.
         """
 
-        # Upload image and get it's detail as Basic account user.
-        response = self._upload_image_and_get_response('jola_data')
+        with open(get_path(SAMPLE_GIF), 'rb') as gif:
+            response = self._upload_images(gif)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
-        self.assertIn('thumbnail-200px', response.data)
-        self.assertNotIn('thumbnail-400px', response.data)
-        self.assertNotIn('image', response.data)
-        self.assertNotIn('templink', response.data)
+        response = self._upload_images()
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Image.objects.exists())
 
-    def test_premium_gets_small_medium_thumbnail_and_original(self):
+    def test_uploads_many_images_with_session_csrf_check(self):
         """
-        Confirms that user with premium account tier gets 200px, 400px high
-        thumbnails and original image.
+        Tests files are reported also when the body is parsed by CSRF
+        check of session authentication.
         """
 
-        # Upload image and get it's detail as Premium account user.
-        response = self._upload_image_and_get_response('marek_data')
+        csrf_login(self, 'marcin_data')
+        with open(get_path(SAMPLE_JPG), 'rb') as first, \
+                open(get_path(SAMPLE_JPG), 'rb') as second:
+            response = self._upload_images(first, second)
 
-        self.assertIn('thumbnail-200px', response.data)
-        self.assertIn('thumbnail-400px', response.data)
-        self.assertIn('image', response.data)
-        self.assertNotIn('templink', response.data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(Image.objects.filter(owner=self.marcin).count(), 2)
 
-    def test_enterprise_gets_small_medium_thumbnail_original_and_templink(self):
+    def test_uploads_many_images_without_account_tier(self):
         """
-        Confirms that user with enterprise account tier gets 200px, 400px high
-        thumbnails and original image.
+        Tests files are reported also when there is no account tier
+        to validate them against while they stream in.
         """
 
-        # Upload image and get it's detail as Enterprise account user.
-        response = self._upload_image_and_get_response('marcin_data')
+        with mock.patch(
+            'api.uploadhandlers.get_user_account_tier',
+            return_value=None
+        ):
+            with open(get_path(SAMPLE_JPG), 'rb') as jpg, \
+                    open(get_path(SAMPLE_PNG), 'rb') as png:
+                response = self._upload_images(jpg, png)
 
-        self.assertIn('thumbnail-200px', response.data)
-        self.assertIn('thumbnail-400px', response.data)
-        self.assertIn('image', response.data)
-        self.assertIn('templink', response.data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [result['file'] for result in response.data],
+            [SAMPLE_JPG, SAMPLE_PNG]
+        )
 
-    def test_only_owner_gets_data(self):
+    @override_settings(IMAGE_BULK_UPLOAD_MAX_FILES=1)
+    def test_limits_number_of_files(self):
         """
-        Confirms that only image owner can get links to it.
+        Tests requests with too many files are rejected.
         """
 
-        # Upload image as Marek.
-        login(self, 'marek_data')
-        marek_response = upload_image(self, SAMPLE_JPG)
+        with open(get_path(SAMPLE_JPG), 'rb') as jpg, \
+                open(get_path(SAMPLE_PNG), 'rb') as png:
+            response = self._upload_images(jpg, png)
 
-        # Logout and try to fetch image as Marcin.
-        self.client.logout()
-        login(self, 'marcin_data')
-        url = reverse('image-detail', kwargs={'pk': marek_response.data['pk']})
-        marcin_response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Image.objects.exists())
 
-        self.assertEqual(marcin_response.status_code, status.HTTP_403_FORBIDDEN)
-        self.assertIn('detail', marcin_response.data)
+    @mock.patch('api.serializers.group')
+    @mock.patch('api.serializers.generate_thumbnails')
+    def test_upload_schedules_thumbnails_generation_as_group(self, task,
+                                                             group):
+        """
+        Makes sure thumbnails of all images are queued as one group.
+        """
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with open(get_path(SAMPLE_JPG), 'rb') as jpg, \
+                    open(get_path(SAMPLE_PNG), 'rb') as png:
+                response = self._upload_images(jpg, png)
+
+        self.assertCountEqual(
+            [call.args for call in task.si.call_args_list],
+            [(result['pk'],) for result in response.data]
+        )
+        group.return_value.delay.assert_called_once_with()
 
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
-class TempLinkListCreateViewTestCase(APITestCase):
+class UploadSessionViewTestCase(APITestCase):
     """
-    Tests for TempLinkListCreateView view.
+    Tests for resumable uploads.
     """
 
     @classmethod
     def setUpTestData(cls):
-        # Get built-in account tiers.
-        cls.basic = AccountTier.objects.get(name='Basic')
         cls.premium = AccountTier.objects.get(name='Premium')
-        cls.enterprise = AccountTier.objects.get(name='Enterprise')
-
-        # Create users.
-        cls.marcin_data = {
-            "username": "Marcin",
-            "password": "Tomato789",
-            "email": "marcin@example.com",
-            "account_tier": cls.enterprise
-        }
         cls.marek_data = {
             "username": "Marek",
             "password": "Toster1337",
             "email": "marek@foo.com",
-            "account_tier": cls.enterprise
+            "account_tier": cls.premium
         }
         cls.jola_data = {
             "username": "Jola",
             "password": "Piekarnik4445",
             "email": "jola@foo.com",
-            "account_tier": cls.basic
+            "account_tier": cls.premium
         }
-
-        cls.marcin = User.objects.create_user(**cls.marcin_data)
         cls.marek = User.objects.create_user(**cls.marek_data)
         cls.jola = User.objects.create_user(**cls.jola_data)
 
+        with open(get_path(SAMPLE_PNG), 'rb') as png:
+            cls.content = png.read()
+
+    def setUp(self):
+        login(self, 'marek_data')
+
     def tearDown(self):
         self.client.logout()
-    
-    def test_account_tiers(self):
-        """
-        Make sure account tiers have not changed:
-        - basic and premium does not allow for templink creation,
-        - enterprise allows for templink creation.
+
+    def _start_upload(self, file_name=SAMPLE_PNG, size=None):
+        url = reverse('upload-session-create')
+        data = {
+            'file_name': file_name,
+            'size': len(self.content) if size is None else size,
+        }
+        return self.client.post(url, data)
+
+    def _put_chunk(self, url, offset, chunk):
+        return self.client.put(
+            url,
+            data=chunk,
+            content_type='application/octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_uploads_image_in_chunks(self):
         """
-        self.assertFalse(self.basic.can_generate_temp_link)
-        self.assertFalse(self.premium.can_generate_temp_link)
-        self.assertTrue(self.enterprise.can_generate_temp_link)
-    
-    def test_enterprise_owner_can_create_a_templink(self):
+        Tests image is created from chunks once upload is completed.
+        """
+
+        response = self._start_upload()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        url = response.data['url']
+        half = len(self.content) // 2
+
+        response = self._put_chunk(url, 0, self.content[:half])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Upload-Offset'], str(half))
+
+        # Resume from offset reported by the server.
+        offset = int(self.client.get(url)['Upload-Offset'])
+        response = self._put_chunk(url, offset, self.content[offset:])
+        self.assertEqual(response.data['offset'], len(self.content))
+
+        response = self.client.post(url + 'complete/')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        image = Image.objects.get(pk=response.data['pk'])
+        self.assertEqual(image.owner, self.marek)
+        with image.image.open('rb') as file:
+            self.assertEqual(file.read(), self.content)
+        self.assertFalse(UploadSession.objects.exists())
+
+    def test_rejects_chunk_at_wrong_offset(self):
+        """
+        Tests chunks must continue where previous one ended.
+        """
+
+        url = self._start_upload().data['url']
+        self._put_chunk(url, 0, self.content[:100])
+
+        response = self._put_chunk(url, 50, self.content[50:100])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Upload-Offset'], '100')
+
+        response = self._put_chunk(url, 100, self.content[100:] + b'extra')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_chunk_is_received_before_session_is_locked(self):
+        """
+        Tests session is locked only once the chunk was received, and
+        chunks stored meanwhile by other requests are not overwritten.
+        """
+
+        url = self._start_upload().data['url']
+        session = UploadSession.objects.get()
+        events = []
+
+        class RecordingFile(SpooledTemporaryFile):
+            def write(self, data):
+                events.append('read')
+                # Another request stores its chunk meanwhile.
+                UploadSession.objects.filter(pk=session.pk).update(offset=10)
+                return super().write(data)
+
+        select_for_update = UploadSession.objects.select_for_update
+
+        def lock():
+            events.append('lock')
+            return select_for_update()
+
+        with mock.patch('api.views.SpooledTemporaryFile', RecordingFile), \
+                mock.patch.object(
+                    UploadSession.objects,
+                    'select_for_update',
+                    lock
+                ):
+            response = self._put_chunk(url, 0, self.content[:100])
+
+        self.assertEqual(events, ['read', 'lock'])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Upload-Offset'], '10')
+        self.assertEqual(session.get_part_names(), [])
+
+    def test_cannot_complete_unfinished_upload(self):
+        """
+        Tests upload cannot be completed before all bytes are received.
+        """
+
+        url = self._start_upload().data['url']
+        self._put_chunk(url, 0, self.content[:100])
+
+        response = self.client.post(url + 'complete/')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Image.objects.exists())
+
+    def test_completing_upload_locks_session(self):
+        """
+        Makes sure the session is locked until it is deleted, so that
+        concurrent requests cannot create two images from it.
+        """
+
+        url = self._start_upload().data['url']
+        self._put_chunk(url, 0, self.content)
+
+        select_for_update = UploadSession.objects.select_for_update
+        with mock.patch.object(
+            UploadSession.objects,
+            'select_for_update',
+            side_effect=select_for_update
+        ) as lock:
+            response = self.client.post(url + 'complete/')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        lock.assert_called_once_with()
+        self.assertFalse(UploadSession.objects.exists())
+
+        response = self.client.post(url + 'complete/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Image.objects.count(), 1)
+
+    def test_validates_upload_on_start(self):
+        """
+        Tests file extension and account tier size limit are checked
+        before any chunk is sent.
+        """
+
+        response = self._start_upload(file_name='image.gif')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file_name', response.data)
+
+        response = self._start_upload(
+            size=self.premium.max_upload_size + 1
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('size', response.data)
+
+    def test_only_owner_accesses_upload(self):
+        """
+        Tests other users can neither continue nor complete the upload.
+        """
+
+        url = self._start_upload().data['url']
+        self.client.logout()
+        login(self, 'jola_data')
+
+        response = self._put_chunk(url, 0, self.content)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.post(url + 'complete/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_stale_uploads_are_removed(self):
+        """
+        Tests sessions not continued for too long are garbage collected
+        along with their files.
+        """
+
+        url = self._start_upload().data['url']
+        self._put_chunk(url, 0, self.content[:100])
+        session = UploadSession.objects.get()
+        parts = session.get_part_names()
+        self.assertTrue(parts)
+
+        UploadSession.objects.update(
+            updated=datetime.now(timezone.utc) - timedelta(
+                seconds=settings.UPLOAD_SESSION_LIFETIME + 1
+            )
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            remove_stale_upload_sessions()
+
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(any(default_storage.exists(part) for part in parts))
+
+
+@override_settings(
+    THUMBNAIL_KVSTORE='api.thumbnails.DBMKVStore',
+    THUMBNAIL_DBM_FILE=TEMP_DBM_FILE,
+    MEDIA_ROOT=TEMP_MEDIA_ROOT
+)
+class ImageDetailViewTestCase(APITestCase):
+    """
+    Tests for ImageDetailView view.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Get built-in account tiers.
+        cls.basic = AccountTier.objects.get(name='Basic')
+        cls.premium = AccountTier.objects.get(name='Premium')
+        cls.enterprise = AccountTier.objects.get(name='Enterprise')
+
+        # Create users.
+        cls.marcin_data = {
+            "username": "Marcin",
+            "password": "Tomato789",
+            "email": "marcin@example.com",
+            "account_tier": cls.enterprise
+        }
+        cls.marek_data = {
+            "username": "Marek",
+            "password": "Toster1337",
+            "email": "marek@foo.com",
+            "account_tier": cls.premium
+        }
+        cls.jola_data = {
+            "username": "Jola",
+            "password": "Piekarnik4445",
+            "email": "jola@foo.com",
+            "account_tier": cls.basic
+        }
+
+        cls.marcin = User.objects.create_user(**cls.marcin_data)
+        cls.marek = User.objects.create_user(**cls.marek_data)
+        cls.jola = User.objects.create_user(**cls.jola_data)
+
+    def tearDown(self):
+        self.client.logout()
+
+    def _upload_image_and_get_response(self, user_data):
+        """
+        Helper function for login, image upload and request abstraction
+        for following account tier tests.
+        """
+
+        # Log in as given user.
+        login(self, user_data)
+
+        # Upload image.
+        img_response = upload_image(self, SAMPLE_JPG)
+
+        # Get image details and return the response.
+        url = reverse('image-detail', kwargs={'pk': img_response.data['pk']})
+        return self.client.get(url)
+
+    def test_basic_gets_small_thumbnail(self):
+        """
+        Confirms that user with basic account tier gets only
+        a link to small 200px high thumbnail.
+        """
+
+        # Upload image and get it's detail as Basic account user.
+        response = self._upload_image_and_get_response('jola_data')
+
+        self.assertIn('thumbnail-200px', response.data)
+        self.assertNotIn('thumbnail-400px', response.data)
+        self.assertNotIn('image', response.data)
+        self.assertNotIn('templink', response.data)
+
+    def test_premium_gets_small_medium_thumbnail_and_original(self):
+        """
+        Confirms that user with premium account tier gets 200px, 400px high
+        thumbnails and original image.
+        """
+
+        # Upload image and get it's detail as Premium account user.
+        response = self._upload_image_and_get_response('marek_data')
+
+        self.assertIn('thumbnail-200px', response.data)
+        self.assertIn('thumbnail-400px', response.data)
+        self.assertIn('image', response.data)
+        self.assertNotIn('templink', response.data)
+
+    def test_enterprise_gets_small_medium_thumbnail_original_and_templink(self):
+        """
+        Confirms that user with enterprise account tier gets 200px, 400px high
+        thumbnails and original image.
+        """
+
+        # Upload image and get it's detail as Enterprise account user.
+        response = self._upload_image_and_get_response('marcin_data')
+
+        self.assertIn('thumbnail-200px', response.data)
+        self.assertIn('thumbnail-400px', response.data)
+        self.assertIn('image', response.data)
+        self.assertIn('templink', response.data)
+
+    def test_pending_thumbnails_are_not_rendered(self):
+        """
+        Confirms that thumbnails which were not generated yet
+        are reported as null instead of being rendered in request.
+        """
+
+        response = self._upload_image_and_get_response('marek_data')
+
+        self.assertIsNone(response.data['thumbnail-200px'])
+        self.assertIsNone(response.data['thumbnail-400px'])
+
+    def test_generated_thumbnails_are_linked(self):
+        """
+        Confirms that thumbnails generated in the background
+        are presented as absolute urls.
+        """
+
+        login(self, 'marek_data')
+        img_response = upload_image(self, SAMPLE_JPG)
+        generate_thumbnails(img_response.data['pk'])
+
+        url = reverse('image-detail', kwargs={'pk': img_response.data['pk']})
+        response = self.client.get(url)
+
+        self.assertTrue(response.data['thumbnail-200px'].startswith('http'))
+        self.assertTrue(response.data['thumbnail-400px'].startswith('http'))
+
+    def test_deleting_images_releases_stored_file(self):
+        """
+        Confirms that stored file is kept while any image references it
+        and removed along with the last one.
+        """
+
+        login(self, 'marcin_data')
+        pks = [upload_image(self, SAMPLE_PNG).data['pk'] for _ in range(2)]
+        blob = ImageBlob.objects.get()
+
+        self.client.delete(reverse('image-detail', kwargs={'pk': pks[0]}))
+        blob.refresh_from_db()
+        self.assertEqual(blob.reference_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('image-detail', kwargs={'pk': pks[1]}))
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(blob.file.storage.exists(blob.file.name))
+
+    def test_original_cannot_be_replaced(self):
+        """
+        Confirms that updates leave the original and its metadata as
+        they were uploaded.
+        """
+
+        login(self, 'marcin_data')
+        pk = upload_image(self, SAMPLE_JPG).data['pk']
+        image = Image.objects.get(pk=pk)
+
+        url = reverse('image-detail', kwargs={'pk': pk})
+        with open(get_path(SAMPLE_PNG), 'rb') as file_:
+            response = self.client.patch(url, {'image': file_})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        updated = Image.objects.get(pk=pk)
+        self.assertEqual(updated.image.name, image.image.name)
+        self.assertEqual(updated.blob_id, image.blob_id)
+        self.assertEqual(updated.format, image.format)
+
+    def test_only_owner_gets_data(self):
+        """
+        Confirms that only image owner can get links to it.
+        """
+
+        # Upload image as Marek.
+        login(self, 'marek_data')
+        marek_response = upload_image(self, SAMPLE_JPG)
+
+        # Logout and try to fetch image as Marcin.
+        self.client.logout()
+        login(self, 'marcin_data')
+        url = reverse('image-detail', kwargs={'pk': marek_response.data['pk']})
+        marcin_response = self.client.get(url)
+
+        self.assertEqual(marcin_response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertIn('detail', marcin_response.data)
+
+
+@override_settings(
+    THUMBNAIL_KVSTORE='api.thumbnails.DBMKVStore',
+    THUMBNAIL_DBM_FILE=TEMP_DBM_FILE,
+    MEDIA_ROOT=TEMP_MEDIA_ROOT
+)
+class ThumbnailViewTestCase(APITestCase):
+    """
+    Tests for ThumbnailView view.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Get built-in account tiers.
+        cls.basic = AccountTier.objects.get(name='Basic')
+        cls.premium = AccountTier.objects.get(name='Premium')
+
+        # Create users.
+        cls.marek_data = {
+            "username": "Marek",
+            "password": "Toster1337",
+            "email": "marek@foo.com",
+            "account_tier": cls.premium
+        }
+        cls.jola_data = {
+            "username": "Jola",
+            "password": "Piekarnik4445",
+            "email": "jola@foo.com",
+            "account_tier": cls.basic
+        }
+
+        cls.marek = User.objects.create_user(**cls.marek_data)
+        cls.jola = User.objects.create_user(**cls.jola_data)
+
+    def tearDown(self):
+        self.client.logout()
+
+    def _upload_image_and_get_url(self, user_data, height, generate=True):
+        """
+        Helper function. Logs user in, uploads an image, optionally
+        generates its thumbnails and returns thumbnail url.
+        """
+
+        login(self, user_data)
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        if generate:
+            generate_thumbnails(image_pk)
+        return reverse(
+            'image-thumbnail', 
+            kwargs={'pk': image_pk, 'height': height}
+        )
+
+    def test_serves_thumbnail_with_cache_headers(self):
+        """
+        Checks that thumbnail is served along with validators
+        and long-lived cache headers.
+        """
+
+        url = self._upload_image_and_get_url('marek_data', 400)
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(b''.join(response.streaming_content))
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertIn('max-age', response['Cache-Control'])
+
+    @override_settings(THUMBNAIL_ALTERNATIVE_FORMATS=('WEBP',))
+    def test_serves_format_accepted_by_client(self):
+        """
+        Checks that WebP thumbnail is served to clients accepting it
+        and JPEG to other ones.
+        """
+
+        url = self._upload_image_and_get_url('marek_data', 200)
+
+        response = self.client.get(url, HTTP_ACCEPT='image/webp,*/*')
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('Accept', response['Vary'])
+
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+
+    def test_not_modified_if_etag_matches(self):
+        """
+        Checks that matching If-None-Match results in 304 response.
+        """
+
+        url = self._upload_image_and_get_url('marek_data', 200)
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_pending_thumbnail_is_reported(self):
+        """
+        Checks that thumbnail which was not generated yet
+        is reported as pending instead of being rendered.
+        """
+
+        url = self._upload_image_and_get_url('marek_data', 200, False)
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIn('Retry-After', response)
+
+    def test_size_not_in_account_tier(self):
+        """
+        Checks that sizes outside owner's account tier are not served.
+        """
+
+        url = self._upload_image_and_get_url('jola_data', 400)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_only_owner_gets_thumbnail(self):
+        """
+        Checks that only image owner can get its thumbnails.
+        """
+
+        url = self._upload_image_and_get_url('jola_data', 200)
+        self.client.logout()
+        login(self, 'marek_data')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class TempLinkListCreateViewTestCase(APITestCase):
+    """
+    Tests for TempLinkListCreateView view.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        # Get built-in account tiers.
+        cls.basic = AccountTier.objects.get(name='Basic')
+        cls.premium = AccountTier.objects.get(name='Premium')
+        cls.enterprise = AccountTier.objects.get(name='Enterprise')
+
+        # Create users.
+        cls.marcin_data = {
+            "username": "Marcin",
+            "password": "Tomato789",
+            "email": "marcin@example.com",
+            "account_tier": cls.enterprise
+        }
+        cls.marek_data = {
+            "username": "Marek",
+            "password": "Toster1337",
+            "email": "marek@foo.com",
+            "account_tier": cls.enterprise
+        }
+        cls.jola_data = {
+            "username": "Jola",
+            "password": "Piekarnik4445",
+            "email": "jola@foo.com",
+            "account_tier": cls.basic
+        }
+
+        cls.marcin = User.objects.create_user(**cls.marcin_data)
+        cls.marek = User.objects.create_user(**cls.marek_data)
+        cls.jola = User.objects.create_user(**cls.jola_data)
+
+    def tearDown(self):
+        self.client.logout()
+    
+    def test_account_tiers(self):
+        """
+        Make sure account tiers have not changed:
+        - basic and premium does not allow for templink creation,
+        - enterprise allows for templink creation.
+        """
+        self.assertFalse(self.basic.can_generate_temp_link)
+        self.assertFalse(self.premium.can_generate_temp_link)
+        self.assertTrue(self.enterprise.can_generate_temp_link)
+    
+    def test_enterprise_owner_can_create_a_templink(self):
         """
         Checks that image owner with Enterprise account can create
         a templink to his image and receive templink data in return.
@@ -541,7 +1421,7 @@ class TempLinkListCreateViewTestCase(APITestCase):
         # Make sure same data of both templinks was listed.
         self.assertEqual(response_list.status_code, status.HTTP_200_OK)
         self.assertCountEqual(
-            response_list.data, 
+            response_list.data['results'], 
             [response_tl_one.data, response_tl_two.data]
         )
 
@@ -579,27 +1459,190 @@ class TempLinkListCreateViewTestCase(APITestCase):
         image_pk = image_response.data['pk']
         url = reverse('templink-list-create', kwargs={'image_pk': image_pk})
 
-        response = self.client.post(url, {'expires_in': 300})
+        response = self.client.post(url, {'expires_in': 300})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(url, {'expires_in': 299})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_maximum_templink_lifetime(self):
+        """
+        Makes sure maximum valid templink 'expires_in' value is 30000 (s).
+        """
+
+        login(self, 'marcin_data')
+        image_response = upload_image(self, SAMPLE_JPG)
+        image_pk = image_response.data['pk']
+        url = reverse('templink-list-create', kwargs={'image_pk': image_pk})
+
+        response = self.client.post(url, {'expires_in': 30000})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        response = self.client.post(url, {'expires_in': 30001})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_templinks_can_be_filtered_by_expiration(self):
+        """
+        Makes sure only active or only expired templinks can be listed.
+        """
+
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        url = reverse('templink-list-create', kwargs={'image_pk': image_pk})
+        active = self.client.post(url, {'expires_in': 300}).data
+        expired = self.client.post(url, {'expires_in': 300}).data
+        TempLink.objects.filter(pk=expired['pk']).update(
+            expires_at=datetime.now(tz=timezone.utc) - timedelta(seconds=1)
+        )
+
+        response = self.client.get(url, {'active': 'true'})
+        self.assertEqual(
+            [link['pk'] for link in response.data['results']],
+            [active['pk']]
+        )
+
+        response = self.client.get(url, {'active': 'false'})
+        self.assertEqual(
+            [link['pk'] for link in response.data['results']],
+            [expired['pk']]
+        )
+
+        response = self.client.get(url, {'active': 'maybe'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_templinks_can_be_created_in_bulk(self):
+        """
+        Makes sure links to many images are created with a constant
+        number of queries, in order of given images.
+        """
+
+        login(self, 'marcin_data')
+        image_pks = [upload_image(self, SAMPLE_JPG).data['pk'] for _ in range(4)]
+        url = reverse('templink-bulk-create')
+
+        with CaptureQueriesContext(connection) as two:
+            response = self.client.post(
+                url,
+                {'images': image_pks[:2], 'expires_in': 300},
+                format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        with CaptureQueriesContext(connection) as four:
+            response = self.client.post(
+                url,
+                {'images': image_pks[::-1], 'expires_in': 300},
+                format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(two), len(four))
+        self.assertEqual(
+            [link['image'] for link in response.data],
+            image_pks[::-1]
+        )
+
+        # Links lead to their images.
+        self.client.logout()
+        for link in response.data:
+            templink = TempLink.objects.get(pk=link['pk'])
+            self.assertEqual(templink.owner, self.marcin)
+            self.assertAlmostEqual(
+                templink.expires_at,
+                templink.created + timedelta(seconds=300),
+                delta=timedelta(seconds=1)
+            )
+            response = self.client.get(link['link'])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_bulk_templinks_require_owned_images(self):
+        """
+        Makes sure no links are created if any image belongs
+        to another user.
+        """
+
+        login(self, 'marek_data')
+        foreign_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        self.client.logout()
+
+        login(self, 'marcin_data')
+        own_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        response = self.client.post(
+            reverse('templink-bulk-create'),
+            {'images': [own_pk, foreign_pk], 'expires_in': 300},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(foreign_pk), str(response.data['images']))
+        self.assertFalse(TempLink.objects.exists())
+
+    def test_bulk_templinks_require_enterprise_tier(self):
+        """
+        Makes sure bulk creation follows tier permissions.
+        """
+
+        login(self, 'jola_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        response = self.client.post(
+            reverse('templink-bulk-create'),
+            {'images': [image_pk], 'expires_in': 300},
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(TEMPLINK_SIGNED_TOKENS=True)
+    def test_signed_templinks_can_be_created_in_bulk(self):
+        """
+        Makes sure bulk created signed links are valid.
+        """
+
+        login(self, 'marcin_data')
+        image_pks = [upload_image(self, SAMPLE_JPG).data['pk'] for _ in range(2)]
+        response = self.client.post(
+            reverse('templink-bulk-create'),
+            {'images': image_pks, 'expires_in': 300},
+            format='json'
+        )
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
 
-        response = self.client.post(url, {'expires_in': 299})
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.client.logout()
+        for link in response.data:
+            self.assertTrue(is_signed_token(get_token(link)))
+            response = self.client.get(link['link'])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-    def test_maximum_templink_lifetime(self):
+    @override_settings(TEMPLINK_CLEANUP_BATCH_SIZE=2)
+    def test_expired_templinks_are_removed_in_batches(self):
         """
-        Makes sure maximum valid templink 'expires_in' value is 30000 (s).
+        Makes sure periodic cleanup removes all expired templinks
+        and blacklists their tokens, leaving active ones intact.
         """
 
         login(self, 'marcin_data')
-        image_response = upload_image(self, SAMPLE_JPG)
-        image_pk = image_response.data['pk']
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
         url = reverse('templink-list-create', kwargs={'image_pk': image_pk})
+        for _ in range(6):
+            self.client.post(url, {'expires_in': 300})
+        active_pk = TempLink.objects.latest('pk').pk
+
+        expired = TempLink.objects.exclude(pk=active_pk)
+        tokens = set(expired.values_list('token', flat=True))
+        expired.update(
+            expires_at=datetime.now(tz=timezone.utc) - timedelta(seconds=1)
+        )
+        # One token was blacklisted already when its link was accessed.
+        TempLinkTokenBlacklist.objects.create(token=next(iter(tokens)))
 
-        response = self.client.post(url, {'expires_in': 30000})
-        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        remove_expired_templink_tokens()
 
-        response = self.client.post(url, {'expires_in': 30001})
-        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            list(TempLink.objects.values_list('pk', flat=True)),
+            [active_pk]
+        )
+        self.assertEqual(
+            set(TempLinkTokenBlacklist.objects.values_list('token', flat=True)),
+            tokens
+        )
         
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
@@ -636,6 +1679,14 @@ class TemporaryImageViewTestCase(APITestCase):
         # Neccessary for mocking past datetime.
         cls.use_tz = timezone.utc if settings.USE_TZ else None
 
+    def setUp(self):
+        # Links must not be served from cache or limited by rate
+        # limits of previous tests.
+        cache.clear()
+        local_cache.clear()
+        tier_cache.clear()
+        load_bucket_store.cache_clear()
+
     def tearDown(self):
         self.client.logout()
     
@@ -686,6 +1737,125 @@ class TemporaryImageViewTestCase(APITestCase):
         with open(get_path(image_file), 'rb') as source:
             self.assertEqual(source.read(), b''.join(image))
 
+    @override_settings(TEMPLINK_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_templink_hands_transfer_over_to_nginx(self):
+        """
+        Makes sure file is left for nginx to send if it is configured.
+        """
+
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        templink_data = self._create_templink(image_pk, 300)
+
+        response = self.client.get(templink_data['link'])
+
+        image = Image.objects.get(pk=image_pk)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/protected-media/' + image.image.name
+        )
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response.content, b'')
+
+    def _get_templink_url(self):
+        """
+        Helper function. Logs Marcin in, uploads an image and returns
+        link to it along with image content.
+        """
+
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        with open(get_path(SAMPLE_JPG), 'rb') as source:
+            content = source.read()
+        return self._create_templink(image_pk, 300)['link'], content
+
+    def test_templink_supports_byte_ranges(self):
+        """
+        Makes sure single range is sent as partial content.
+        """
+
+        link, content = self._get_templink_url()
+
+        response = self.client.get(link)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(int(response['Content-Length']), len(content))
+
+        response = self.client.get(link, HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(
+            response['Content-Range'],
+            f'bytes 100-199/{len(content)}'
+        )
+        self.assertEqual(response['Content-Length'], '100')
+        self.assertEqual(b''.join(response.streaming_content), content[100:200])
+
+        response = self.client.get(link, HTTP_RANGE='bytes=-10')
+        self.assertEqual(b''.join(response.streaming_content), content[-10:])
+
+        response = self.client.get(link, HTTP_RANGE=f'bytes={len(content)}-')
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+        )
+        self.assertEqual(response['Content-Range'], f'bytes */{len(content)}')
+
+    def test_templink_supports_multiple_byte_ranges(self):
+        """
+        Makes sure many ranges are sent as multipart byteranges.
+        """
+
+        link, content = self._get_templink_url()
+
+        response = self.client.get(link, HTTP_RANGE='bytes=0-9,20-29')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        content_type, boundary = response['Content-Type'].split('; boundary=')
+        self.assertEqual(content_type, 'multipart/byteranges')
+
+        body = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(body))
+        parts = body.split(f'--{boundary}'.encode())[1:-1]
+        self.assertEqual(len(parts), 2)
+        for part, (first, last) in zip(parts, ((0, 9), (20, 29))):
+            headers, data = part.split(b'\r\n\r\n', 1)
+            self.assertIn(
+                f'Content-Range: bytes {first}-{last}/{len(content)}'.encode(),
+                headers
+            )
+            self.assertEqual(data[:-2], content[first:last + 1])
+
+    def test_templink_supports_conditional_requests(self):
+        """
+        Makes sure clients with up to date copy get 304 response
+        and ranges of changed file are not served.
+        """
+
+        link, content = self._get_templink_url()
+        response = self.client.get(link)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(link, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(link, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(
+            link,
+            HTTP_RANGE='bytes=0-9',
+            HTTP_IF_RANGE='"outdated"'
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(response.streaming_content), content)
+
+        response = self.client.get(
+            link,
+            HTTP_RANGE='bytes=0-9',
+            HTTP_IF_RANGE=etag
+        )
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+
     def test_anyone_can_use_templink(self):
         """
         Makes sure no authentication is needed to get templink image.
@@ -759,6 +1929,452 @@ class TemporaryImageViewTestCase(APITestCase):
 
         # Make sure token was blacklisted.
         self.assertTrue(TempLinkTokenBlacklist.objects.get(token=token))
+
+    @override_settings(TEMPLINK_SIGNED_TOKENS=True)
+    def test_signed_templink_is_checked_in_one_query(self):
+        """
+        Makes sure signed token leads to the image, hitting DB only
+        once to look the image up and check the link and revocation.
+        """
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        templink_data = self._create_templink(image_pk, 300)
+        self.assertTrue(is_signed_token(get_token(templink_data)))
+        self.client.logout()
+
+        with self.assertNumQueries(1):
+            response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with open(get_path(SAMPLE_JPG), 'rb') as source:
+            self.assertEqual(
+                source.read(),
+                b''.join(response.streaming_content)
+            )
+
+    @override_settings(TEMPLINK_SIGNED_TOKENS=True)
+    def test_expired_signed_templink_is_rejected_without_db(self):
+        """
+        Makes sure expiry of signed token is checked without DB.
+        """
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        templink_data = self._create_templink_in_the_past(
+            image_pk,
+            expires_in=300,
+            created_sec_ago=301
+        )
+        self.client.logout()
+
+        with self.assertNumQueries(0):
+            response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    @override_settings(TEMPLINK_SIGNED_TOKENS=True)
+    def test_tampered_signed_templink_is_rejected(self):
+        """
+        Makes sure signed tokens with modified claims are not accepted.
+        """
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        token = get_token(self._create_templink(image_pk, 300))
+        self.client.logout()
+
+        # Extend lifetime without re-signing the token.
+        pk, created, expires_in, rest = token.split('.', 3)
+        forged = '.'.join([pk, created, 'zzzz', rest])
+        url = reverse('temporary-image-view', kwargs={'token': forged})
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(TEMPLINK_SIGNED_TOKENS=True)
+    def test_blacklisted_signed_templink_is_revoked(self):
+        """
+        Makes sure signed tokens can be revoked through the blacklist.
+        """
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        templink_data = self._create_templink(image_pk, 300)
+        TempLinkTokenBlacklist.objects.create(token=get_token(templink_data))
+
+        response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    @override_settings(TEMPLINK_SIGNED_TOKENS=True)
+    def test_deleted_signed_templink_is_revoked(self):
+        """
+        Makes sure deleting a link revokes its signed token, whether
+        the link was cached or not.
+        """
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        cached_data = self._create_templink(image_pk, 300)
+        uncached_data = self._create_templink(image_pk, 300)
+        response = self.client.get(cached_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TempLink.objects.all().delete()
+
+        for templink_data in (cached_data, uncached_data):
+            response = self.client.get(templink_data['link'])
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_random_templink_works_with_signed_tokens_enabled(self):
+        """
+        Makes sure links created before signed tokens were enabled
+        keep working.
+        """
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        templink_data = self._create_templink(image_pk, 300)
+        self.assertFalse(is_signed_token(get_token(templink_data)))
+
+        with self.settings(TEMPLINK_SIGNED_TOKENS=True):
+            response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(
+        TEMPLINK_BLACKLIST_FILTER_STORE='api.blacklist.MemoryFilterStore',
+        TEMPLINK_BLACKLIST_FILTER_CAPACITY=1000
+    )
+    def test_templink_revocation_is_checked_without_filter(self):
+        """
+        Makes sure revocation is checked within the link lookup, without
+        round trips to blacklist filter.
+        """
+        load_filter_store.cache_clear()
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        valid = self._create_templink(image_pk, 300)
+        revoked = self._create_templink(image_pk, 300)
+        with self.settings(TEMPLINK_SIGNED_TOKENS=True):
+            valid_signed = self._create_templink(image_pk, 300)
+            revoked_signed = self._create_templink(image_pk, 300)
+        for templink_data in (revoked, revoked_signed):
+            TempLinkTokenBlacklist.objects.create(token=get_token(templink_data))
+
+        with mock.patch('api.blacklist.get_filter_store') as store:
+            for templink_data in (valid, valid_signed):
+                response = self.client.get(templink_data['link'])
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+            for templink_data in (revoked, revoked_signed):
+                response = self.client.get(templink_data['link'])
+                self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        store.assert_not_called()
+
+    def test_templink_is_rate_limited_per_tier(self):
+        """
+        Makes sure requests over the limit of owner's tier are rejected
+        without DB access.
+        """
+        self.enterprise.templink_rate_limit = '2/min'
+        self.enterprise.templink_client_rate_limit = ''
+        self.enterprise.save()
+
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        templink_data = self._create_templink(image_pk, 300)
+        other_data = self._create_templink(image_pk, 300)
+        self.client.logout()
+
+        # First request caches the link along with its limits.
+        for _ in range(3):
+            response = self.client.get(templink_data['link'])
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+
+        # Other links have their own limit.
+        response = self.client.get(other_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_tier_limit_changes_apply_to_cached_links(self):
+        """
+        Makes sure links cached before their owner's tier changed are
+        limited with its new limits.
+        """
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        templink_data = self._create_templink(image_pk, 300)
+        self.client.logout()
+
+        response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.enterprise.templink_rate_limit = '1/min'
+        self.enterprise.save()
+
+        response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_templinks_are_rate_limited_per_client(self):
+        """
+        Makes sure one client cannot exceed its limit using many links,
+        while other clients are not affected.
+        """
+        self.enterprise.templink_client_rate_limit = '3/min'
+        self.enterprise.save()
+
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        links = [self._create_templink(image_pk, 300)['link'] for _ in range(3)]
+        self.client.logout()
+
+        # Links are cached with their limits on first request, then
+        # the client may use up its limit.
+        for link in links * 2:
+            response = self.client.get(link)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(links[0])
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        response = self.client.get(links[0], REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(TEMPLINK_DEFAULT_CLIENT_RATE_LIMIT='2/min')
+    def test_unknown_templinks_are_rate_limited(self):
+        """
+        Makes sure guessing tokens is limited by default client limit.
+        """
+        url = reverse('temporary-image-view', kwargs={'token': 'unknown'})
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_templink_is_served_from_cache(self):
+        """
+        Makes sure repeated requests for the same link skip DB.
+        """
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        templink_data = self._create_templink(image_pk, 300)
+        self.client.logout()
+
+        first = self.client.get(templink_data['link'])
+        first_content = b''.join(first.streaming_content)
+        with self.assertNumQueries(0):
+            response = self.client.get(templink_data['link'])
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['ETag'], first['ETag'])
+        self.assertEqual(b''.join(response.streaming_content), first_content)
+
+        # Shared cache is used once process memory is cleared.
+        local_cache.clear()
+        with self.assertNumQueries(0):
+            response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_deleted_templink_is_not_served_from_cache(self):
+        """
+        Makes sure deleting link invalidates its cache entry.
+        """
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        templink_data = self._create_templink(image_pk, 300)
+        response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TempLink.objects.get(pk=templink_data['pk']).delete()
+
+        response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_blacklisted_templink_is_not_served_from_cache(self):
+        """
+        Makes sure blacklisting token revokes the link and invalidates
+        its cache entry.
+        """
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        templink_data = self._create_templink(image_pk, 300)
+        response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TempLinkTokenBlacklist.objects.create(
+                token=get_token(templink_data)
+            )
+
+        response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    def test_cached_templink_expires(self):
+        """
+        Makes sure cached link expires along with the link and gets
+        blacklisted.
+        """
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        templink_data = self._create_templink(image_pk, 300)
+        response = self.client.get(templink_data['link'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Move 301 seconds forward.
+        now = time() + 301
+        with mock.patch('api.templink_cache.time', lambda: now), \
+                mock.patch(
+                    'django.utils.timezone.now',
+                    lambda: datetime.fromtimestamp(now, tz=self.use_tz)
+                ):
+            response = self.client.get(templink_data['link'])
+
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertTrue(TempLinkTokenBlacklist.objects.filter(
+            token=get_token(templink_data)
+        ).exists())
+
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class AsyncTemporaryImageViewTestCase(APITestCase):
+    """
+    Tests for AsyncTemporaryImageView view and ASGI handler streaming
+    its responses.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.marcin_data = {
+            "username": "Marcin",
+            "password": "Tomato789",
+            "account_tier": AccountTier.objects.get(name='Enterprise')
+        }
+        cls.marcin = User.objects.create_user(**cls.marcin_data)
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        tier_cache.clear()
+        load_bucket_store.cache_clear()
+
+        login(self, 'marcin_data')
+        image_pk = upload_image(self, SAMPLE_JPG).data['pk']
+        url = reverse('templink-list-create', kwargs={'image_pk': image_pk})
+        templink_data = self.client.post(url, {'expires_in': 300}).data
+        self.token = get_token(templink_data)
+        self.client.logout()
+
+        with open(get_path(SAMPLE_JPG), 'rb') as source:
+            self.content = source.read()
+
+    async def _get(self, token, **headers):
+        """
+        Helper function. Requests templink with async view and returns
+        response along with its content.
+        """
+        request = AsyncRequestFactory().get(
+            f'/api/templink/{token}/',
+            **headers
+        )
+        response = await AsyncTemporaryImageView.as_view()(request, token=token)
+        if response.streaming:
+            content = b''.join([part async for part in response])
+        else:
+            content = response.content
+        return response, content
+
+    async def test_async_view_streams_original(self):
+        """
+        Makes sure original is sent whole, and from cache next time.
+        """
+
+        response, content = await self._get(self.token)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(content, self.content)
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('ETag', response)
+
+        with mock.patch('api.views.TempLink.objects') as objects:
+            response, content = await self._get(self.token)
+        objects.select_related.assert_not_called()
+        self.assertEqual(content, self.content)
+
+    async def test_async_view_serves_ranges(self):
+        """
+        Makes sure Range header is honored.
+        """
+
+        response, content = await self._get(self.token, range='bytes=100-199')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(content, self.content[100:200])
+
+    async def test_async_view_rejects_invalid_tokens(self):
+        """
+        Makes sure unknown tokens get 404 and expired ones 410 and
+        a blacklist entry.
+        """
+
+        response, _ = await self._get('unknown')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        expired = datetime.now(tz=timezone.utc) - timedelta(seconds=1)
+        await TempLink.objects.filter(token=self.token).aupdate(
+            expires_at=expired
+        )
+        response, _ = await self._get(self.token)
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+        self.assertFalse(
+            await TempLink.objects.filter(token=self.token).aexists()
+        )
+        self.assertTrue(
+            await TempLinkTokenBlacklist.objects.filter(
+                token=self.token
+            ).aexists()
+        )
+
+    @override_settings(TEMPLINK_DEFAULT_CLIENT_RATE_LIMIT='1/min')
+    async def test_async_view_is_rate_limited(self):
+        """
+        Makes sure requests over the limit get 429 with Retry-After.
+        """
+
+        response, _ = await self._get('unknown')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response, _ = await self._get('unknown')
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_429_TOO_MANY_REQUESTS
+        )
+        self.assertIn('Retry-After', response)
+
+    async def test_handler_sends_async_content_in_parts(self):
+        """
+        Makes sure ASGI handler sends parts of async content as they
+        are produced.
+        """
+
+        async def content():
+            yield b'first'
+            yield b'second'
+
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        response = AsyncStreamingHttpResponse(content())
+        await AsyncStreamingASGIHandler().send_response(response, send)
+
+        self.assertEqual(messages[0]['type'], 'http.response.start')
+        self.assertEqual(
+            [message.get('body') for message in messages[1:]],
+            [b'first', b'second', None]
+        )
+        self.assertFalse(messages[-1].get('more_body', False))
         
 
 def upload_image(inst, image_name):
@@ -770,6 +2386,21 @@ def upload_image(inst, image_name):
         response = inst.client.post(url, {'image': img})
         return response
     
+def csrf_login(inst, user_data):
+    """
+    Helper function. Replaces test client with one enforcing CSRF
+    checks, logs user in and makes client send a valid CSRF token.
+    """
+    inst.client = APIClient(enforce_csrf_checks=True)
+    login(inst, user_data)
+    token = get_random_string(CSRF_SECRET_LENGTH)
+    inst.client.cookies[settings.CSRF_COOKIE_NAME] = token
+    inst.client.credentials(HTTP_X_CSRFTOKEN=token)
+
+def get_token(templink_data):
+    """ Helper function. Returns token from templink data. """
+    return templink_data['link'].rstrip('/').rsplit('/', 1)[-1]
+
 def get_path(filename):
     """ Helper function. Returns path to file from current folder. """
     return path.join(path.dirname(__file__), filename)
@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from time import monotonic
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+from .templink_cache import get_cached_link
+from .tier_cache import get_account_tier
+
+
+# Durations of rate periods, in seconds.
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 60 * 60 * 24}
+
+
+def parse_rate(rate):
+    """
+    Returns bucket capacity and refill rate per second of rate given
+    as number of requests per period, e.g. 100/min.
+    """
+    requests, period = rate.split('/')
+    requests = int(requests)
+    return requests, requests / PERIODS[period[0]]
+
+
+class MemoryBucketStore:
+    """
+    Keeps token buckets in process memory, so each process enforces
+    limits on its own. Suits development and single process setups.
+    """
+
+    # Buckets over that many are forgotten, least recently used first.
+    # Forgotten buckets start full again, which for idle ones is what
+    # they would have refilled to anyway.
+    max_size = 10000
+
+    def __init__(self):
+        self.buckets = OrderedDict()
+        self.lock = Lock()
+
+    def take(self, buckets):
+        """
+        Takes one token from each of (key, capacity, rate) buckets if all
+        of them have one. Returns 0 if so, otherwise seconds to wait.
+        """
+        now = monotonic()
+        with self.lock:
+            available = []
+            for key, capacity, rate in buckets:
+                tokens, updated = self.buckets.get(key, (capacity, now))
+                available.append(min(capacity, tokens + (now - updated) * rate))
+
+            wait = max((
+                (1 - tokens) / rate
+                for tokens, (_, _, rate) in zip(available, buckets)
+                if tokens < 1
+            ), default=0)
+            if wait:
+                return wait
+
+            for tokens, (key, _, _) in zip(available, buckets):
+                self.buckets[key] = (tokens - 1, now)
+                self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_size:
+                self.buckets.popitem(last=False)
+            return 0
+
+
+class RedisBucketStore:
+    """
+    Keeps token buckets in Redis, shared by all processes. Buckets are
+    checked and updated atomically by a script using Redis clock.
+    """
+
+    script = """
+        local time = redis.call('TIME')
+        local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+        local available = {}
+        local wait = 0
+        for i, key in ipairs(KEYS) do
+            local capacity = tonumber(ARGV[i * 2 - 1])
+            local rate = tonumber(ARGV[i * 2])
+            local state = redis.call('HMGET', key, 'tokens', 'updated')
+            local tokens = tonumber(state[1]) or capacity
+            local updated = tonumber(state[2]) or now
+            tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+            available[i] = tokens
+            if tokens < 1 then
+                wait = math.max(wait, (1 - tokens) / rate)
+            end
+        end
+        if wait > 0 then
+            return tostring(wait)
+        end
+        for i, key in ipairs(KEYS) do
+            local capacity = tonumber(ARGV[i * 2 - 1])
+            local rate = tonumber(ARGV[i * 2])
+            redis.call('HSET', key, 'tokens', available[i] - 1, 'updated', now)
+            redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+        end
+        return '0'
+    """
+
+    def __init__(self):
+        from redis import Redis
+        client = Redis.from_url(settings.REDIS_CACHE_URL)
+        self.take_tokens = client.register_script(self.script)
+
+    def take(self, buckets):
+        """
+        Takes one token from each of (key, capacity, rate) buckets if all
+        of them have one. Returns 0 if so, otherwise seconds to wait.
+        """
+        keys = [key for key, _, _ in buckets]
+        args = [value for _, capacity, rate in buckets
+                for value in (capacity, rate)]
+        return float(self.take_tokens(keys=keys, args=args))
+
+
+@lru_cache(maxsize=None)
+def load_bucket_store(path):
+    return import_string(path)()
+
+
+class TempLinkRateThrottle(BaseThrottle):
+    """
+    Limits requests to a temporary link with token buckets kept per link
+    and per client IP. Limits come from account tier of the link owner,
+    which is known from templink and tier caches, so that requests over
+    the limit are rejected without touching the database. Links which are not
+    cached yet are limited per client with TEMPLINK_DEFAULT_CLIENT_RATE_LIMIT.
+    """
+
+    def allow_request(self, request, view):
+        token = view.kwargs['token']
+        link = get_cached_link(token)
+        account = get_account_tier(link.account_tier) if link else None
+        if link is None:
+            rate, client_rate = '', settings.TEMPLINK_DEFAULT_CLIENT_RATE_LIMIT
+        elif account is None:
+            rate, client_rate = '', ''
+        else:
+            rate = account.templink_rate_limit
+            client_rate = account.templink_client_rate_limit
+
+        buckets = []
+        if rate:
+            buckets.append((f'templink-bucket:{token}', *parse_rate(rate)))
+        if client_rate:
+            ident = self.get_ident(request)
+            buckets.append(
+                (f'templink-bucket:client:{ident}', *parse_rate(client_rate))
+            )
+        if not buckets:
+            return True
+
+        store = load_bucket_store(settings.TEMPLINK_RATE_LIMIT_STORE)
+        self.wait_time = store.take(buckets)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
@@ -0,0 +1,444 @@
+import logging
+import os
+from math import ceil
+from PIL import Image as PILImage
+from sorl.thumbnail import default
+from sorl.thumbnail.base import (
+    EXTENSIONS,
+    ThumbnailBackend as SorlThumbnailBackend,
+)
+from sorl.thumbnail.conf import settings, defaults as default_settings
+from sorl.thumbnail.engines.pil_engine import Engine as PILEngine
+from sorl.thumbnail.helpers import tokey, serialize
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import dbm_kvstore, redis_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.parsers import parse_geometry
+from .imaging import resize
+
+
+logger = logging.getLogger(__name__)
+
+# Options shared by every thumbnail rendered for account tiers.
+THUMBNAIL_OPTIONS = {
+    'quality': 50,
+}
+
+# Media types of thumbnail formats, used for content negotiation.
+FORMAT_MEDIA_TYPES = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+    'AVIF': 'image/avif',
+}
+
+# Options after which a thumbnail is no longer a plain downscale
+# of the source, so it cannot be reused to render smaller ones.
+NON_CHAINABLE_OPTIONS = ('crop', 'cropbox', 'rounded', 'blur', 'padding')
+
+
+def thumbnail_geometry(size):
+    """
+    Returns sorl geometry string for given ThumbnailSize.
+    """
+    return f"x{size.height}"
+
+
+def thumbnail_formats():
+    """
+    Returns formats thumbnails are rendered in, default format first.
+    Skips alternative formats which Pillow is not able to save.
+    """
+    PILImage.init()
+    return [settings.THUMBNAIL_FORMAT] + [
+        format_ for format_ in settings.THUMBNAIL_ALTERNATIVE_FORMATS
+        if format_ in PILImage.SAVE
+    ]
+
+
+def preferred_thumbnail_format(request):
+    """
+    Returns the first alternative thumbnail format which request
+    accepts explicitly, default thumbnail format otherwise.
+    """
+    accepted = _accepted_media_types(request.META.get('HTTP_ACCEPT', ''))
+    default_format, *alternative_formats = thumbnail_formats()
+    for format_ in alternative_formats:
+        if FORMAT_MEDIA_TYPES[format_] in accepted:
+            return format_
+    return default_format
+
+
+def _accepted_media_types(header):
+    """
+    Returns media types listed in Accept header with non-zero quality.
+    """
+    accepted = set()
+    for item in header.split(','):
+        media_type, *params = item.split(';')
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(media_type.strip().lower())
+    return accepted
+
+
+class ThumbnailBackend(SorlThumbnailBackend):
+    """
+    Sorl backend which is also able to look thumbnails up
+    without rendering missing ones.
+    """
+
+    def _prepare_options(self, source, options):
+        """
+        Fills options with defaults the same way sorl does, so that
+        computed thumbnail names match names of rendered files.
+        """
+        if settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+
+        for key, attr in self.extra_options:
+            value = getattr(settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+
+        return options
+
+    def get_thumbnail_file(self, file_, geometry_string, **options):
+        """
+        Returns thumbnail as an ImageFile instance, whether it was
+        rendered or not. Touches neither storage nor key value store.
+        """
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail_file()')
+
+        source = ImageFile(file_)
+        options = self._prepare_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        """
+        Returns thumbnail as an ImageFile instance if it was already
+        rendered, None otherwise. Never touches the source image.
+        """
+        thumbnail = self.get_thumbnail_file(file_, geometry_string, **options)
+        return default.kvstore.get(thumbnail)
+
+    def get_thumbnails(self, file_, geometry_strings, formats=None,
+                       **options):
+        """
+        Returns a dict mapping (geometry string, format) pairs to thumbnail
+        ImageFile instances. Formats default to the one given in options.
+        Missing thumbnails are rendered from a single decode of the source,
+        downscaling from largest to smallest and writing each scaled image
+        in all formats.
+        """
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnails()')
+
+        source = ImageFile(file_)
+        options = self._prepare_options(source, options)
+        formats = formats or [options['format']]
+        thumbnails = {}
+        missing = {}
+
+        for geometry_string in geometry_strings:
+            for format_ in formats:
+                format_options = {**options, 'format': format_}
+                name = self._get_thumbnail_filename(
+                    source,
+                    geometry_string,
+                    format_options
+                )
+                thumbnail = ImageFile(name, default.storage)
+                cached = default.kvstore.get(thumbnail)
+                if cached:
+                    thumbnails[geometry_string, format_] = cached
+                    continue
+
+                thumbnails[geometry_string, format_] = thumbnail
+                # Storage backend may not overwrite existing files.
+                if (settings.THUMBNAIL_FORCE_OVERWRITE
+                        or not thumbnail.exists()):
+                    missing.setdefault(geometry_string, []).append(
+                        (format_, thumbnail)
+                    )
+
+        if missing:
+            try:
+                source_image = default.engine.get_image(source)
+            except Exception as e:
+                logger.exception(e)
+                logger.warning('Remote file [%s] does not exist', file_)
+                return thumbnails
+
+            options['image_info'] = default.engine.get_image_info(
+                source_image
+            )
+            source.set_size(default.engine.get_image_size(source_image))
+
+            try:
+                self._create_thumbnails(source_image, missing, options)
+            finally:
+                default.engine.cleanup(source_image)
+
+        default.kvstore.get_or_set(source)
+        for thumbnail in thumbnails.values():
+            default.kvstore.set(thumbnail, source)
+        return thumbnails
+
+    def _create_thumbnails(self, source_image, thumbnails, options):
+        """
+        Creates thumbnails given as dict mapping geometry string to
+        (format, ImageFile) pairs. Each geometry is scaled from
+        the previous, larger one if options allow it, from the source
+        image otherwise.
+        """
+        ratio = default.engine.get_image_ratio(source_image, options)
+        geometries = sorted(
+            (
+                (parse_geometry(geometry_string, ratio), geometry_string,
+                 files)
+                for geometry_string, files in thumbnails.items()
+            ),
+            key=lambda item: item[0][0] * item[0][1],
+            reverse=True
+        )
+        chainable = not any(
+            options.get(option) for option in NON_CHAINABLE_OPTIONS
+        )
+
+        image = source_image
+        for geometry, geometry_string, files in geometries:
+            created = default.engine.create(image, geometry, options)
+            for format_, thumbnail in files:
+                format_options = {**options, 'format': format_}
+                logger.debug('Creating thumbnail file [%s] at [%s] with [%s]',
+                             thumbnail.name, geometry_string, format_options)
+                default.engine.write(created, format_options, thumbnail)
+                thumbnail.set_size(default.engine.get_image_size(created))
+                self._create_alternative_resolutions(
+                    source_image,
+                    geometry_string,
+                    format_options,
+                    thumbnail.name
+                )
+            if chainable:
+                image = created
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        """
+        Computes the destination filename the same way sorl does,
+        also for formats sorl has no extension for.
+        """
+        key = tokey(source.key, geometry_string, serialize(options))
+        path = '%s/%s/%s' % (key[:2], key[2:4], key)
+        extension = EXTENSIONS.get(options['format'], options['format'].lower())
+        return '%s%s.%s' % (settings.THUMBNAIL_PREFIX, path, extension)
+
+
+class BatchKVStoreMixin:
+    """
+    Lets key value store look many image files up at once.
+    """
+
+    def get_many(self, image_files):
+        """
+        Returns image files found in store, None for missing ones.
+        """
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        return [
+            deserialize_image_file(value) if value else None
+            for value in self._get_many_raw(keys)
+        ]
+
+    def _get_many_raw(self, keys):
+        return [self._get_raw(key) for key in keys]
+
+
+class RedisKVStore(BatchKVStoreMixin, redis_kvstore.KVStore):
+    """
+    Redis key value store getting many image files in one round trip.
+    """
+
+    def _get_many_raw(self, keys):
+        return self.connection.mget(keys) if keys else []
+
+
+class DBMKVStore(BatchKVStoreMixin, dbm_kvstore.KVStore):
+    """
+    DBM key value store opening the database once to get many image
+    files. Meant for development and testing. Creates directory of the
+    database if it is missing, e.g. a temporary one removed meanwhile.
+    """
+
+    @property
+    def filename(self):
+        os.makedirs(os.path.dirname(self._filename) or '.', exist_ok=True)
+        return self._filename
+
+    @filename.setter
+    def filename(self, value):
+        self._filename = value
+
+    def _get_many_raw(self, keys):
+        with dbm_kvstore.DBMContext(self.filename, self.mode, True) as db:
+            return [
+                db[key] if key in db else None
+                for key in map(self._cast_key, keys)
+            ]
+
+
+class Engine(PILEngine):
+    """
+    PIL engine which decodes JPEGs at reduced scale and
+    shrinks them by an integer factor before resampling.
+    """
+
+    def create(self, image, geometry, options):
+        image = self.draft(image, geometry, options)
+        return super().create(image, geometry, options)
+
+    def draft(self, image, geometry, options):
+        """
+        Makes not yet decoded JPEG decode at the smallest DCT scale
+        which is still not smaller than the thumbnail.
+        """
+        # Cropbox is given in source pixels, so keep full scale.
+        if image.format != 'JPEG' or not image.tile or options['cropbox']:
+            return image
+
+        x_image, y_image = map(float, self.get_image_size(image))
+        if self.flip_dimensions(image):
+            x_image, y_image = y_image, x_image
+        factor = self._calculate_scaling_factor(
+            x_image,
+            y_image,
+            geometry,
+            options
+        )
+        if factor < 1:
+            width, height = self.get_image_size(image)
+            image.draft(image.mode, (ceil(width * factor),
+                                     ceil(height * factor)))
+        return image
+
+    def _scale(self, image, width, height):
+        return resize(image, (width, height))
+
+
+def render_thumbnails(image, sizes):
+    """
+    Renders thumbnails of given sizes in all thumbnail formats
+    for an Image instance, decoding the original once. Already rendered
+    thumbnails are only looked up. Returns a list ordered by sizes,
+    then by formats.
+    """
+    geometries = [thumbnail_geometry(size) for size in sizes]
+    if not geometries:
+        return []
+
+    formats = thumbnail_formats()
+    thumbnails = default.backend.get_thumbnails(
+        image.image,
+        geometries,
+        formats=formats,
+        **THUMBNAIL_OPTIONS
+    )
+    return [
+        thumbnails[geometry, format_]
+        for geometry in geometries
+        for format_ in formats
+    ]
+
+
+def get_thumbnail_files(image, sizes):
+    """
+    Returns ImageFile instances of thumbnails of given sizes in all
+    thumbnail formats for an Image instance, whether they were rendered
+    or not. Ordered by sizes, then by formats.
+    """
+    formats = thumbnail_formats()
+    return [
+        default.backend.get_thumbnail_file(
+            image.image,
+            thumbnail_geometry(size),
+            format=format_,
+            **THUMBNAIL_OPTIONS
+        )
+        for size in sizes
+        for format_ in formats
+    ]
+
+
+def get_cached_thumbnail(image, size, format_=None):
+    """
+    Returns rendered thumbnail of given size and format (default
+    thumbnail format if not given) for an Image instance or None
+    if it is still pending.
+    """
+    options = dict(THUMBNAIL_OPTIONS)
+    if format_ is not None:
+        options['format'] = format_
+
+    return default.backend.get_cached_thumbnail(
+        image.image,
+        thumbnail_geometry(size),
+        **options
+    )
+
+
+def get_preferred_thumbnail(image, size, request):
+    """
+    Returns rendered thumbnail of given size in format preferred
+    by request. Falls back to default format, e.g. for thumbnails
+    rendered before alternative format was enabled.
+    """
+    format_ = preferred_thumbnail_format(request)
+    thumbnail = get_cached_thumbnail(image, size, format_)
+    if thumbnail is None and format_ != settings.THUMBNAIL_FORMAT:
+        thumbnail = get_cached_thumbnail(image, size)
+    return thumbnail
+
+
+def get_preferred_thumbnails(images, sizes, request):
+    """
+    Returns dict mapping (image pk, size pk) pairs to rendered thumbnails
+    of Image instances in format preferred by request, falling back
+    to default format like get_preferred_thumbnail. Pending thumbnails
+    are mapped to None. Looks all of them up in key value store at once.
+    """
+    formats = list(dict.fromkeys(
+        (preferred_thumbnail_format(request), settings.THUMBNAIL_FORMAT)
+    ))
+    files = [
+        default.backend.get_thumbnail_file(
+            image.image,
+            thumbnail_geometry(size),
+            **{**THUMBNAIL_OPTIONS, 'format': format_}
+        )
+        for image in images
+        for size in sizes
+        for format_ in formats
+    ]
+    if hasattr(default.kvstore, 'get_many'):
+        found = iter(default.kvstore.get_many(files))
+    else:
+        found = iter([default.kvstore.get(file_) for file_ in files])
+
+    thumbnails = {}
+    for image in images:
+        for size in sizes:
+            candidates = [next(found) for _ in formats]
+            thumbnails[image.pk, size.pk] = next(filter(None, candidates), None)
+    return thumbnails
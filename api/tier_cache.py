@@ -0,0 +1,146 @@
+import logging
+import os
+from threading import Lock, Thread
+from time import monotonic, sleep
+from django.conf import settings
+from django.db import transaction
+from .models import AccountTier
+
+
+logger = logging.getLogger(__name__)
+
+# Redis channel announcing changed account tiers to all processes.
+CHANNEL = 'account-tiers:invalidate'
+
+# Message asking to drop all cached tiers.
+ALL_TIERS = '*'
+
+
+class TierCache:
+    """
+    Account tiers along with their thumbnail sizes, cached in process
+    memory for ACCOUNT_TIER_CACHE_TIMEOUT seconds at most. Changed tiers
+    are dropped by signal receivers and, if Redis is configured, by
+    a thread listening to invalidations broadcast by other processes.
+    Cached tiers are shared, so they must not be modified.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = Lock()
+        # Bumped on every invalidation, so that tiers loaded meanwhile
+        # are not cached.
+        self.generation = 0
+        self.listener_pid = None
+
+    def get(self, pk):
+        """
+        Returns account tier with thumbnail sizes prefetched, None
+        if there is no such tier.
+        """
+        if pk is None:
+            return None
+
+        self.ensure_listener()
+        entry = self.entries.get(pk)
+        if entry is not None and monotonic() < entry[1]:
+            return entry[0]
+
+        generation = self.generation
+        tier = AccountTier.objects.prefetch_related(
+            'thumbnail_sizes'
+        ).filter(pk=pk).first()
+        timeout = settings.ACCOUNT_TIER_CACHE_TIMEOUT
+        with self.lock:
+            if tier is not None and generation == self.generation:
+                self.entries[pk] = (tier, monotonic() + timeout)
+        return tier
+
+    def drop(self, pk=None):
+        """
+        Drops given tier, or all of them if pk is None.
+        """
+        with self.lock:
+            self.generation += 1
+            if pk is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(pk, None)
+
+    def clear(self):
+        self.drop()
+
+    def ensure_listener(self):
+        """
+        Starts listening to invalidations in this process, once.
+        Checked on each use, as forked workers do not inherit threads.
+        """
+        if not settings.REDIS_CACHE_URL or self.listener_pid == os.getpid():
+            return
+
+        with self.lock:
+            if self.listener_pid == os.getpid():
+                return
+            self.listener_pid = os.getpid()
+        Thread(target=self.listen, daemon=True).start()
+
+    def listen(self):
+        from redis import Redis
+        client = Redis.from_url(settings.REDIS_CACHE_URL)
+        while True:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                # Invalidations sent before subscribing were missed.
+                self.drop()
+                for message in pubsub.listen():
+                    data = message['data'].decode()
+                    self.drop(None if data == ALL_TIERS else int(data))
+            except Exception:
+                logger.exception('Account tier invalidations lost.')
+                self.drop()
+                sleep(1)
+
+
+tier_cache = TierCache()
+
+
+def get_account_tier(pk):
+    """
+    Returns cached account tier of given pk, None if pk is None.
+    Tier's thumbnail_sizes.all() is served from cache as well.
+    """
+    return tier_cache.get(pk)
+
+
+def get_user_account_tier(user):
+    """
+    Returns cached account tier of given user, None for guests
+    and users without tier.
+    """
+    return tier_cache.get(getattr(user, 'account_tier_id', None))
+
+
+def invalidate_account_tier(pk=None):
+    """
+    Drops given tier, or all of them if pk is None, from caches of this
+    and, once committed, of all other processes.
+    """
+    tier_cache.drop(pk)
+
+    def broadcast():
+        tier_cache.drop(pk)
+        if not settings.REDIS_CACHE_URL:
+            return
+
+        from redis import Redis
+        try:
+            Redis.from_url(settings.REDIS_CACHE_URL).publish(
+                CHANNEL,
+                ALL_TIERS if pk is None else pk
+            )
+        except Exception:
+            # Other processes catch up once their entries go stale.
+            logger.exception('Could not broadcast account tier change.')
+
+    transaction.on_commit(broadcast)
@@ -0,0 +1,178 @@
+from hashlib import sha256
+from io import BytesIO
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    MemoryFileUploadHandler,
+    SkipFile,
+    TemporaryFileUploadHandler,
+)
+from django.template.defaultfilters import filesizeformat
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+from .tier_cache import get_user_account_tier
+
+
+# Signatures which files of allowed formats start with. Pillow reports
+# JPEGs with more pictures, e.g. from phone cameras, as MPO.
+MAGIC_BYTES = {
+    'JPEG': b'\xff\xd8\xff',
+    'MPO': b'\xff\xd8\xff',
+    'PNG': b'\x89PNG\r\n\x1a\n',
+}
+
+# Upload is rejected if image header is not found within that many bytes.
+HEADER_MAX_BYTES = 512 * 1024
+
+
+class ChecksumMixin:
+    """
+    Computes SHA-256 checksum of uploaded file while it streams in.
+    Stores hex digest as file's checksum attribute.
+    """
+
+    def new_file(self, *args, **kwargs):
+        self.hasher = sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        # Hash only data which this handler consumes.
+        if getattr(self, 'activated', True):
+            self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.checksum = self.hasher.hexdigest()
+        return file
+
+
+class ChecksumMemoryFileUploadHandler(ChecksumMixin, MemoryFileUploadHandler):
+    """
+    Streams small uploads into memory, computing their checksum.
+    """
+
+
+class ChecksumTemporaryFileUploadHandler(ChecksumMixin,
+                                         TemporaryFileUploadHandler):
+    """
+    Streams uploads into a temporary file, computing their checksum.
+    """
+
+
+class ImageValidationUploadHandler(FileUploadHandler):
+    """
+    Validates uploaded images while they stream in, before they are
+    buffered. Checks magic bytes and reads format and dimensions from
+    image header, enforcing account tier's size limits. Passes data
+    on to next handlers and aborts the upload on first violation.
+    If more than one file is allowed, invalid files are skipped
+    instead and listed in rejected attribute.
+    Passes everything through if uploading user has no account tier.
+    Must be the first upload handler.
+    """
+
+    def __init__(self, request, max_files=1):
+        super().__init__(request)
+        self.max_files = max_files
+        # Set once account tier of uploading user is known.
+        self.active = False
+        # Field and file names of uploaded files, in order,
+        # and errors of skipped ones by their index.
+        self.files = []
+        self.rejected = {}
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        # Body may be parsed during authentication, e.g. by CSRF check
+        # of session authentication, so user is taken from the Django
+        # request. DRF sets it there as well once it authenticates.
+        account_tier = get_user_account_tier(self.request.user)
+        if account_tier is None:
+            return
+        self.active = True
+        self.max_size = account_tier.max_upload_size
+        self.max_pixels = account_tier.max_upload_pixels
+
+        # Reject oversized requests before reading the body,
+        # leaving room for multipart boundaries and other fields.
+        max_size = self.max_size * self.max_files
+        if content_length > max_size + HEADER_MAX_BYTES:
+            self.reject(f'Upload exceeds {filesizeformat(max_size)}.')
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        if not self.active:
+            return
+        self.header = b''
+        self.validated = False
+        self.files.append((self.field_name, self.file_name))
+        if len(self.files) > self.max_files:
+            raise ValidationError({
+                self.field_name: [f'Upload at most {self.max_files} files.']
+            })
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if start + len(raw_data) > self.max_size:
+            self.reject(
+                f'File exceeds {filesizeformat(self.max_size)}.'
+            )
+
+        if not self.validated:
+            self.header += raw_data
+            self.validate_header(final=False)
+        return raw_data
+
+    def file_complete(self, file_size):
+        # Completed files cannot be skipped anymore. Their content
+        # is still validated by the serializer.
+        if self.active and not self.validated and self.max_files == 1:
+            self.validate_header(final=True)
+
+    def validate_header(self, final):
+        """
+        Validates buffered beginning of the file. Waits for more data
+        until the header can be read, unless final is set.
+        """
+        if not any(
+            magic.startswith(self.header[:len(magic)])
+            for magic in MAGIC_BYTES.values()
+        ):
+            self.reject('Allowed file formats: jpg/jpeg, png.')
+
+        try:
+            image = Image.open(BytesIO(self.header))
+        except Image.DecompressionBombError:
+            self.reject('Image has too many pixels.')
+        except Exception:
+            if final or len(self.header) >= HEADER_MAX_BYTES:
+                self.reject('Could not read image header.')
+            return
+
+        if not self.header.startswith(MAGIC_BYTES.get(image.format, b'-')):
+            self.reject('Allowed file formats: jpg/jpeg, png.')
+
+        width, height = image.size
+        if width * height > self.max_pixels:
+            self.reject(
+                f'Image has {width}x{height} pixels, '
+                f'account tier allows up to {self.max_pixels}.'
+            )
+
+        self.validated = True
+        self.header = b''
+
+    def reject(self, message):
+        """
+        Aborts the upload. Remaining request body is not read.
+        Skips current file instead if more files are allowed.
+        """
+        if self.max_files > 1 and self.file_name is not None:
+            self.rejected[len(self.files) - 1] = message
+            raise SkipFile()
+
+        raise ValidationError({
+            getattr(self, 'field_name', None) or 'image': [message]
+        })
@@ -1,11 +1,19 @@
+from django.conf import settings
 from django.urls import path, include
 from .views import (
     UserDetailView,
     UserListView,
     ImageListUploadView,
+    ImageBulkUploadView,
+    UploadSessionCreateView,
+    UploadSessionView,
+    UploadSessionCompleteView,
     ImageDetailView,
+    ThumbnailView,
     TempLinkListCreateView,
+    TempLinkBulkCreateView,
     TemporaryImageView,
+    AsyncTemporaryImageView,
 )
 
 urlpatterns = [
@@ -28,19 +36,50 @@ urlpatterns = [
         ImageListUploadView.as_view(),
         name='image-list-upload'
     ),
+    path(
+        'image/bulk/',
+        ImageBulkUploadView.as_view(),
+        name='image-bulk-upload'
+    ),
+    path(
+        'image/upload/',
+        UploadSessionCreateView.as_view(),
+        name='upload-session-create'
+    ),
+    path(
+        'image/upload/<uuid:pk>/',
+        UploadSessionView.as_view(),
+        name='upload-session-detail'
+    ),
+    path(
+        'image/upload/<uuid:pk>/complete/',
+        UploadSessionCompleteView.as_view(),
+        name='upload-session-complete'
+    ),
     path(
         'image/<int:pk>/',
         ImageDetailView.as_view(),
         name='image-detail'
     ),
+    path(
+        'image/<int:pk>/thumbnail/<int:height>/',
+        ThumbnailView.as_view(),
+        name='image-thumbnail'
+    ),
     path(
         'image/<int:image_pk>/templink/',
         TempLinkListCreateView.as_view(),
         name='templink-list-create'
     ),
+    path(
+        'image/templink/',
+        TempLinkBulkCreateView.as_view(),
+        name='templink-bulk-create'
+    ),
     path(
         'templink/<str:token>/',
-        TemporaryImageView.as_view(),
+        (AsyncTemporaryImageView if settings.TEMPLINK_ASYNC_DOWNLOADS
+         else TemporaryImageView).as_view(),
         name='temporary-image-view'
     ),
 ]
\ No newline at end of file
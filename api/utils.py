@@ -1,5 +1,19 @@
+from base64 import urlsafe_b64encode
+from datetime import datetime, timedelta, timezone as dt_timezone
+from hashlib import sha256
+from os import path
 from secrets import token_urlsafe
-from . import models
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.http import base36_to_int, int_to_base36
+from . import blacklist, models
+
+
+# Signed templink tokens consist of base36 encoded image pk, creation
+# time in milliseconds and lifetime in seconds, a nonce and signature.
+SIGNED_TOKEN_SEPARATOR = '.'
+SIGNED_TOKEN_SALT = 'api.utils.templink'
+
 
 def file_name_generator(instance, filename):
     """
@@ -9,18 +23,123 @@ def file_name_generator(instance, filename):
     return f"{prefix}{filename}"
 
 
+def blob_file_name_generator(instance, filename):
+    """
+    Names file after its checksum, keeping the original extension.
+    Spreads files over subdirectories by checksum prefix.
+    """
+    extension = path.splitext(filename)[1].lower()
+    checksum = instance.checksum
+    return f"originals/{checksum[:2]}/{checksum}{extension}"
+
+
+def upload_session_file_name_generator(instance, filename):
+    """
+    Names partial upload after its session.
+    """
+    return f"uploads/{instance.pk}"
+
+
+def compute_checksum(file_):
+    """
+    Returns SHA-256 hex digest of file's content. Uses checksum computed
+    by upload handler, if there is one.
+    """
+    checksum = getattr(file_, 'checksum', None)
+    if checksum:
+        return checksum
+
+    hasher = sha256()
+    for chunk in file_.chunks():
+        hasher.update(chunk)
+    file_.seek(0)
+    return hasher.hexdigest()
+
+
 def generate_token():
     """
     Generates a 32 bit random token using secrets.token_urlsafe.
     Makes sure token is neither active nor blacklisted.
     """
+    return generate_tokens(1)[0]
 
-    while True:
-        token = token_urlsafe(nbytes=32)
-        token_is_active = bool(models.TempLink.objects.filter(token=token))
-        token_is_blacklisted = bool(
-            models.TempLinkTokenBlacklist.objects.filter(token=token)
+
+def generate_tokens(count):
+    """
+    Generates given number of random tokens, like generate_token.
+    Candidates are checked against active and blacklisted tokens
+    with one query each.
+    """
+    partitions = blacklist.get_retained_partitions()
+    tokens = set()
+    while len(tokens) < count:
+        candidates = {
+            token_urlsafe(nbytes=32) for _ in range(count - len(tokens))
+        } - tokens
+        candidates -= set(
+            models.TempLink.objects.filter(token__in=candidates)
+            .values_list('token', flat=True)
         )
 
-        if not token_is_active and not token_is_blacklisted:
-            return token
+        suspected = blacklist.get_suspected_tokens(candidates, partitions)
+        if suspected:
+            candidates -= set(
+                models.TempLinkTokenBlacklist.objects.filter(token__in=suspected)
+                .values_list('token', flat=True)
+            )
+        tokens |= candidates
+    return list(tokens)
+
+
+def generate_signed_token(image_pk, expires_in, created=None):
+    """
+    Generates token carrying image pk, creation time and lifetime,
+    signed with HMAC. Random nonce keeps tokens unique, so there is
+    no need to look them up in the database.
+    """
+    created = created or timezone.now()
+    payload = SIGNED_TOKEN_SEPARATOR.join((
+        int_to_base36(image_pk),
+        int_to_base36(int(created.timestamp() * 1000)),
+        int_to_base36(expires_in),
+        token_urlsafe(nbytes=6),
+    ))
+    return SIGNED_TOKEN_SEPARATOR.join((payload, _sign(payload)))
+
+
+def is_signed_token(token):
+    # Random tokens are url safe base64, which has no separator.
+    return SIGNED_TOKEN_SEPARATOR in token
+
+
+def parse_signed_token(token):
+    """
+    Returns (image pk, expiration date) of a signed token.
+    Returns None if the token was not signed with our key.
+    """
+    payload, _, signature = token.rpartition(SIGNED_TOKEN_SEPARATOR)
+    if not constant_time_compare(signature, _sign(payload)):
+        return None
+
+    values = payload.split(SIGNED_TOKEN_SEPARATOR)
+    if len(values) != 4:
+        return None
+    try:
+        image_pk, created, expires_in = map(base36_to_int, values[:3])
+    except ValueError:
+        return None
+
+    created = datetime.fromtimestamp(created / 1000, tz=dt_timezone.utc)
+    return image_pk, created + timedelta(seconds=expires_in)
+
+
+def _sign(payload):
+    """
+    Returns truncated HMAC-SHA256 of payload, url safe base64 encoded.
+    """
+    digest = salted_hmac(
+        SIGNED_TOKEN_SALT,
+        payload,
+        algorithm='sha256'
+    ).digest()
+    return urlsafe_b64encode(digest[:16]).rstrip(b'=').decode()
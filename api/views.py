@@ -1,10 +1,36 @@
+import mimetypes
+from math import ceil
+from tempfile import SpooledTemporaryFile
+from urllib.parse import quote
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from django.db.models import Exists, OuterRef
 from django.shortcuts import get_object_or_404
-from django.http import FileResponse
-from rest_framework import permissions, status
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseRedirect,
+    JsonResponse,
+)
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views import View
+from django.views.decorators.vary import vary_on_headers
+from rest_framework import exceptions, permissions, status
+from rest_framework.fields import BooleanField
 from rest_framework.response import Response
 from rest_framework.generics import (
+    CreateAPIView,
     ListAPIView,
     ListCreateAPIView,
+    RetrieveDestroyAPIView,
     RetrieveUpdateDestroyAPIView,
 )
 from rest_framework.views import APIView
@@ -13,14 +39,36 @@ from .serializers import (
     UserPublicSerializer,
     ImageSerializer,
     ImageDetailSerializer,
+    ImageGallerySerializer,
+    UploadSessionSerializer,
     TempLinkSerializer,
+    TempLinkBulkSerializer,
 )
 from .models import (
     User,
     Image,
+    UploadSession,
     TempLink,
     TempLinkTokenBlacklist,
 )
+from .negotiation import IgnoreClientContentNegotiation
+from .pagination import KeysetPagination
+from .ranges import (
+    async_file_response,
+    parse_ranges,
+    range_applies,
+    ranged_file_response,
+)
+from .thumbnails import get_preferred_thumbnail
+from .throttling import TempLinkRateThrottle
+from .tier_cache import get_account_tier
+from .templink_cache import (
+    aget_cached_link,
+    cache_link,
+    get_cached_link,
+)
+from .uploadhandlers import ImageValidationUploadHandler
+from .utils import is_signed_token, parse_signed_token
 from . import permissions as custom_permissions
 
 
@@ -48,15 +96,28 @@ class UserListView(ListAPIView):
 
     queryset = User.objects.all()
     serializer_class = UserPublicSerializer
+    pagination_class = KeysetPagination
+    ordering = 'pk'
 
 
 class ImageListUploadView(ListCreateAPIView):
     """
     For users to view lists of their images
-    and upload new ones.
+    and upload new ones. Lists images with thumbnails and other
+    details if asked to with ?thumbnails=true.
     """
 
     serializer_class = ImageSerializer
+    pagination_class = KeysetPagination
+    # Newest first.
+    ordering = '-pk'
+
+    def get_serializer_class(self):
+        thumbnails = self.request.query_params.get('thumbnails')
+        if (self.request.method == 'GET' and thumbnails is not None
+                and BooleanField().to_internal_value(thumbnails)):
+            return ImageGallerySerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
         # Present only images that belong to requesting user.
@@ -65,16 +126,254 @@ class ImageListUploadView(ListCreateAPIView):
         if user.is_authenticated:
             return Image.objects.filter(owner=user)
         return []
+
+    # Number of images which can be uploaded in one request.
+    upload_max_files = 1
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Request body is parsed lazily, so upload can still be
+        # validated against account tier while it streams in. Handler
+        # must be in place before anything, e.g. CSRF check of session
+        # authentication, reads the body.
+        self.upload_validator = None
+        if request.method == 'POST':
+            self.upload_validator = ImageValidationUploadHandler(
+                request,
+                max_files=self.upload_max_files
+            )
+            request.upload_handlers.insert(0, self.upload_validator)
+        return super().initialize_request(request, *args, **kwargs)
+
+
+class ImageBulkUploadView(ImageListUploadView):
+    """
+    For users to upload many images in one request, sent
+    as repeated image fields. Reports result for each file,
+    in upload order. Valid images are created even if others fail.
+    """
+
+    http_method_names = ['post', 'options']
+
+    @property
+    def upload_max_files(self):
+        return settings.IMAGE_BULK_UPLOAD_MAX_FILES
+
+    def create(self, request, *args, **kwargs):
+        files = request.FILES.getlist('image')
+        # Validator does not run for users without account tier.
+        if self.upload_validator is not None and self.upload_validator.active:
+            uploaded = self.upload_validator.files
+            rejected = self.upload_validator.rejected
+        else:
+            uploaded = [('image', file.name) for file in files]
+            rejected = {}
+
+        # Validate each file separately, skipping ones rejected
+        # while they were uploaded.
+        files = iter(files)
+        results = []
+        serializers = []
+        for index, (field_name, file_name) in enumerate(uploaded):
+            if field_name != 'image':
+                continue
+            result = {'file': file_name}
+            results.append(result)
+
+            if index in rejected:
+                result['errors'] = {'image': [rejected[index]]}
+                continue
+
+            serializer = self.get_serializer(data={'image': next(files)})
+            if serializer.is_valid():
+                serializers.append((result, serializer))
+            else:
+                result['errors'] = serializer.errors
+
+        if not results:
+            return Response(
+                {'image': ['No files were submitted.']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        list_serializer = self.get_serializer(many=True)
+        instances = list_serializer.create(
+            [serializer.validated_data for _, serializer in serializers]
+        )
+        for (result, _), instance in zip(serializers, instances):
+            result.update(self.get_serializer(instance).data)
+
+        if not instances:
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif len(instances) < len(results):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_201_CREATED
+        return Response(results, status=response_status)
     
 
+class UploadSessionCreateView(CreateAPIView):
+    """
+    Starts a resumable upload of an image of declared size.
+    """
+
+    serializer_class = UploadSessionSerializer
+
+
+class UploadSessionView(RetrieveDestroyAPIView):
+    """
+    Shows progress of a resumable upload, receives its chunks
+    or cancels it. Chunk is sent as request body with Upload-Offset
+    header, which must match current offset of the upload.
+    Available for upload owner only.
+    """
+
+    permission_classes = (custom_permissions.IsOwner,)
+    serializer_class = UploadSessionSerializer
+    queryset = UploadSession.objects.all()
+
+    # Chunk body is read in blocks of that many bytes.
+    read_size = 64 * 1024
+
+    def get_object(self):
+        obj = get_object_or_404(self.get_queryset(), pk=self.kwargs['pk'])
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        response['Upload-Offset'] = response.data['offset']
+        return response
+
+    def check_offset(self, session, offset, length):
+        """
+        Returns error response if chunk of given length cannot be
+        stored at given offset, None otherwise.
+        """
+        if offset != session.offset:
+            return Response(
+                {'detail': f'Expected offset {session.offset}.'},
+                status=status.HTTP_409_CONFLICT,
+                headers={'Upload-Offset': session.offset}
+            )
+        if offset + length > session.size:
+            return Response(
+                {'detail': 'Chunk exceeds declared upload size.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return None
+
+    def put(self, request, pk, format=None):
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers.get('Content-Length') or 0)
+        except (KeyError, ValueError):
+            return Response(
+                {'detail': 'Upload-Offset header is required.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        session = self.get_object()
+        error = self.check_offset(session, offset, length)
+        if error is not None:
+            return error
+
+        # Spool the body to disk if large, before any lock is taken, as
+        # slow clients may take long to send it. Keep whatever was
+        # received if connection drops, so upload can resume there.
+        written = 0
+        with SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        ) as buffer:
+            while written < length:
+                chunk = request.stream.read(
+                    min(self.read_size, length - written)
+                )
+                if not chunk:
+                    break
+                buffer.write(chunk)
+                written += len(chunk)
+
+            # Lock the session so that concurrent chunks cannot
+            # interleave, only to store the received part.
+            with transaction.atomic():
+                self.queryset = UploadSession.objects.select_for_update()
+                session = self.get_object()
+                error = self.check_offset(session, offset, length)
+                if error is not None:
+                    return error
+
+                if written:
+                    buffer.seek(0)
+                    session.save_part(offset, File(buffer))
+                session.offset = offset + written
+                session.save(update_fields=('offset', 'updated'))
+
+        serializer = self.get_serializer(session)
+        return Response(
+            serializer.data,
+            headers={'Upload-Offset': session.offset}
+        )
+
+
+class UploadSessionCompleteView(APIView):
+    """
+    Finishes a resumable upload, creating an image from its content.
+    Available for upload owner only.
+    """
+
+    permission_classes = (custom_permissions.IsOwner,)
+
+    def post(self, request, pk, format=None):
+        # Lock the session so that concurrent requests cannot create
+        # two images from it. Those waiting find it deleted.
+        with transaction.atomic():
+            session = get_object_or_404(
+                UploadSession.objects.select_for_update(),
+                pk=pk
+            )
+            self.check_object_permissions(request, session)
+
+            if not session.is_complete():
+                return Response(
+                    {'detail': (f'Upload is incomplete, received '
+                                f'{session.offset} of {session.size} bytes.')},
+                    status=status.HTTP_409_CONFLICT,
+                    headers={'Upload-Offset': session.offset}
+                )
+
+            # Create image the same way as direct uploads,
+            # assembling parts in a temporary file.
+            context = {'request': request, 'format': format, 'view': self}
+            with TemporaryUploadedFile(
+                session.file_name,
+                None,
+                session.size,
+                None
+            ) as file:
+                for chunk in session.read_parts():
+                    file.write(chunk)
+                file.seek(0)
+                serializer = ImageSerializer(
+                    data={'image': file},
+                    context=context
+                )
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+
+            session.delete()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+@method_decorator(vary_on_headers('Accept'), name='dispatch')
 class ImageDetailView(RetrieveUpdateDestroyAPIView):
     """
     Shows details of an image. Available for image owner only.
+    Thumbnail format depends on Accept header.
     """
 
     permission_classes = (custom_permissions.IsOwner,)
     serializer_class = ImageDetailSerializer
-    queryset = Image.objects.all()
+    queryset = Image.objects.select_related('owner')
 
     def get_object(self):
         obj = get_object_or_404(self.get_queryset(), pk=self.kwargs['pk'])
@@ -82,6 +381,73 @@ class ImageDetailView(RetrieveUpdateDestroyAPIView):
         return obj
 
 
+@method_decorator(vary_on_headers('Accept'), name='dispatch')
+class ThumbnailView(APIView):
+    """
+    Serves thumbnail of given height if image owner's account tier
+    allows it, in format chosen by Accept header. Supports conditional
+    requests. Available for image owner only.
+    """
+
+    permission_classes = (custom_permissions.IsOwner,)
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get_object(self):
+        obj = get_object_or_404(
+            Image.objects.select_related('owner'),
+            pk=self.kwargs['pk']
+        )
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    def get(self, request, pk, height, format=None):
+        image = self.get_object()
+
+        # Make sure height is one of account tier's thumbnail sizes.
+        account = get_account_tier(image.owner.account_tier_id)
+        sizes = account.thumbnail_sizes.all() if account else []
+        size = next((size for size in sizes if size.height == height), None)
+        if size is None:
+            raise Http404
+
+        thumbnail = get_preferred_thumbnail(image, size, request)
+        if thumbnail is None:
+            return Response(
+                {'detail': 'Thumbnail is being generated.'},
+                status=status.HTTP_202_ACCEPTED,
+                headers={'Retry-After': '1'}
+            )
+
+        # Thumbnail file names are derived from source and options,
+        # so content under given name never changes.
+        etag = quote_etag(thumbnail.key)
+        try:
+            last_modified = int(thumbnail.storage.get_modified_time(
+                thumbnail.name
+            ).timestamp())
+        except NotImplementedError:
+            last_modified = None
+
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified
+        )
+        if response is None:
+            response = FileResponse(thumbnail.storage.open(thumbnail.name))
+
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(
+            response,
+            private=True,
+            max_age=settings.THUMBNAIL_CACHE_MAX_AGE,
+            immutable=True
+        )
+        return response
+
+
 class TempLinkListCreateView(ListCreateAPIView):
     """
     List and create temporary links. Only for image owner.
@@ -92,14 +458,25 @@ class TempLinkListCreateView(ListCreateAPIView):
         permissions.IsAuthenticated,
         custom_permissions.CanCreateTempLinks
     )
+    pagination_class = KeysetPagination
+    # Newest first.
+    ordering = '-pk'
+
+    def get_image(self):
+        """
+        Returns image the links lead to, loading it only once.
+        """
+        if not hasattr(self, '_image'):
+            self._image = get_object_or_404(Image, pk=self.kwargs['image_pk'])
+        return self._image
 
     def check_permissions(self, request):
         """
         Perform standard check and also verify if user is the owner
         of the image he creates link to.
         """
-        image = get_object_or_404(Image, pk=self.kwargs['image_pk'])
-        if request.user != image.owner:
+        image = self.get_image()
+        if request.user.pk != image.owner_id:
             self.permission_denied(
                     request,
                     message=('Only owners can view and create ' +
@@ -109,35 +486,346 @@ class TempLinkListCreateView(ListCreateAPIView):
         return super().check_permissions(request)
 
     def get_queryset(self):
-        image = get_object_or_404(Image, pk=self.kwargs['image_pk'])
-        queryset = TempLink.objects.filter(image=image)
+        queryset = TempLink.objects.filter(image=self.get_image())
+
+        # Optionally list only active or only expired links.
+        active = self.request.query_params.get('active')
+        if active is not None:
+            active = BooleanField().to_internal_value(active)
+            lookup = 'expires_at__gt' if active else 'expires_at__lte'
+            queryset = queryset.filter(**{lookup: timezone.now()})
         return queryset
     
 
-class TemporaryImageView(APIView):
+class TempLinkBulkCreateView(CreateAPIView):
     """
-    Used for temporary links handling. Verifies that link has not expired
-    or removes expired one. Returns an image as binary content.
+    Creates temporary links to many images of the user at once.
+    Lists created links in order of given images.
     """
 
-    permission_classes = (permissions.AllowAny,)
+    serializer_class = TempLinkBulkSerializer
+    permission_classes = (
+        permissions.IsAuthenticated,
+        custom_permissions.CanCreateTempLinks
+    )
 
-    def get(self, request, token, format=None):
-        # Try to find TempLink associated with given URL token.
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        templinks = serializer.save()
+        return Response(
+            serializer.to_representation(templinks),
+            status=status.HTTP_201_CREATED
+        )
+
+
+class TemporaryImageMixin:
+    """
+    Parts of serving an original by temporary link shared by sync
+    and async views.
+    """
+
+    def get_validators(self, image):
+        """
+        Returns ETag and Last-Modified timestamp of the original,
+        None if unknown.
+        """
+        original = image.image
+
+        # Stored originals never change, so checksum of the content
+        # is a strong validator.
+        etag = quote_etag(image.checksum) if image.checksum else None
         try:
-            templink = TempLink.objects.get(token=token)
+            last_modified = int(original.storage.get_modified_time(
+                original.name
+            ).timestamp())
+        except NotImplementedError:
+            last_modified = None
+        return etag, last_modified
+
+    def set_validators(self, response, etag, last_modified):
+        if etag is not None:
+            response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_content_type(self, image):
+        content_type, _ = mimetypes.guess_type(image.image.name)
+        return content_type or 'application/octet-stream'
+
+    def get_accel_response(self, image):
+        """
+        Returns response handing transfer of the original over, so that
+        the worker is released right away instead of streaming it to
+        slow clients. Originals kept on local disk are sent by nginx
+        with X-Accel-Redirect, those in object storage supporting signed
+        URLs are downloaded from it directly. Both handle Range header
+        themselves. Returns None if X-Accel-Redirect is not configured
+        or storage can do neither, so the app streams the original.
+        """
+        prefix = settings.TEMPLINK_ACCEL_REDIRECT_PREFIX
+        if not prefix:
+            return None
+
+        # Nginx location serves files of local storage only.
+        storage = image.image.storage
+        if isinstance(storage, FileSystemStorage):
+            response = HttpResponse(content_type=self.get_content_type(image))
+            response['X-Accel-Redirect'] = prefix + quote(image.image.name)
+            return response
+
+        if getattr(storage, 'querystring_auth', False):
+            return HttpResponseRedirect(storage.url(
+                image.image.name,
+                expire=settings.TEMPLINK_SIGNED_URL_LIFETIME
+            ))
+        return None
+
+    def get_cached_image(self, link):
+        """
+        Returns unsaved image of cached link, which is enough to serve
+        the original.
+        """
+        return Image(image=link.name, checksum=link.checksum, size=link.size)
+
+    def check_uncached_token(self, token):
+        """
+        Looks up token which is not cached. Returns (image, None) if it
+        is valid, (None, error status) otherwise. Hits the database, so
+        async view runs it in a thread.
+        """
+        if is_signed_token(token):
+            return self.check_signed_token(token)
+        return self.check_token(token)
+
+    def check_token(self, token):
+        """
+        Looks random token up. Returns (image, None) if it is valid,
+        (None, error status) otherwise.
+        """
+        # Try to find TempLink associated with given URL token. Check
+        # revocation in the same query, as a filter lookup would only
+        # add round trips.
+        queryset = TempLink.objects.select_related('image', 'owner').annotate(
+            revoked=Exists(
+                TempLinkTokenBlacklist.objects.filter(token=OuterRef('token'))
+            )
+        )
+        try:
+            templink = queryset.get(token=token)
         except TempLink.DoesNotExist:
-            return Response(status=status.HTTP_404_NOT_FOUND)
-        
+            return None, status.HTTP_404_NOT_FOUND
+
+        if templink.revoked:
+            return None, status.HTTP_410_GONE
+
         # If token has expired, blacklist it and return.
         if templink.has_expired():
-            TempLinkTokenBlacklist.objects.create(token=token)
+            TempLinkTokenBlacklist.objects.create(
+                token=token,
+                expires_at=templink.expires_at
+            )
             templink.delete()
-            return Response(status=status.HTTP_410_GONE)
-        
-        # Return image as binary content.
-        filename = templink.image.image.path
-        return FileResponse(open(filename, 'rb'))
+            return None, status.HTTP_410_GONE
+
+        cache_link(
+            token,
+            templink.image,
+            templink.expiration_date(),
+            templink.owner.account_tier_id
+        )
+        return templink.image, None
+
+    def check_signed_token(self, token):
+        """
+        Verifies signed token. Returns (image, None) if it is valid,
+        (None, error status) otherwise. Signature and expiry are
+        checked without the database, existence of the link along
+        with the image lookup.
+        """
+        claims = parse_signed_token(token)
+        if claims is None:
+            return None, status.HTTP_404_NOT_FOUND
+
+        image_pk, expiration_date = claims
+        if timezone.now() >= expiration_date:
+            return None, status.HTTP_410_GONE
+
+        # Check that the link was not deleted and its revocation along
+        # with the image lookup.
+        queryset = Image.objects.select_related('owner').filter(
+            pk=image_pk
+        ).annotate(
+            linked=Exists(TempLink.objects.filter(token=token)),
+            revoked=Exists(TempLinkTokenBlacklist.objects.filter(token=token))
+        )
+        image = queryset.first()
+        if image is None or not image.linked:
+            return None, status.HTTP_404_NOT_FOUND
+        if image.revoked:
+            return None, status.HTTP_410_GONE
+
+        cache_link(token, image, expiration_date, image.owner.account_tier_id)
+        return image, None
+
+
+class TemporaryImageView(TemporaryImageMixin, APIView):
+    """
+    Used for temporary links handling. Verifies that link has not expired
+    or removes expired one. Returns an image as binary content.
+    Supports conditional and byte range requests. Rate limited per link
+    and per client, without authentication, so that requests over the
+    limit never reach the database.
+    """
+
+    authentication_classes = ()
+    permission_classes = (permissions.AllowAny,)
+    throttle_classes = (TempLinkRateThrottle,)
+
+    def get(self, request, token, format=None):
+        image, error_status = self.resolve_token(token)
+        if error_status is not None:
+            return Response(status=error_status)
+
+        etag, last_modified = self.get_validators(image)
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified
+        )
+        if response is None:
+            response = self.get_file_response(
+                request,
+                image,
+                etag,
+                last_modified
+            )
+        return self.set_validators(response, etag, last_modified)
+
+    def resolve_token(self, token):
+        """
+        Returns (image, None) if token leads to an image, (None, error
+        status) otherwise. Valid links are cached until they expire.
+        """
+        link = get_cached_link(token)
+        if link is not None:
+            return self.get_cached_image(link), None
+        return self.check_uncached_token(token)
+
+    def get_file_response(self, request, image, etag, last_modified):
+        """
+        Returns response sending the original, or byte ranges of it
+        requested by Range header.
+        """
+        response = self.get_accel_response(image)
+        if response is not None:
+            return response
+
+        # Stream image from storage as binary content, e.g. when
+        # running development server without nginx.
+        original = image.image
+        content_type = self.get_content_type(image)
+        storage = original.storage
+        file_ = storage.open(original.name)
+        ranges = None
+        if range_applies(request, etag, last_modified):
+            size = image.size or storage.size(original.name)
+            ranges = parse_ranges(request.headers.get('Range'), size)
+
+        if ranges is None:
+            response = FileResponse(file_, content_type=content_type)
+        else:
+            response = ranged_file_response(file_, size, ranges, content_type)
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+
+class AsyncTemporaryImageView(TemporaryImageMixin, View):
+    """
+    Async version of TemporaryImageView, meant for ASGI workers. Looks
+    cached tokens up without blocking, runs the shared token checks in
+    a thread otherwise and streams originals with reads done in threads,
+    so that a single worker can serve many slow downloads at once.
+    Responds the same way as the sync view.
+    """
+
+    async def get(self, request, token):
+        throttle = TempLinkRateThrottle()
+        if not await sync_to_async(throttle.allow_request)(request, self):
+            wait = throttle.wait()
+            response = JsonResponse(
+                {'detail': exceptions.Throttled(wait).detail},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            response['Retry-After'] = str(ceil(wait))
+            return response
+
+        image, error_status = await self.resolve_token(token)
+        if error_status is not None:
+            return HttpResponse(status=error_status)
+
+        etag, last_modified = await sync_to_async(
+            self.get_validators,
+            thread_sensitive=False
+        )(image)
+        response = get_conditional_response(
+            request,
+            etag=etag,
+            last_modified=last_modified
+        )
+        if response is None:
+            response = await self.get_file_response(
+                request,
+                image,
+                etag,
+                last_modified
+            )
+        return self.set_validators(response, etag, last_modified)
+
+    async def resolve_token(self, token):
+        """
+        Returns (image, None) if token leads to an image, (None, error
+        status) otherwise. Valid links are cached until they expire.
+        """
+        link = await aget_cached_link(token)
+        if link is not None:
+            return self.get_cached_image(link), None
+        return await sync_to_async(self.check_uncached_token)(token)
+
+    async def get_file_response(self, request, image, etag, last_modified):
+        """
+        Returns response sending the original, or byte ranges of it
+        requested by Range header, read without blocking the event loop.
+        """
+        response = self.get_accel_response(image)
+        if response is not None:
+            return response
+
+        original = image.image
+        content_type = self.get_content_type(image)
+        storage = original.storage
+        file_ = await sync_to_async(storage.open, thread_sensitive=False)(
+            original.name
+        )
+        size = image.size or await sync_to_async(
+            storage.size,
+            thread_sensitive=False
+        )(original.name)
 
+        ranges = None
+        if range_applies(request, etag, last_modified):
+            ranges = parse_ranges(request.headers.get('Range'), size)
 
-        
\ No newline at end of file
+        if ranges is None:
+            response = async_file_response(file_, size, content_type)
+        else:
+            response = ranged_file_response(
+                file_,
+                size,
+                ranges,
+                content_type,
+                asynchronous=True
+            )
+        response['Accept-Ranges'] = 'bytes'
+        return response
@@ -0,0 +1,34 @@
+from django.core.management import BaseCommand
+from api.models import AccountTier
+from imaginarium.tasks import backfill_thumbnails
+
+
+class Command(BaseCommand):
+    """
+    Queues rendering of missing thumbnails. Can resume an interrupted
+    backfill from the last processed image pk.
+    """
+
+    help = 'Queues rendering of missing thumbnails.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tier', help='Account tier name.')
+        parser.add_argument('--user', type=int, help='User pk.')
+        parser.add_argument(
+            '--after',
+            type=int,
+            default=0,
+            help='Resume after image with this pk.'
+        )
+
+    def handle(self, *args, **kwargs):
+        tier_pk = None
+        if kwargs['tier']:
+            tier_pk = AccountTier.objects.get(name=kwargs['tier']).pk
+
+        result = backfill_thumbnails.delay(
+            tier_pk=tier_pk,
+            user_pk=kwargs['user'],
+            after_pk=kwargs['after']
+        )
+        self.stdout.write(f'Thumbnail backfill queued (task {result.id}).')
@@ -0,0 +1,150 @@
+from datetime import timedelta
+from random import choice, randrange
+from secrets import token_urlsafe
+from time import perf_counter
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+from api.blacklist import (
+    BATCH_SIZE,
+    add_to_filters,
+    build_filters,
+    get_filter_parameters,
+    get_filter_store,
+    get_partition_start,
+    get_retained_partitions,
+    is_blacklisted,
+)
+from api.models import TempLinkTokenBlacklist
+from api.utils import generate_token
+
+# Synthetic entries are told apart by this prefix.
+TOKEN_PREFIX = 'benchmark-'
+
+
+class Command(BaseCommand):
+    """
+    Measures cost of generating random templink tokens and of blacklist
+    lookups as the blacklist grows. Fills the blacklist with synthetic
+    entries spread over retained partitions, so it is meant to be run
+    against a scratch database. Filters are sized by
+    TEMPLINK_BLACKLIST_FILTER_CAPACITY, which should cover the measured
+    sizes spread over retained partitions.
+    """
+
+    help = 'Benchmarks templink token blacklist.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[10_000, 100_000, 1_000_000],
+            help='Blacklist sizes at which costs are measured.'
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=1000,
+            help='Number of measured operations per size.'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Keep synthetic entries after the benchmark.'
+        )
+
+    def handle(self, *args, **kwargs):
+        partitions = get_retained_partitions()
+        store = get_filter_store()
+        if store is None:
+            self.stdout.write('Blacklist filters are disabled.')
+        else:
+            # Build filters up front, as maintain_templink_blacklist task
+            # does, so that lookups are answered by them. Synthetic entries
+            # are added to built filters as they are created.
+            build_filters(partitions)
+            if not all(store.is_ready(partitions)):
+                raise CommandError('Blacklist filters could not be built.')
+
+            size, hashes = get_filter_parameters()
+            capacity = settings.TEMPLINK_BLACKLIST_FILTER_CAPACITY
+            self.stdout.write(
+                f'{type(store).__name__}: {size} bits, {hashes} hashes '
+                f'per partition, sized for {capacity} tokens each.'
+            )
+
+        self.stdout.write(
+            f'{"entries":>12} {"generate":>12} {"absent":>12} '
+            f'{"blacklisted":>12}   (microseconds per operation)'
+        )
+        stored = TempLinkTokenBlacklist.objects.count()
+        tokens = list(
+            TempLinkTokenBlacklist.objects.values_list('token', flat=True)[:100]
+        )
+        try:
+            for size in sorted(kwargs['sizes']):
+                if size > stored:
+                    tokens = self.fill(size - stored, partitions)
+                    stored = size
+
+                samples = kwargs['samples']
+                generate = measure(generate_token, samples)
+                absent = measure(
+                    lambda: is_blacklisted(token_urlsafe(32), partitions),
+                    samples
+                )
+                blacklisted = measure(
+                    lambda: is_blacklisted(choice(tokens), partitions),
+                    samples
+                ) if tokens else float('nan')
+                self.stdout.write(
+                    f'{stored:>12} {generate:>12.1f} {absent:>12.1f} '
+                    f'{blacklisted:>12.1f}'
+                )
+        finally:
+            if not kwargs['keep']:
+                self.clear()
+
+    def fill(self, count, partitions):
+        """
+        Blacklists given number of synthetic tokens. Returns a sample
+        of them.
+        """
+        sample = []
+        while count > 0:
+            entries = [
+                TempLinkTokenBlacklist(
+                    token=TOKEN_PREFIX + token_urlsafe(24),
+                    expires_at=get_partition_start(choice(partitions))
+                    + timedelta(seconds=randrange(60 * 60 * 24))
+                )
+                for _ in range(min(count, BATCH_SIZE))
+            ]
+            TempLinkTokenBlacklist.objects.bulk_create(entries)
+            add_to_filters(
+                (entry.token, entry.expires_at) for entry in entries
+            )
+            sample = [entry.token for entry in entries[:100]]
+            count -= len(entries)
+        return sample
+
+    def clear(self):
+        """
+        Removes synthetic entries. Their filter bits stay until their
+        partitions are dropped.
+        """
+        synthetic = TempLinkTokenBlacklist.objects.filter(
+            token__startswith=TOKEN_PREFIX
+        )
+        while pks := list(synthetic.values_list('pk', flat=True)[:BATCH_SIZE]):
+            TempLinkTokenBlacklist.objects.filter(pk__in=pks).delete()
+
+
+def measure(operation, samples):
+    """
+    Returns average time of operation in microseconds.
+    """
+    start = perf_counter()
+    for _ in range(samples):
+        operation()
+    return (perf_counter() - start) / samples * 1_000_000
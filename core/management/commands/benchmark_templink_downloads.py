@@ -0,0 +1,185 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from os import urandom
+from statistics import mean
+from threading import active_count
+from time import perf_counter, sleep
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import BaseCommand
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+from django.urls import reverse
+from PIL import Image as PILImage
+from api.models import User, Image, TempLink
+from api.streaming import AsyncStreamingASGIHandler
+from api.utils import compute_checksum, generate_token
+from api.views import AsyncTemporaryImageView, TemporaryImageView
+
+# Name of the user owning the synthetic image.
+USERNAME = 'benchmark-templink-downloads'
+
+
+class Command(BaseCommand):
+    """
+    Compares sync and async temporary link views serving concurrent
+    downloads to slow clients. Sync view is run by a fixed number of
+    workers, like gunicorn sync workers, each busy until its client has
+    read the whole file. Async view is run on a single event loop, like
+    one ASGI worker. Creates a synthetic user, image and link, removed
+    afterwards, so it is meant to be run against a scratch database.
+    Files are streamed by the app, as if X-Accel-Redirect was not set.
+    """
+
+    help = 'Benchmarks sync and async templink downloads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--downloads',
+            type=int,
+            default=100,
+            help='Number of concurrent downloads.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Number of sync workers.'
+        )
+        parser.add_argument(
+            '--client-rate',
+            type=int,
+            default=1024 * 1024,
+            help='Bytes per second read by each client.'
+        )
+        parser.add_argument(
+            '--image-size',
+            type=int,
+            default=512,
+            help='Width and height of the image, in pixels.'
+        )
+
+    def handle(self, *args, **kwargs):
+        templink = self.create_templink(kwargs['image_size'])
+        try:
+            with override_settings(TEMPLINK_ACCEL_REDIRECT_PREFIX=None):
+                self.run(templink, kwargs)
+        finally:
+            templink.image.image.delete(save=False)
+            templink.owner.delete()
+
+    def run(self, templink, options):
+        downloads = options['downloads']
+        rate = options['client_rate']
+        path = reverse(
+            'temporary-image-view',
+            kwargs={'token': templink.token}
+        )
+        self.stdout.write(
+            f'{downloads} downloads of {templink.image.size} bytes '
+            f'at {rate} bytes/s per client.'
+        )
+        self.stdout.write(
+            f'{"path":>8} {"total":>10} {"latency":>10} {"max":>10} '
+            f'{"threads":>8}   (seconds)'
+        )
+
+        results = [
+            ('sync', self.run_sync(
+                path, templink.token, downloads, options['workers'], rate
+            )),
+            ('async', self.run_async(
+                path, templink.token, downloads, rate
+            )),
+        ]
+        for name, (total, latencies, threads) in results:
+            self.stdout.write(
+                f'{name:>8} {total:>10.3f} {mean(latencies):>10.3f} '
+                f'{max(latencies):>10.3f} {threads:>8}'
+            )
+
+    def create_templink(self, image_size):
+        """
+        Creates user without account tier, so that downloads are not
+        rate limited, owning an image of noise and a link to it.
+        """
+        user = User.objects.create_user(username=USERNAME)
+        noise = PILImage.frombytes(
+            'RGB',
+            (image_size, image_size),
+            urandom(image_size * image_size * 3)
+        )
+        content = BytesIO()
+        noise.save(content, 'JPEG', quality=95)
+        file_ = SimpleUploadedFile('benchmark.jpg', content.getvalue())
+        image = Image.objects.create(
+            image=file_,
+            owner=user,
+            size=file_.size,
+            checksum=compute_checksum(file_)
+        )
+        return TempLink.objects.create(
+            token=generate_token(),
+            image=image,
+            owner=user,
+            expires_in=3600
+        )
+
+    def run_sync(self, path, token, downloads, workers, rate):
+        """
+        Returns total time, latencies of downloads and peak number
+        of threads.
+        """
+        view = TemporaryImageView.as_view()
+        factory = RequestFactory()
+        # Caches the link, so that workers do not touch the database.
+        view(factory.get(path), token=token).close()
+
+        threads = active_count()
+        start = perf_counter()
+
+        def download():
+            nonlocal threads
+            response = view(factory.get(path), token=token)
+            for chunk in response:
+                sleep(len(chunk) / rate)
+            response.close()
+            threads = max(threads, active_count())
+            return perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            latencies = list(executor.map(
+                lambda _: download(),
+                range(downloads)
+            ))
+        return perf_counter() - start, latencies, threads
+
+    def run_async(self, path, token, downloads, rate):
+        """
+        Returns total time, latencies of downloads and peak number
+        of threads.
+        """
+        view = AsyncTemporaryImageView.as_view()
+        factory = AsyncRequestFactory()
+        handler = AsyncStreamingASGIHandler()
+        threads = active_count()
+
+        async def send(message):
+            nonlocal threads
+            await asyncio.sleep(len(message.get('body', b'')) / rate)
+            threads = max(threads, active_count())
+
+        async def download(start):
+            response = await view(factory.get(path), token=token)
+            await handler.send_response(response, send)
+            return perf_counter() - start
+
+        async def download_all():
+            await download(perf_counter())
+            start = perf_counter()
+            latencies = await asyncio.gather(*(
+                download(start) for _ in range(downloads)
+            ))
+            return perf_counter() - start, latencies
+
+        total, latencies = asyncio.run(download_all())
+        return total, latencies, threads
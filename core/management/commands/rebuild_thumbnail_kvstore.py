@@ -0,0 +1,215 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from django.core.management import BaseCommand
+from PIL import Image as PILImage
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.helpers import serialize
+from sorl.thumbnail.images import ImageFile, serialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from api.models import Image, ThumbnailSize
+from api.thumbnails import get_thumbnail_files
+from imaginarium.tasks import rebuild_thumbnail_kvstore
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds sorl thumbnail key value store from thumbnail files
+    which exist in storage, e.g. after Redis lost its data.
+    With --verify, rebuilds only if a sample of recent images
+    has thumbnails in storage that are missing from the store.
+    With --background, queues the rebuild as a Celery task, so that
+    it does not hold up the caller, e.g. web server start.
+    """
+
+    help = 'Rebuilds thumbnail key value store from storage.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Rebuild only if sampled entries are missing.'
+        )
+        parser.add_argument(
+            '--background',
+            action='store_true',
+            help='Queue the rebuild as a Celery task and return.'
+        )
+        parser.add_argument(
+            '--sample',
+            type=int,
+            default=20,
+            help='Number of recent images checked by --verify.'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Number of threads scanning storage.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of images written to the store at once.'
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs['background']:
+            rebuild_thumbnail_kvstore.delay(
+                verify=kwargs['verify'],
+                sample=kwargs['sample']
+            )
+            self.stdout.write('Thumbnail KV store rebuild queued.')
+            return
+
+        sizes = list(ThumbnailSize.objects.all())
+
+        if kwargs['verify']:
+            if self.is_intact(sizes, kwargs['sample']):
+                self.stdout.write('Thumbnail KV store is intact.')
+                return
+            self.stdout.write('Thumbnail KV store is missing entries.')
+
+        self.stdout.write('Rebuilding thumbnail KV store...')
+        with ThreadPoolExecutor(max_workers=kwargs['workers']) as executor:
+            existing = self.scan(executor)
+            self.stdout.write(f'Found {len(existing)} thumbnail files.')
+
+            # One image per stored file - duplicates share thumbnails.
+            names = (
+                Image.objects.order_by('image')
+                .values_list('image', 'width', 'height')
+                .distinct()
+                .iterator()
+            )
+            restored = 0
+            while batch := list(islice(names, kwargs['batch_size'])):
+                restored += self.restore(executor, batch, sizes, existing)
+
+        self.stdout.write(f'Restored {restored} thumbnails.')
+
+    def is_intact(self, sizes, sample):
+        """
+        Checks that thumbnails of recent images which exist in storage
+        are known to the key value store.
+        """
+        for image in Image.objects.order_by('-pk')[:sample]:
+            for thumbnail in get_thumbnail_files(image, sizes):
+                if (default.kvstore.get(thumbnail) is None
+                        and thumbnail.exists()):
+                    return False
+        return True
+
+    def scan(self, executor):
+        """
+        Returns names of all files in thumbnail cache directory.
+        Lists subdirectories in parallel.
+        """
+        storage = default.storage
+        prefix = settings.THUMBNAIL_PREFIX.rstrip('/')
+        if not storage.exists(prefix):
+            return set()
+
+        def list_files(directory):
+            directories, files = storage.listdir(directory)
+            names = {f'{directory}/{name}' for name in files}
+            for name in directories:
+                names |= list_files(f'{directory}/{name}')
+            return names
+
+        directories, files = storage.listdir(prefix)
+        names = {f'{prefix}/{name}' for name in files}
+        for listed in executor.map(
+            list_files,
+            (f'{prefix}/{name}' for name in directories)
+        ):
+            names |= listed
+        return names
+
+    def restore(self, executor, names, sizes, existing):
+        """
+        Writes store entries for thumbnails of given source files,
+        as (name, width, height), which exist in storage. Returns number
+        of restored thumbnails.
+        """
+        found = []
+        files = []
+        for name, width, height in names:
+            image = Image(image=name)
+            thumbnails = [
+                thumbnail
+                for thumbnail in get_thumbnail_files(image, sizes)
+                if thumbnail.name in existing
+            ]
+            if not thumbnails:
+                continue
+
+            source = ImageFile(image.image)
+            found.append((source, thumbnails))
+            # Dimensions of originals are stored at upload.
+            if width and height:
+                source.set_size((width, height))
+            else:
+                files.append(source)
+            files += thumbnails
+
+        # Read remaining dimensions from file headers.
+        unreadable = set()
+        for image_file, size in zip(files, executor.map(read_size, files)):
+            if size is None:
+                unreadable.add(image_file.name)
+            else:
+                image_file.set_size(size)
+
+        # Skip files which are gone or broken.
+        found = [
+            (source, [
+                thumbnail for thumbnail in thumbnails
+                if thumbnail.name not in unreadable
+            ])
+            for source, thumbnails in found
+            if source.name not in unreadable
+        ]
+
+        entries = {}
+        for source, thumbnails in found:
+            for image_file in (source, *thumbnails):
+                entries[add_prefix(image_file.key)] = (
+                    serialize_image_file(image_file)
+                )
+            entries[add_prefix(source.key, 'thumbnails')] = serialize(
+                [thumbnail.key for thumbnail in thumbnails]
+            )
+        write(entries)
+
+        return sum(len(thumbnails) for source, thumbnails in found)
+
+
+def read_size(image_file):
+    """
+    Returns image dimensions read from file header only,
+    None if file cannot be read.
+    """
+    try:
+        with image_file.storage.open(image_file.name) as file_:
+            return PILImage.open(file_).size
+    except OSError:
+        return None
+
+
+def write(entries):
+    """
+    Writes raw entries to the key value store. Pipelines writes
+    if the store is backed by Redis.
+    """
+    connection = getattr(default.kvstore, 'connection', None)
+    if connection is None:
+        for key, value in entries.items():
+            default.kvstore._set_raw(key, value)
+        return
+
+    pipeline = connection.pipeline(transaction=False)
+    for key, value in entries.items():
+        pipeline.set(key, value, ex=settings.THUMBNAIL_REDIS_TIMEOUT)
+    pipeline.execute()
@@ -1,3 +1,208 @@
-from django.test import TestCase
+from io import StringIO
+from os import path
+from shutil import rmtree
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from sorl.thumbnail import default
+from api.models import (
+    User,
+    AccountTier,
+    ThumbnailSize,
+    Image,
+    TempLinkTokenBlacklist,
+)
+from api.blacklist import (
+    MemoryFilterStore,
+    get_filter_store,
+    get_retained_partitions,
+    load_filter_store,
+)
+from api.thumbnails import render_thumbnails, get_cached_thumbnail
 
-# Create your tests here.
+# Temporary root for mediafiles created during testing.
+TEMP_DIR = 'temp'
+TEMP_MEDIA_ROOT = TEMP_DIR + '/media'
+TEMP_DBM_FILE = TEMP_DIR + '/thumbnail_kvstore'
+
+SAMPLE_JPG = path.join(
+    path.dirname(__file__), '..', 'api', 'tests', 'sample_jpg.jpg'
+)
+
+def tearDownModule():
+    """ Destroy temporary media root after all test ran. """
+    rmtree(TEMP_DIR, ignore_errors=True)
+
+
+@override_settings(
+    THUMBNAIL_KVSTORE='api.thumbnails.DBMKVStore',
+    THUMBNAIL_DBM_FILE=TEMP_DBM_FILE,
+    MEDIA_ROOT=TEMP_MEDIA_ROOT
+)
+class RebuildThumbnailKVStoreTestCase(TestCase):
+    """
+    Tests for rebuild_thumbnail_kvstore command.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='Marcin',
+            password='Tomato789',
+            account_tier=AccountTier.objects.get(name='Premium')
+        )
+        cls.sizes = list(ThumbnailSize.objects.all())
+
+    def setUp(self):
+        with open(SAMPLE_JPG, 'rb') as img:
+            self.image = Image.objects.create(
+                image=SimpleUploadedFile('sample_jpg.jpg', img.read()),
+                owner=self.user
+            )
+        render_thumbnails(self.image, self.sizes)
+        default.kvstore.clear()
+
+    def _call(self, *args):
+        """
+        Helper function. Runs the command and returns its output.
+        """
+        out = StringIO()
+        call_command('rebuild_thumbnail_kvstore', *args, stdout=out)
+        return out.getvalue()
+
+    def test_restores_thumbnails_from_storage(self):
+        """
+        Makes sure thumbnails existing in storage are known
+        to key value store after rebuild.
+        """
+
+        self.assertIsNone(get_cached_thumbnail(self.image, self.sizes[0]))
+        self._call()
+        for size in self.sizes:
+            thumbnail = get_cached_thumbnail(self.image, size)
+            self.assertIsNotNone(thumbnail)
+            self.assertEqual(thumbnail.height, size.height)
+
+    def test_verify_rebuilds_only_when_entries_are_missing(self):
+        """
+        Makes sure verify mode detects missing entries and
+        does nothing once the store is intact.
+        """
+
+        output = self._call('--verify')
+        self.assertIn('missing entries', output)
+        self.assertIsNotNone(get_cached_thumbnail(self.image, self.sizes[0]))
+
+        output = self._call('--verify')
+        self.assertIn('intact', output)
+
+    def test_restore_uses_stored_dimensions(self):
+        """
+        Makes sure originals with dimensions saved at upload are not
+        opened to read them.
+        """
+
+        Image.objects.filter(pk=self.image.pk).update(width=1, height=2)
+        path = 'core.management.commands.rebuild_thumbnail_kvstore.read_size'
+        with mock.patch(path, return_value=(1, 1)) as read_size:
+            self._call()
+
+        read_names = [call.args[0].name for call in read_size.call_args_list]
+        self.assertNotIn(self.image.image.name, read_names)
+        self.assertTrue(read_names)
+        self.assertIsNotNone(get_cached_thumbnail(self.image, self.sizes[0]))
+
+    @mock.patch(
+        'core.management.commands.rebuild_thumbnail_kvstore'
+        '.rebuild_thumbnail_kvstore'
+    )
+    def test_background_queues_rebuild(self, task):
+        """
+        Makes sure background mode leaves the rebuild to a Celery task.
+        """
+
+        output = self._call('--verify', '--background')
+        self.assertIn('queued', output)
+        task.delay.assert_called_once_with(verify=True, sample=20)
+        self.assertIsNone(get_cached_thumbnail(self.image, self.sizes[0]))
+
+
+@override_settings(
+    TEMPLINK_BLACKLIST_FILTER_STORE='api.blacklist.MemoryFilterStore',
+    TEMPLINK_BLACKLIST_FILTER_CAPACITY=1000
+)
+class BenchmarkTempLinkBlacklistTestCase(TestCase):
+    """
+    Tests for benchmark_templink_blacklist command.
+    """
+
+    def setUp(self):
+        load_filter_store.cache_clear()
+        self.addCleanup(load_filter_store.cache_clear)
+
+    def test_reports_costs_and_removes_synthetic_entries(self):
+        """
+        Makes sure costs are reported for each size and blacklist
+        is left as it was.
+        """
+
+        TempLinkTokenBlacklist.objects.create(token='revoked')
+        out = StringIO()
+        call_command(
+            'benchmark_templink_blacklist',
+            '--sizes', '10', '20',
+            '--samples', '5',
+            stdout=out
+        )
+
+        rows = out.getvalue().splitlines()[2:]
+        self.assertEqual([row.split()[0] for row in rows], ['10', '20'])
+        self.assertEqual(
+            list(TempLinkTokenBlacklist.objects.values_list('token', flat=True)),
+            ['revoked']
+        )
+
+    @mock.patch.object(MemoryFilterStore, 'builds_on_demand', False)
+    def test_builds_filters_before_measuring(self):
+        """
+        Makes sure lookups are measured with filters, also for stores
+        which do not build them on demand.
+        """
+
+        call_command(
+            'benchmark_templink_blacklist',
+            '--sizes', '10',
+            '--samples', '5',
+            stdout=StringIO()
+        )
+
+        store = get_filter_store()
+        self.assertTrue(all(store.is_ready(get_retained_partitions())))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTempLinkDownloadsTestCase(TestCase):
+    """
+    Tests for benchmark_templink_downloads command.
+    """
+
+    def test_reports_both_paths_and_removes_synthetic_data(self):
+        """
+        Makes sure both paths are measured and synthetic user is removed.
+        """
+
+        out = StringIO()
+        call_command(
+            'benchmark_templink_downloads',
+            '--downloads', '3',
+            '--workers', '1',
+            '--client-rate', str(100 * 1024 * 1024),
+            '--image-size', '16',
+            stdout=out
+        )
+
+        rows = out.getvalue().splitlines()[2:]
+        self.assertEqual([row.split()[0] for row in rows], ['sync', 'async'])
+        self.assertFalse(User.objects.exists())
+        self.assertFalse(Image.objects.exists())
@@ -2,6 +2,8 @@
 ASGI config for imaginarium project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Responses streamed asynchronously, e.g. by AsyncTemporaryImageView, are sent
+without blocking the event loop.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
@@ -9,8 +11,12 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'imaginarium.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+from api.streaming import AsyncStreamingASGIHandler  # noqa: E402
+
+application = AsyncStreamingASGIHandler()
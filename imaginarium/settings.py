@@ -100,6 +100,24 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# Cache is shared by web and Celery nodes through Redis. Without Redis
+# URL, e.g. in tests, each process caches in its own memory.
+REDIS_CACHE_URL = os.environ.get('REDIS_CACHE_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if REDIS_CACHE_URL:
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_CACHE_URL,
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -142,6 +160,103 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'mediafiles'
 
+# Media files are kept in MEDIA_ROOT, or in S3-compatible object
+# storage (e.g. MinIO) if a bucket is given. Files are always accessed
+# through storage API, so web and Celery nodes can share the bucket.
+DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+AWS_STORAGE_BUCKET_NAME = os.environ.get('AWS_STORAGE_BUCKET_NAME')
+if AWS_STORAGE_BUCKET_NAME:
+    DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
+    AWS_S3_ENDPOINT_URL = os.environ.get('AWS_S3_ENDPOINT_URL')
+    AWS_S3_REGION_NAME = os.environ.get('AWS_S3_REGION_NAME')
+    AWS_ACCESS_KEY_ID = os.environ.get('AWS_ACCESS_KEY_ID')
+    AWS_SECRET_ACCESS_KEY = os.environ.get('AWS_SECRET_ACCESS_KEY')
+    AWS_DEFAULT_ACL = None
+    AWS_S3_FILE_OVERWRITE = False
+    # Spool files read from the bucket to disk above that size.
+    AWS_S3_MAX_MEMORY_SIZE = 2 * 1024 * 1024
+
+# Compute checksums of uploaded files while they stream in.
+FILE_UPLOAD_HANDLERS = [
+    'api.uploadhandlers.ChecksumMemoryFileUploadHandler',
+    'api.uploadhandlers.ChecksumTemporaryFileUploadHandler',
+]
+
+# Issue temporary links with signed tokens, which are verified without
+# database lookups. Links issued before keep working either way.
+TEMPLINK_SIGNED_TOKENS = bool(int(os.environ.get('TEMPLINK_SIGNED_TOKENS', 0)))
+
+# Valid temporary links are cached until they expire, and for a few
+# seconds in memory of each process to absorb bursts.
+TEMPLINK_LOCAL_CACHE_SIZE = 1024
+TEMPLINK_LOCAL_CACHE_TIMEOUT = 5
+
+# Number of expired temporary links removed in one transaction.
+TEMPLINK_CLEANUP_BATCH_SIZE = 1000
+
+# Blacklisted tokens are partitioned by day of expiration and kept for
+# that many days after they would expire anyway.
+TEMPLINK_BLACKLIST_RETENTION_DAYS = 7
+
+# Bloom filters telling tokens which are definitely not blacklisted,
+# one per partition, sparing blacklist lookups of new random tokens.
+# Store is kept in Redis, or in process memory with
+# 'api.blacklist.MemoryFilterStore' (single process only). None
+# disables filters. Capacity is the number of tokens per partition,
+# each taking about 1.2 bytes per token at 1% error rate. Default
+# capacity keeps filters effective for about 90 million blacklisted
+# tokens over 9 retained partitions, taking 12 MB per partition.
+# Building filters warns about partitions over capacity.
+TEMPLINK_BLACKLIST_FILTER_STORE = (
+    'api.blacklist.RedisFilterStore' if REDIS_CACHE_URL else None
+)
+TEMPLINK_BLACKLIST_FILTER_CAPACITY = int(
+    os.environ.get('TEMPLINK_BLACKLIST_FILTER_CAPACITY', 10_000_000)
+)
+TEMPLINK_BLACKLIST_FILTER_ERROR_RATE = 0.01
+
+# Requests to temporary links are limited with token buckets, kept in
+# Redis or in memory of each process. Limits are set on account tiers,
+# this one applies to clients requesting links which are not cached.
+TEMPLINK_RATE_LIMIT_STORE = (
+    'api.throttling.RedisBucketStore' if REDIS_CACHE_URL
+    else 'api.throttling.MemoryBucketStore'
+)
+TEMPLINK_DEFAULT_CLIENT_RATE_LIMIT = '60/min'
+
+# Internal nginx location serving media files. If set, temporary links
+# hand file transfer over to nginx with X-Accel-Redirect header.
+TEMPLINK_ACCEL_REDIRECT_PREFIX = os.environ.get('TEMPLINK_ACCEL_REDIRECT_PREFIX')
+
+# With X-Accel-Redirect configured, originals kept in object storage are
+# redirected to signed bucket URLs valid for that many seconds instead.
+TEMPLINK_SIGNED_URL_LIFETIME = 60
+
+# Serve temporary links with async view, for deployments running ASGI
+# workers (imaginarium.asgi), which then hold many downloads at once.
+TEMPLINK_ASYNC_DOWNLOADS = bool(int(os.environ.get('TEMPLINK_ASYNC_DOWNLOADS', 0)))
+
+# Account tiers and their thumbnail sizes are cached in memory of each
+# process. Changes are broadcast over Redis, if configured, so entries
+# are kept this many seconds at most only in case a broadcast is lost.
+ACCOUNT_TIER_CACHE_TIMEOUT = 60
+
+# Maximum number of images linked in one bulk templink request.
+TEMPLINK_BULK_MAX_IMAGES = 1000
+
+# Maximum number of images uploaded in one bulk upload request.
+IMAGE_BULK_UPLOAD_MAX_FILES = 100
+
+# Seconds after which not continued resumable uploads are removed.
+UPLOAD_SESSION_LIFETIME = 60 * 60 * 24
+
+# Normalization of uploaded originals. Metadata is stripped once it
+# takes more bytes than that. Originals larger than max dimension
+# are downscaled, None keeps them intact. Quality of re-encoded JPEGs.
+IMAGE_METADATA_MAX_SIZE = 64 * 1024
+IMAGE_MAX_DIMENSION = None
+IMAGE_NORMALIZE_QUALITY = 90
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.1/ref/settings/#default-auto-field
 
@@ -151,11 +266,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Django Rest Framework settings.
 
+# Lists are paginated with cursors. Clients may ask for larger pages,
+# up to API_MAX_PAGE_SIZE items.
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+
 REST_FRAMEWORK = {
     'UPLOADED_FILES_USE_URL': True,
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated'
     ],
+    # Number of proxies in front of the app, e.g. 1 behind nginx.
+    # Client IPs used by throttling are taken from X-Forwarded-For.
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 0)),
 }
 
 
@@ -166,15 +289,44 @@ CELERY_RESULT_BACKEND = "redis://redis:6379/0"
 CELERY_IMPORTS = ('imaginarium.tasks')
 CELERY_TIMEZONE = 'Europe/Warsaw'
 CELERY_BEAT_SCHEDULE = {
-    # Run this task daily at 3 AM.
+    # Run this task every 5 minutes.
     'remove-expired-templinks': {
         'task': 'imaginarium.tasks.remove_expired_templink_tokens',
-        'schedule': crontab(minute=0, hour=3), 
+        'schedule': crontab(minute='*/5'),
+    },
+    # Run this task every 5 minutes.
+    'maintain-templink-blacklist': {
+        'task': 'imaginarium.tasks.maintain_templink_blacklist',
+        'schedule': crontab(minute='*/5'),
+    },
+    # Run this task every hour.
+    'remove-stale-upload-sessions': {
+        'task': 'imaginarium.tasks.remove_stale_upload_sessions',
+        'schedule': crontab(minute=30),
     },
 }
 
 
 # Sorl thumbnail settings.
 
-THUMBNAIL_KVSTORE = 'sorl.thumbnail.kvstores.redis_kvstore.KVStore'
+THUMBNAIL_BACKEND = 'api.thumbnails.ThumbnailBackend'
+THUMBNAIL_ENGINE = 'api.thumbnails.Engine'
+THUMBNAIL_KVSTORE = 'api.thumbnails.RedisKVStore'
 THUMBNAIL_REDIS_URL = 'redis://redis:6379/1'
+THUMBNAIL_STORAGE = DEFAULT_FILE_STORAGE
+
+# Formats rendered next to default JPEG thumbnails, served to clients
+# which accept them, in order of preference. Formats Pillow cannot
+# save are skipped.
+
+THUMBNAIL_ALTERNATIVE_FORMATS = ('AVIF', 'WEBP')
+
+# How long (in seconds) clients may cache served thumbnails.
+
+THUMBNAIL_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Thumbnail backfill settings - images per batch
+# and delay (in seconds) between batches.
+
+THUMBNAIL_BACKFILL_BATCH_SIZE = 100
+THUMBNAIL_BACKFILL_INTERVAL = 5
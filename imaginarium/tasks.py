@@ -1,5 +1,18 @@
-from celery import shared_task
-from api.models import TempLink, TempLinkTokenBlacklist
+from datetime import timedelta
+from celery import shared_task, chord
+from django.conf import settings
+from django.core.management import call_command
+from django.db import transaction
+from django.utils import timezone
+from api.blacklist import (
+    add_to_filters,
+    build_filters,
+    drop_partitions,
+    get_retained_partitions,
+)
+from api.models import Image, TempLink, TempLinkTokenBlacklist, UploadSession
+from api.thumbnails import render_thumbnails
+from api.tier_cache import get_account_tier
 from celery.utils.log import get_task_logger
 
 
@@ -8,14 +21,144 @@ logger = get_task_logger(__name__)
 @shared_task
 def remove_expired_templink_tokens():
     """
-    Periodically scans the db and removes expired temporary link tokens.
+    Periodically blacklists tokens of expired temporary links and removes
+    the links, TEMPLINK_CLEANUP_BATCH_SIZE at a time.
     """
+    now = timezone.now()
     removed = 0
-    for templink in TempLink.objects.all():
-        if templink.has_expired():
-            token = templink.token
-            TempLinkTokenBlacklist.objects.create(token=token)
-            templink.delete()
-            removed += 1
+    while True:
+        with transaction.atomic():
+            expired = list(
+                TempLink.objects.filter(expires_at__lte=now)
+                .order_by('expires_at')
+                .values_list('pk', 'token', 'expires_at')
+                [:settings.TEMPLINK_CLEANUP_BATCH_SIZE]
+            )
+            if not expired:
+                break
+
+            pks, tokens, expiration_dates = zip(*expired)
+            # Some tokens could be blacklisted when links were accessed.
+            TempLinkTokenBlacklist.objects.bulk_create(
+                [
+                    TempLinkTokenBlacklist(token=token, expires_at=expires_at)
+                    for token, expires_at in zip(tokens, expiration_dates)
+                ],
+                ignore_conflicts=True
+            )
+            add_to_filters(zip(tokens, expiration_dates))
+            TempLink.objects.filter(pk__in=pks).delete()
+        removed += len(pks)
 
     logger.info(f'Removed {removed} expired temp links.')
+
+
+@shared_task
+def maintain_templink_blacklist():
+    """
+    Periodically drops blacklist partitions past retention period
+    and builds filters of retained ones, e.g. after Redis lost them.
+    """
+    removed = drop_partitions()
+    built = build_filters(get_retained_partitions())
+
+    logger.info(f'Removed {removed} blacklisted tokens, built {built} '
+                f'blacklist filters.')
+
+
+@shared_task
+def remove_stale_upload_sessions():
+    """
+    Periodically removes upload sessions which were not continued
+    for UPLOAD_SESSION_LIFETIME seconds, along with their files.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_LIFETIME)
+    _, removed = UploadSession.objects.filter(updated__lt=stale).delete()
+
+    logger.info(f'Removed {removed.get("api.UploadSession", 0)} stale '
+                f'upload sessions.')
+
+
+@shared_task
+def generate_thumbnails(image_pk):
+    """
+    Renders thumbnails of all sizes defined by image owner's account tier.
+    Thumbnails which were already rendered are skipped.
+    """
+    try:
+        image = Image.objects.select_related('owner').get(pk=image_pk)
+    except Image.DoesNotExist:
+        logger.info(f'Image {image_pk} removed before thumbnail generation.')
+        return
+
+    account = get_account_tier(image.owner.account_tier_id)
+    if account is None:
+        return
+
+    thumbnails = render_thumbnails(image, account.thumbnail_sizes.all())
+    logger.info(f'Generated {len(thumbnails)} thumbnails for image {image_pk}.')
+
+
+@shared_task
+def rebuild_thumbnail_kvstore(verify=False, sample=20):
+    """
+    Runs rebuild_thumbnail_kvstore command in the background.
+    """
+    call_command('rebuild_thumbnail_kvstore', verify=verify, sample=sample)
+
+
+@shared_task
+def backfill_image_thumbnails(image_pk):
+    """
+    Renders thumbnails of an image as part of backfill. Failures are
+    logged instead of raised, as a failed task would keep the chord
+    from scheduling the following batches.
+    """
+    try:
+        generate_thumbnails(image_pk)
+    except Exception:
+        logger.exception(f'Thumbnail backfill failed for image {image_pk}.')
+
+
+@shared_task(bind=True, acks_late=True)
+def backfill_thumbnails(self, tier_pk=None, user_pk=None, after_pk=0,
+                        done=0, total=None):
+    """
+    Renders missing thumbnails for images of given account tier or user.
+    Handles one batch of images ordered by pk, fanned out to workers,
+    and schedules the next batch once the current one has finished.
+    Can be resumed from any batch by passing the last processed pk.
+    """
+    images = Image.objects.all()
+    if tier_pk is not None:
+        images = images.filter(owner__account_tier=tier_pk)
+    if user_pk is not None:
+        images = images.filter(owner=user_pk)
+
+    if total is None:
+        total = images.filter(pk__gt=after_pk).count()
+
+    batch = list(
+        images.filter(pk__gt=after_pk)
+        .order_by('pk')
+        .values_list('pk', flat=True)[:settings.THUMBNAIL_BACKFILL_BATCH_SIZE]
+    )
+    if not batch:
+        logger.info(f'Thumbnail backfill finished: {done}/{total} images.')
+        return
+
+    done += len(batch)
+    self.update_state(state='PROGRESS', meta={'done': done, 'total': total})
+    logger.info(
+        f'Thumbnail backfill: {done}/{total} images, up to pk {batch[-1]}.'
+    )
+
+    # Next batch waits for the current one and a throttling delay.
+    next_batch = backfill_thumbnails.si(
+        tier_pk=tier_pk,
+        user_pk=user_pk,
+        after_pk=batch[-1],
+        done=done,
+        total=total,
+    ).set(countdown=settings.THUMBNAIL_BACKFILL_INTERVAL)
+    chord(backfill_image_thumbnails.si(pk) for pk in batch)(next_batch)
@@ -0,0 +1,7 @@
+#!/bin/sh
+
+set -o errexit
+set -o nounset
+
+python manage.py wait_for_db
+gunicorn imaginarium.asgi:application -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:8001
\ No newline at end of file
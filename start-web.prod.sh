@@ -7,4 +7,5 @@ python manage.py wait_for_db
 python manage.py migrate
 python manage.py create_admin
 python manage.py collectstatic --no-input
+python manage.py rebuild_thumbnail_kvstore --verify --background
 gunicorn imaginarium.wsgi:application --bind 0.0.0.0:8000
\ No newline at end of file